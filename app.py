@@ -2,602 +2,245 @@
 # MERGED APP.PY (DEPLOYMENT READY)
 # ======================================================
 
+import time
+script_started = time.time() # the imports below only cost time in the first run of a process
+
 import os
+import queue
+import threading
+import uuid
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import requests
-from sqlalchemy import create_engine, text
-from plotly.subplots import make_subplots
+from instrumentation import DEBUG_PANEL, METRICS, METRICS_PROM, summarize_events
+
+# Startup: nothing here touches the data. The data modules (pandas, Plotly, SQLAlchemy) are imported by the
+# functions and pages that use them, and the engine is created on first use, so a new process paints the
+# HOME page without them and the EXPLORE DATA and BUSINESS CASES pages pay for what they need on first visit.
+
+
+@st.cache_resource
+def get_startup_state():
+    return {"first_run": True} # the first run of this process records the startup timings (see the end of the file)
+
+
+first_run = get_startup_state().pop("first_run", False)
+if first_run:
+    METRICS.record({"stage": "startup", "name": "imports", "ms": (time.time() - script_started) * 1000})
+
 
 @st.cache_resource
 def get_engine():
-    return create_engine(
-        f"mysql+pymysql://{os.environ['DB_USER']}:{os.environ['DB_PASSWORD']}@"
-        f"{os.environ['DB_HOST']}:{os.environ['DB_PORT']}/{os.environ['DB_NAME']}",
-        pool_pre_ping=True,
-        pool_recycle=300
-    )
+    from data_backend import create_engine_from_config
+    return create_engine_from_config() # MySQL or the embedded DuckDB backend, depending on PULSE_BACKEND
+
+
+@st.cache_resource
+def get_built_cubes():
+    return {} # dataset type -> ExploreCube, the cubes opened so far, which a data refresh has to update
+
+
+@st.cache_resource
+def get_cube_opener():
+    # State x Year x Quarter rollups for the EXPLORE DATA page, read a quarter at a time through the shared cache.
+    # Each category's cube is opened once per process, by whichever thread asks first: the page for the category
+    # it shows, a prefetch worker for the others. Plain locks rather than st.cache_resource, which warns when it
+    # is called outside the script thread
+    from explore_data import DATASETS, open_explore_cube
+    engine, cache, registry, cubes = get_engine(), get_disk_cache(), get_figure_registry(), get_built_cubes()
+    locks = {name: threading.Lock() for name in DATASETS}
+
+    def open_cube(dataset_type):
+        with locks[dataset_type]:
+            if dataset_type not in cubes:
+                cubes[dataset_type] = open_explore_cube(engine, dataset_type, cache, registry.versions)
+            return cubes[dataset_type]
+    return open_cube
+
 
-engine = get_engine()
+def get_explore_cube(dataset_type, event=None):
+    if event is not None and dataset_type not in get_built_cubes():
+        event["cache"] = "miss" # neither this page nor a prefetch opened the cube before
+    return get_cube_opener()(dataset_type)
+
+
+@st.cache_resource
+def get_prefetcher():
+    from prefetch import PREFETCH_ENABLED, Prefetcher
+    # one bounded worker pool per process (PULSE_PREFETCH=0 turns it off); its workers open the cubes the page has not opened yet
+    return Prefetcher(get_cube_opener()) if PREFETCH_ENABLED else None
+
+
+def session_id():
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex) # this browser session, in metrics events and prefetches
+
+
+def prefetch_owner():
+    st.session_state["prefetching"] = True # checked before cancelling, so sessions that never prefetched skip the prefetcher
+    return session_id()
+
+
+def render_chart(fig, name, measure=False):
+    # st.plotly_chart, timed for the debug panel and the metrics export (see instrumentation.py);
+    # measure=True also records the bytes of the figure JSON sent to the browser
+    with METRICS.timed("render", name) as event:
+        if measure:
+            event["bytes"] = len(fig.to_json())
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def ranking_table(ranking, key_column, value_column, title, widget_key, col1_width, col2_width):
+    # one page of a full district or postal code ranking; sorting and paging happen here on the server, so only
+    # the rows on screen are formatted and sent (see explore_data.ranking_page)
+    from explore_data import RANKING_SORTS, create_styled_table, ranking_page, ranking_pages
+    pages = ranking_pages(ranking)
+    sort_col, page_col = st.columns(2)
+    sort = sort_col.selectbox("Sort", list(RANKING_SORTS), key=f"{widget_key}:sort")
+    page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{widget_key}:page")
+    rows = ranking_page(ranking, sort, page - 1)
+    title = f"{title} ({len(ranking.by_value):,})"
+    render_chart(create_styled_table(rows, key_column, value_column, title, col1_width, col2_width), f"table:{widget_key.split(':')[0]}")
+
+
+FIGURE_TIMEOUT = float(os.environ.get("PULSE_FIGURE_TIMEOUT", "30")) # seconds a BUSINESS CASES chart may take before the page gives up waiting
+SKELETON_STYLE = "height:450px; border-radius:8px; background:#2D174B; color:#B9A6E0; display:flex; align-items:center; justify-content:center; animation:pulse 1.2s ease-in-out infinite;"
+
+
+def chart_slot(slots, name):
+    # a placeholder the size of a chart, shown right away and filled by fill_chart_slots once the figure is ready
+    slot = st.empty()
+    slot.markdown(f"<style>@keyframes pulse {{50% {{opacity:0.5;}}}}</style><div style='{SKELETON_STYLE}'>Loading chart...</div>",
+                  unsafe_allow_html=True)
+    slots[name] = slot
+
+
+def fill_chart_slots(slots, figures, timeout=FIGURE_TIMEOUT):
+    # figures yields (name, figure or exception) as they are ready; it runs on a background thread so this run can fill
+    # every slot the moment its figure arrives, and a failed figure shows its error in its own slot only. Each chart
+    # gets timeout seconds from the moment the previous one arrived; whatever is not ready by then keeps computing in
+    # the background (the registry memoizes it) and its slot says so instead of holding up the rest of the page
+    results = queue.Queue()
+    session = METRICS.current_session()
+
+    def pump():
+        METRICS.bind_session(session)
+        try:
+            for item in figures:
+                results.put(item)
+        except Exception as e:
+            results.put((None, e))
+        results.put((None, None))
+
+    threading.Thread(target=pump, name="pulse-figures", daemon=True).start()
+    waiting = set(slots)
+    while waiting:
+        try:
+            name, figure = results.get(timeout=timeout) # the figures are built one after the other, so this bounds each chart
+        except queue.Empty:
+            for name in waiting:
+                METRICS.record({"stage": "business", "name": f"timeout:{name}"})
+                slots[name].warning("This chart is taking longer than usual and is still being computed. Click Generate Report again to see it.")
+            return
+        if name is None: # finished, or a query failed
+            for name in waiting:
+                slots[name].error(f"Error: {figure}" if figure is not None else "This chart could not be computed.")
+            return
+        if name in waiting and isinstance(figure, Exception):
+            slots[name].error(f"Error: {figure}")
+            waiting.discard(name)
+        elif name in waiting:
+            with slots[name].container():
+                if name == "state_pie_charts": # one pie per state
+                    for state, fig in figure.items():
+                        render_chart(fig, f"pie:{state}")
+                else:
+                    render_chart(figure, name)
+            waiting.discard(name)
 
 
 # ======================================================
-# BUSINESS DATA (INLINE)
+# BUSINESS DATA
 # ======================================================
 
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from sqlalchemy import text
-import streamlit as st
+@st.cache_resource
+def get_disk_cache():
+    from disk_cache import CACHE_ENABLED, DiskCache
+    return DiskCache() if CACHE_ENABLED else None # shared by every process using the same store, survives restarts (PULSE_DISK_CACHE=0 turns it off)
 
 
-@st.cache_data(show_spinner=False)
-def load_business_figures():
+@st.cache_resource
+def get_figure_registry():
+    # figures are built only when a case study needs them and memoized one by one, see business_data.py
+    from business_data import FigureRegistry
+    from data_backend import table_versions
+    from prerender import PrerenderedFigures
     engine = get_engine()
-    figs = {}
-
-    # ======================================================
-    # QUERY 1
-    # ======================================================
-    q1 = text("""
-        SELECT Year, SUM(Transaction_count) AS total_transactions, 
-              SUM(Transaction_amount) AS transaction_amount 
-              FROM agg_trans 
-              GROUP BY Year 
-              ORDER BY Year;""")
-    
-    df_trans_value_growth = pd.read_sql(q1, engine)
-    df_trans_value_growth["Transaction Number Growth (%)"] = df_trans_value_growth["total_transactions"].pct_change() * 100
-    df_trans_value_growth["Transaction Amount Growth (%)"] = df_trans_value_growth["transaction_amount"].pct_change() * 100
-    df_trans_value_growth_fil = df_trans_value_growth[df_trans_value_growth["Year"] != 2018]
-
-    figs["fig1"] = px.bar(
-                        df_trans_value_growth_fil,
-                        x="Year",
-                        y=["Transaction Number Growth (%)", "Transaction Amount Growth (%)"],
-                        barmode="group",
-                        title="Growth in Transaction Volume Over Years", color_discrete_sequence = ["#636EFA","#EF553B"])
-
-    # ======================================================
-    # QUERY 2
-    # ======================================================
-    q2 = text("""
-        WITH YoYGrowth AS (
-                 SELECT State, Year, 
-                 ROUND((SUM(Transaction_count) - LAG(SUM(Transaction_count)) OVER (PARTITION BY State ORDER BY Year)) * 100.0 /
-                 NULLIF(LAG(SUM(Transaction_count)) OVER (PARTITION BY State ORDER BY Year), 0), 2) AS YoY_Transaction_Growth_Percent
-                 FROM agg_trans
-                 GROUP BY State, Year),
-                 RankedGrowth AS (
-                 SELECT State, Year, YoY_Transaction_Growth_Percent, ROW_NUMBER() OVER (PARTITION BY Year ORDER BY YoY_Transaction_Growth_Percent DESC) AS rn_desc, 
-                 ROW_NUMBER() OVER (PARTITION BY Year ORDER BY YoY_Transaction_Growth_Percent ASC) AS rn_asc
-                 FROM YoYGrowth
-                 WHERE YoY_Transaction_Growth_Percent IS NOT NULL),
-                 TopBottomStates AS (
-                 SELECT DISTINCT State FROM RankedGrowth WHERE rn_desc <= 3 OR rn_asc <= 3)
-                 SELECT yg.State, AVG(yg.YoY_Transaction_Growth_Percent) as avg_txn_growth_pct
-                 FROM YoYGrowth yg
-                 JOIN TopBottomStates tbs ON yg.State = tbs.State
-                 WHERE Year >= 2019
-                 GROUP BY State
-                 ORDER BY AVG(yg.YoY_Transaction_Growth_Percent) DESC
-                 LIMIT 5;""")
-    
-    df_state_yoy_growth = pd.read_sql(q2, engine)
-    df_state_yoy_growth.fillna(0, inplace = True)
-    figs["fig2"] = px.bar(df_state_yoy_growth, x = "State", y = "avg_txn_growth_pct", color = "State", color_discrete_sequence = px.colors.qualitative.Plotly,
-                          labels = {"avg_txn_growth_pct": "Average Transaction Growth (%)", "State": "State"},
-                          title = "Top 5 States with Highest Average YoY Transaction Growth")
-    figs["fig2"].update_layout(height = 500)
-
-    # ======================================================
-    # QUERY 3
-    # ======================================================
-    q3 = text("""
-        WITH state_year_summary AS (
-                 SELECT State, Year, SUM(Transaction_count) AS TotalTransactions
-                 FROM agg_trans WHERE Year BETWEEN 2020 AND 2024 
-                 GROUP BY State, Year),
-                 growth AS (
-                 SELECT s.State, s.Year, s.TotalTransactions, 
-                 LAG(s.TotalTransactions) OVER (PARTITION BY s.State ORDER BY s.Year) AS PreviousYearTransactions
-                 FROM state_year_summary s),
-                 declining_states AS (
-                 SELECT State, ROUND((TotalTransactions - PreviousYearTransactions) * 100.0 / PreviousYearTransactions, 2)
-                 AS YoY_Transaction_Growth_Percent
-                 FROM growth
-                 WHERE PreviousYearTransactions IS NOT NULL
-                 AND Year = 2024
-                 ORDER BY YoY_Transaction_Growth_Percent ASC
-                 LIMIT 5)
-                 SELECT g.State, g.Year, ROUND((g.TotalTransactions - g.PreviousYearTransactions) * 100.0 / g.PreviousYearTransactions,2)
-                 AS "YoY Transaction Growth (%)"
-                 FROM growth g
-                 JOIN declining_states d ON g.State = d.State
-                 WHERE g.PreviousYearTransactions IS NOT NULL
-                 ORDER BY g.State, g.Year;""")
-                
-    df_trans_growth_decline = pd.read_sql(q3, engine)
-    figs["fig3"] = px.line(df_trans_growth_decline, x = "Year", y = "YoY Transaction Growth (%)", color = "State", markers = True,
-                           color_discrete_sequence = px.colors.qualitative.Plotly,
-                           labels = {"State":"Regions", "YoY Transaction Growth (%)":"YoY Transaction Growth (%)"},
-                           title="Top 5 Regions Showing Most Decline in Transaction Growth From 2021-2024")
-    figs["fig3"].update_xaxes(tickmode = "array", tickvals = [2019, 2020, 2021, 2022, 2023, 2024], 
-                      ticktext = ["2019","2020","2021","2022","2023","2024"])
-    figs["fig3"].update_traces(mode = "lines + markers", marker = dict(size = 6))
-
-    # ======================================================
-    # QUERY 4
-    # ======================================================
-    q4 = text("""
-       WITH quarterly AS (
-              SELECT Year, Quarter, SUM(Transaction_count) AS TotalTransactions
-              FROM agg_trans
-              WHERE Year BETWEEN 2018 AND 2024
-              GROUP BY Year, Quarter),
-              with_prev AS (
-              SELECT Year, Quarter, TotalTransactions, LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) AS PrevTotalTransactions,
-              CASE
-               WHEN LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) IS NULL THEN NULL
-               WHEN LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) = 0 THEN NULL
-               ELSE (TotalTransactions - LAG(TotalTransactions) OVER (ORDER BY Year, Quarter)) * 100.0 / LAG(TotalTransactions) OVER (ORDER BY Year, Quarter)
-              END AS TransactionSpikePct
-              FROM quarterly)
-              SELECT Year, Quarter AS 'Quarter With Max Pct Spike', TotalTransactions as 'Total Transactions', 
-              PrevTotalTransactions as 'Prev Total Transactions', ROUND(TransactionSpikePct,2) AS 'Spike Pct'
-              FROM (SELECT *,
-              ROW_NUMBER() OVER (PARTITION BY Year ORDER BY CASE WHEN TransactionSpikePct IS NULL THEN 1 ELSE 0 END, TransactionSpikePct DESC) 
-              AS rn
-              FROM with_prev) t
-              WHERE rn = 1
-              ORDER BY Year;""")
-    
-    df_quarter_spike = pd.read_sql(q4, engine)
-    df_quarter_spike["Quarter With Max Pct Spike"] = df_quarter_spike["Quarter With Max Pct Spike"].astype(str)
-    
-    figs["fig4"] = px.bar(df_quarter_spike, x = "Year", y = "Spike Pct", color = "Quarter With Max Pct Spike",
-                  labels = {"Year":"Year","Spike Pct":"Transaction Spike (%)","Quarter With Max Pct Spike":"Quarter"},
-                  color_discrete_sequence = px.colors.qualitative.Plotly,
-                  title = "Quarters with Highest Transaction Spike in Each Year")
-
-    # ======================================================
-    # QUERY 5
-    # ======================================================
-    q5 = text("""
-        WITH yearly_totals AS (
-                 SELECT Year, SUM(Transaction_amount) AS TotalTransactionAmount
-                 FROM agg_trans
-                 GROUP BY Year),
-                 type_share AS (
-                 SELECT a.Year, a.Transaction_type AS TransactionType, SUM(a.Transaction_amount) AS TransactionAmount,
-                 SUM(a.Transaction_amount) * 100.0 / y.TotalTransactionAmount AS SharePct
-                 FROM agg_trans a
-                 JOIN yearly_totals y ON a.Year = y.Year
-                 GROUP BY a.Year, a.Transaction_type, y.TotalTransactionAmount)
-                 SELECT TransactionType AS "Transaction Type", ROUND(AVG(SharePct), 2) AS "Average Share Pct"
-                 FROM type_share
-                 GROUP BY TransactionType;""")
-    
-    df_trans_type_high_share = pd.read_sql(q5, engine)
-    figs["fig5"] = px.pie(df_trans_type_high_share, names = "Transaction Type", values = "Average Share Pct", 
-                          color = "Transaction Type",
-                          color_discrete_sequence = px.colors.qualitative.Plotly,
-                          title = "Percentage Share of All Transactions By Each Payment Type")
-
-    figs["fig5"].update_traces(textposition = "outside", pull = 0.1)
-    figs["fig5"].update_layout(width = 600, height = 500, uniformtext_minsize = 14, uniformtext_mode = "show")
-
-    # ======================================================
-    # QUERY 6
-    # ======================================================
-    q6 = text("""
-        WITH brand_users AS (
-                 SELECT Brand_name AS Brandname, SUM(User_count) AS Totalusers 
-                 FROM agg_user
-                 GROUP BY Brand_name),
-                 ranked AS (
-                 SELECT Brandname, Totalusers,
-                 RANK() OVER (ORDER BY Totalusers DESC) AS rank_highest,
-                 RANK() OVER (ORDER BY Totalusers ASC) AS rank_lowest
-                 FROM brand_users)
-                 SELECT Brandname, Totalusers 
-                 FROM ranked 
-                 WHERE rank_highest <= 3 OR rank_lowest <= 3
-                 ORDER BY Totalusers DESC;""")
-    
-    df_device_brand_users = pd.read_sql(q6, engine)
-    df_device_brand_users = df_device_brand_users.rename(columns = {"Brandname":"Brand Name", 
-                                                                "Totalusers":"Total Users"})
-    import plotly.graph_objects as go
-    from plotly.subplots import make_subplots
-    
-    top3_df = df_device_brand_users.iloc[0:3]
-    bottom3_df = df_device_brand_users.iloc[3:]
-    
-    palette = px.colors.qualitative.Plotly
-    
-    top3_colors = [palette[i % len(palette)] for i in range(len(top3_df))]
-    bottom3_colors = [palette[i % len(palette)] for i in range(len(bottom3_df))]
-    
-    figs["fig6"] = make_subplots(rows = 1, cols = 2, subplot_titles = ("Top 3 Mobile Brands",
-                                                               "Bottom 3 Mobile Brands"))
-    figs["fig6"].add_trace(go.Bar(x = top3_df["Brand Name"], y = top3_df["Total Users"],
-                          marker_color = top3_colors), row = 1, col = 1)
-    figs["fig6"].add_trace(go.Bar(x = bottom3_df["Brand Name"], y = bottom3_df["Total Users"],
-                         marker_color = bottom3_colors), row = 1, col = 2)
-    
-    figs["fig6"].update_layout(title_text = "Total Number of PhonePe Users For Each Device Brand", showlegend = False)
-
-    # ======================================================
-    # QUERY 7
-    # ======================================================
-    q7 = text("""
-       WITH app_engagement AS (
-                SELECT State AS "State", ROUND(AVG(Registered_users), 2) AS AvgRegUsers, ROUND(AVG(Number_of_app_opens), 2) AS AvgAppOpens
-                FROM map_user
-                GROUP BY State),
-                engagement_rate AS (
-                SELECT State, ROUND(AvgAppOpens / AvgRegUsers, 2) AS EngagementRate 
-                FROM app_engagement)
-                (SELECT * FROM engagement_rate
-                ORDER BY EngagementRate DESC
-                LIMIT 3)
-                UNION ALL
-                (SELECT * FROM engagement_rate ORDER BY EngagementRate ASC LIMIT 3)
-                ORDER BY EngagementRate DESC;""")
-    
-    df_state_user_eng_rate = pd.read_sql(q7, engine)
-    df_state_user_eng_rate = df_state_user_eng_rate.rename(columns = {"EngagementRate":"Engagement Rate"})
+    prerendered = PrerenderedFigures() # artifacts of `python prerender.py`, used while they match the data
+    return FigureRegistry(engine, cache=get_disk_cache(), versions=table_versions(engine), prerendered=prerendered if len(prerendered) else None)
 
-    top3_eng = df_state_user_eng_rate.iloc[0:3]
-    bottom3_eng = df_state_user_eng_rate.iloc[3:]
-    
-    palette = px.colors.qualitative.Plotly
-    
-    top3_colors = [palette[i % len(palette)] for i in range(len(top3_eng))]
-    bottom3_colors = [palette[i % len(palette)] for i in range(len(bottom3_eng))]
-    
-    figs["fig7"] = make_subplots(rows = 1, cols = 2, subplot_titles = ("Top 3 Regions",
-                                                               "Bottom 3 Regions"))
-    figs["fig7"].add_trace(go.Bar(x = top3_eng["State"], y = top3_eng["Engagement Rate"],
-                          marker_color = top3_colors), row = 1, col = 1)
-    figs["fig7"].add_trace(go.Bar(x = bottom3_eng["State"], y = bottom3_eng["Engagement Rate"],
-                         marker_color = bottom3_colors), row = 1, col = 2)
-    
-    figs["fig7"].update_layout(title_text = "PhonePe App Engagement Rates For Each Region", showlegend = False)
-
-
-    # ======================================================
-    # QUERY 8
-    # ======================================================
-    q8 = text("""
-        WITH quarterly_engagement AS (
-                 SELECT Year, Quarter, ROUND(SUM(Number_of_app_opens)/SUM(Registered_users), 4) AS EngagementRate
-                 FROM map_user
-                 GROUP BY Year, Quarter),
-                 ranked AS (
-                 SELECT Year, Quarter, EngagementRate,
-                 RANK() OVER (PARTITION BY Year ORDER BY EngagementRate DESC) AS rank_highest,
-                 RANK() OVER (PARTITION BY Year ORDER BY EngagementRate ASC) AS rank_lowest
-                 FROM quarterly_engagement)
-                 SELECT Year, Quarter, EngagementRate as 'Engagement Rate' FROM ranked
-                 WHERE rank_highest = 1 OR rank_lowest = 1
-                 ORDER BY Year, Quarter, EngagementRate ASC;""")
-    
-    df_quarter_user_eng_rate = pd.read_sql(q8, engine)
-    df_quarter_user_eng_rate = df_quarter_user_eng_rate[df_quarter_user_eng_rate["Year"]!=2018]
-    df_quarter_user_eng_rate["Quarter"] = df_quarter_user_eng_rate["Quarter"].astype(str)
-    df_quarter_user_eng_rate = df_quarter_user_eng_rate.sort_values(["Year","Engagement Rate"], ascending = [True, True])
-    figs["fig8"] = px.bar(df_quarter_user_eng_rate, x = "Year", y = "Engagement Rate",
-                          barmode = "group", labels = {"Year":"Year", "Quarter":"Quarter", "Engagement Rate":"Engagement Rate"}, 
-                          color = "Quarter",
-                          color_discrete_sequence = px.colors.qualitative.Plotly,
-                          title = "Highest and Lowest PhonePe App User Engagement Rate Per Year")
-
-    # ======================================================
-    # QUERY 9
-    # ======================================================
-    q9 = text("""
-        WITH yearly_insurance AS (
-                 SELECT Year, SUM(Insurance_count) AS TotalInsurance, SUM(Insurance_amount) AS TotalValue
-                 FROM agg_ins
-                 WHERE Year BETWEEN 2020 AND 2024
-                 GROUP BY Year),
-                 growth AS (
-                 SELECT Year, TotalInsurance, TotalValue, LAG(TotalInsurance) OVER (ORDER BY Year) AS PrevTransactions,
-                 LAG(TotalValue) OVER (ORDER BY Year) AS PrevValue
-                 FROM yearly_insurance)
-                 SELECT Year, TotalInsurance as "No of Insurance Transactions", TotalValue "Total Insurance Amount",
-                 ROUND((TotalInsurance - PrevTransactions) * 100.0 / PrevTransactions, 2) AS "Insurance Transaction Growth (%)",
-                 ROUND((TotalValue - PrevValue) * 100.0 / PrevValue, 2) AS "Insurance Amount Growth (%)"
-                 FROM growth
-                 WHERE PrevTransactions IS NOT NULL AND PrevValue IS NOT NULL
-                 ORDER BY Year;""")
-    
-    df_ins_growth_each_year = pd.read_sql(q9, engine)
-    figs["fig9"] = px.bar(df_ins_growth_each_year, x = "Year", y = ["Insurance Transaction Growth (%)", "Insurance Amount Growth (%)"],
-                          barmode = "group",
-                          color_discrete_sequence = px.colors.qualitative.Plotly,
-                          labels = {"Year":"Year","Insurance Transaction Growth (%)":"Insurance Transaction Growth (%)",
-                                    "Insurance Amount Growth (%)":"Insurance Amount Growth (%)","variable":"Metric", 
-                                    "value":"Growth (%)"},
-                          title = "Growth in Number Of Transactions and Total Insurance Transactions Over The Years")
-
-
-    # ======================================================
-    # QUERY 10
-    # ======================================================
-    q10 = text("""
-        WITH yearly_totals AS (
-                  SELECT State, Year, SUM(Insurance_amount) AS total_value FROM agg_ins
-                  GROUP BY state, year)
-                  SELECT State, (MAX(total_value) - MIN(total_value)) AS InsuranceTransactionValue
-                  FROM yearly_totals
-                  GROUP BY state
-                  ORDER BY InsuranceTransactionValue DESC
-                  LIMIT 5;""")
-    
-    df_high_insurance_trans = pd.read_sql(q10, engine)
-    df_high_insurance_trans["InsuranceTransactionValue"] = df_high_insurance_trans["InsuranceTransactionValue"]/1e7
 
-    df_high_insurance_trans = df_high_insurance_trans.rename(columns = 
-                                                             {"InsuranceTransactionValue":"Insurance Transaction Value (in Cr)"})
-    
-    figs["fig10"] = px.bar(df_high_insurance_trans, x = "State", y = "Insurance Transaction Value (in Cr)",
-                   color = "State",
-                   color_discrete_sequence = px.colors.qualitative.Plotly,
-                   labels = {"State":"State","Insurance Transaction Value (in Cr)":"Insurance Transaction Value (in Cr)"},
-                   title = "Top 5 States with Highest Insurance Transaction Value Over The Years")
-
-    # ======================================================
-    # QUERY 11
-    # ======================================================
-    q11 = text("""
-        WITH total_activity AS (
-                  SELECT state, SUM(Transaction_count) AS total_txn_count, SUM(Transaction_amount) AS total_txn_value
-                  FROM agg_trans
-                  GROUP BY state),
-                  insurance_activity AS (
-                  SELECT State, SUM(Insurance_count) AS total_insurance_count, SUM(Insurance_amount) AS total_insurance_value
-                  FROM agg_ins
-                  GROUP BY State),
-                  combined AS (
-                  SELECT t.State, t.total_txn_count, t.total_txn_value, i.total_insurance_count, i.total_insurance_value,
-                  ROUND((i.total_insurance_count * 100.0 / NULLIF(t.total_txn_count, 0)), 5) AS insurance_penetration_rate,
-                  ROUND((i.total_insurance_value * 100.0 / NULLIF(t.total_txn_value, 0)), 5) AS insurance_value_share
-                  FROM total_activity t
-                  LEFT JOIN insurance_activity i ON t.state = i.state)
-                  SELECT State, total_txn_count as 'Total Transactions', total_txn_value as 'Total Transaction Amount', 
-                  total_insurance_count as 'Total Insurances', total_insurance_value as 'Total Insurance Amount', 
-                  insurance_penetration_rate as "Insurance Penetration Rate", 
-                  insurance_value_share as "Insurance Value Share"
-                  FROM combined
-                  WHERE insurance_penetration_rate IS NOT NULL
-                  ORDER BY insurance_penetration_rate ASC
-                  limit 5;""")
-    
-    df_untapped_region = pd.read_sql(q11, engine)
-    figs["fig11"] = px.bar(df_untapped_region, x = "State", y = ["Insurance Penetration Rate"], 
-                           color = 'State',
-                           color_discrete_sequence = px.colors.qualitative.Plotly, 
-                           labels = {"State": "State","variable": "Metric","value": "Insurance Penetration Rate"},
-                           title = "Untapped States - High Total Transaction Values But Relatively Low Insurance Penetration")
-
-    # ======================================================
-    # QUERY 12
-    # ======================================================
-    q12 = text("""
-        WITH yearly_user_growth AS (
-                  SELECT state, year, SUM(Registered_users) AS yearly_registered
-                  FROM map_user
-                  GROUP BY state, year),
-                  user_growth_rate AS (
-                  SELECT state, year, yearly_registered, LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year) AS prev_registered,
-                  ROUND((yearly_registered - LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year)) * 100.0 / LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year), 2) AS reg_growth_pct
-                  FROM yearly_user_growth),
-                  yearly_txn_growth AS (
-                  SELECT state, year, SUM(transaction_count) AS yearly_txns
-                  FROM agg_trans GROUP BY state, year),
-                  txn_growth_rate AS (
-                  SELECT state, year, yearly_txns, LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year) AS prev_txns,
-                  ROUND((yearly_txns - LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year)) * 100.0 / LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year), 2) AS txn_growth_pct
-                  FROM yearly_txn_growth),
-                  combined AS (
-                  SELECT u.state, u.year, u.reg_growth_pct, t.txn_growth_pct FROM user_growth_rate u
-                  JOIN txn_growth_rate t 
-                  ON u.state = t.state AND u.year = t.year
-                  WHERE u.prev_registered IS NOT NULL AND t.prev_txns IS NOT NULL)
-                  SELECT state, ROUND(AVG(reg_growth_pct), 2) AS avg_user_growth_pct, 
-                  ROUND(AVG(txn_growth_pct), 2) AS avg_txn_growth_pct
-                  FROM combined GROUP BY state HAVING AVG(reg_growth_pct) > 0 AND AVG(txn_growth_pct) > 0
-                  ORDER BY avg_txn_growth_pct DESC LIMIT 10;""")
-    
-    df_state_consistent_growth = pd.read_sql(q12, engine)
-    df_state_consistent_growth = df_state_consistent_growth.rename(columns = {"state":"State", 
-                                                                          "avg_user_growth_pct":"Average User Growth (%)",
-                                                                          "avg_txn_growth_pct":"Average Transaction Growth (%)"})
-
-    figs["fig12"] = px.bar(df_state_consistent_growth, x = "State", y = ["Average User Growth (%)", "Average Transaction Growth (%)"], 
-               barmode = "group", color_discrete_sequence = px.colors.qualitative.Plotly, 
-               labels = {"State": "State","variable": "Metric","value": "Growth (%)"},
-               title = "States Showing Consistent Growth in User Registration and Repeat Transaction")
-
-    # ======================================================
-    # QUERY 13 (STATE PIE CHARTS)
-    # ======================================================
-    q13 = text("""
-        WITH district_metrics AS (
-                  SELECT State, District_name, SUM(Registered_users) AS total_registered_users,
-                  SUM(Number_of_app_opens) AS total_app_opens
-                  FROM map_user
-                  GROUP BY State, District_name),
-                  state_totals AS (
-                  SELECT State, SUM(total_registered_users) AS state_total_registered,
-                  SUM(total_app_opens) AS state_total_app_opens
-                  FROM district_metrics
-                  GROUP BY State),
-                  joined_data AS (
-                  SELECT dm.State, dm.District_name, dm.total_registered_users, dm.total_app_opens,
-                  ROUND((dm.total_app_opens / st.state_total_app_opens) * 100, 2) AS app_open_share_percent
-                  FROM district_metrics dm 
-                  JOIN state_totals st ON dm.State = st.State),
-                  state_ranking AS (
-                  SELECT State, SUM(total_registered_users) AS state_registered_users
-                  FROM district_metrics
-                  GROUP BY State),
-                  top3_states AS (
-                  SELECT State FROM state_ranking ORDER BY state_registered_users DESC LIMIT 3),
-                  ranked_districts AS (
-                  SELECT jd.*, ROW_NUMBER() OVER (PARTITION BY State ORDER BY total_registered_users DESC) AS district_rank
-                  FROM joined_data jd
-                  WHERE jd.State IN (SELECT State FROM top3_states))
-                  SELECT State, District_name AS 'District Name', total_app_opens AS 'Total App Opens',
-                  app_open_share_percent AS 'App Open Share'
-                  FROM ranked_districts
-                  WHERE district_rank <= 5
-                  ORDER BY State, district_rank;""")
-    
-    df_district_metrics = pd.read_sql(q13, engine)
+@st.cache_resource
+def get_refresh_state():
+    from data_backend import DATA_DIR
+    from refresh import source_stamp
+    return {"stamp": source_stamp(DATA_DIR), "lock": threading.Lock()}
+
+
+def refresh_embedded_data():
+    # embedded DuckDB backend: when the CSVs in PULSE_DATA_DIR change, only the new or changed quarters are
+    # loaded and only the cube slices and figures built from them are recomputed (see refresh.py); called by the
+    # pages that read data, before they do
+    from data_backend import DATA_DIR, SNAPSHOT_DIR, TABLES, backend_name
+    from refresh import apply_changes, refresh_tables, source_stamp
+    if backend_name() != "duckdb" or SNAPSHOT_DIR:
+        return
+    state = get_refresh_state()
+    if source_stamp(DATA_DIR) == state["stamp"]:
+        return
+    with state["lock"]:
+        stamp = source_stamp(DATA_DIR)
+        if stamp == state["stamp"]: # another session refreshed meanwhile
+            return
+        with METRICS.timed("refresh", "embedded") as event:
+            changed = [table for table, old, new in zip(TABLES, state["stamp"], stamp) if old != new] # only the CSVs that changed are read
+            changes, _ = refresh_tables(get_engine(), DATA_DIR, changed)
+            apply_changes(get_engine(), changes, get_built_cubes(), get_figure_registry())
+            event["partitions"] = sum(len(partitions) for partitions in changes.values())
+        state["stamp"] = stamp
+
+
+
+VERSION_CHECK_INTERVAL = float(os.environ.get("PULSE_VERSION_CHECK", "60")) # seconds between two looks at the table versions, 0 = never
 
-    state_pie_charts = {}
-    states = df_district_metrics['State'].unique()
-    
-    for state in states:
-        df_state = df_district_metrics[df_district_metrics['State'] == state]
-        
-        figs["fig13"] = px.pie(
-            df_state,
-            values = 'App Open Share',
-            names = 'District Name',
-            title = f'App Open Share Percent for {state}',
-            hole = 0.3 
-        )
-        figs["fig13"].update_traces(textposition ='inside', textinfo='percent+label')
-        state_pie_charts[state] = figs["fig13"]
-
-    # ======================================================
-    # QUERY 14
-    # ======================================================
-    q14 = text("""
-        WITH state_insurance AS (
-                  SELECT state, SUM(insurance_amount) AS total_insurance_amount FROM top_ins 
-                  WHERE year = 2024
-                  GROUP BY state)
-                  SELECT state, ROUND(total_insurance_amount, 2) AS total_insurance_amount
-                  FROM state_insurance 
-                  ORDER BY total_insurance_amount DESC 
-                  LIMIT 3;""")
-    
-    df_high_total_trans_region = pd.read_sql(q14, engine)
-    df_high_total_trans_region = df_high_total_trans_region.rename(columns = {"state":"State",
-                                                                        "total_insurance_amount":"Total Insurance Amount"})
-
-    df_high_total_trans_region = df_high_total_trans_region.sample(frac = 1).reset_index(drop = True)
-    figs["fig14"] = px.bar(df_high_total_trans_region, x = "State", y = "Total Insurance Amount", 
-                   color = "State",
-                   color_discrete_sequence = px.colors.qualitative.Plotly, 
-                   labels = {"State": "Regions","Total Insurance Amount":"Total Insurance Amount"},
-                   title = "Top 3 Regions Recording the Highest Total Insurance Transaction Amount in 2024")
-
-
-    # ======================================================
-    # QUERY 15
-    # ======================================================
-    q15 = text("""
-        SELECT year, quarter, total_insurance_trans_volume FROM (
-                  SELECT year, quarter, SUM(insurance_amount) AS total_insurance_trans_volume,
-                  RANK() OVER (PARTITION BY year ORDER BY SUM(insurance_amount) DESC) AS rnk
-                  FROM top_ins GROUP BY year, quarter) ranked
-                  WHERE rnk = 1;""")
-    
-    df_y_q_high_trans = pd.read_sql(q15, engine)
-    df_y_q_high_trans = df_y_q_high_trans.rename(columns = {"year":"Year","quarter":"Quarter",
-                                                        "total_insurance_trans_volume":"Total Insurance Trans Volume"})
-
-    df_y_q_high_trans["Quarter"] = df_y_q_high_trans["Quarter"].astype(str)
-    figs["fig15"] = px.bar(df_y_q_high_trans, x = "Year", y = "Total Insurance Trans Volume",
-                   color = "Quarter", 
-                   color_discrete_sequence = px.colors.qualitative.Plotly,
-                   labels = {"State": "State","Total Insurance Trans Volume":"Total Insurance Trans Volume","Quarter":"Quarter"},
-                   title = "Year and Quarter Combinations With Highest Total Insurance Transaction Volume")
-
-    # ======================================================
-    # QUERY 16
-    # ======================================================
-    q16 = text("""
-        SELECT district_name, SUM(insurance_amount) AS total_insurance_value
-                  FROM map_ins WHERE year = 2024
-                  GROUP BY district_name
-                  ORDER BY total_insurance_value DESC
-                  LIMIT 5;""")
-    
-    df_top5_districts_ins = pd.read_sql(q16, engine)
-    df_top5_districts_ins = df_top5_districts_ins.rename(columns = {"district_name":"District Name", 
-                                                                  "total_insurance_value":"Total Insurance Volume"})
-
-    figs["fig16"] = px.bar(df_top5_districts_ins, x = "District Name", y = "Total Insurance Volume",
-               color = "District Name",
-               color_discrete_sequence = px.colors.qualitative.Plotly,
-               labels = {"District Name":"District Name","Total Insurance Volume":"Total Insurance Volume"},
-               title = "Top 5 Districts With Highest Total Insurance Transaction Volume In 2024")
-
-    # ======================================================
-    # QUERY 17
-    # ======================================================
-    q17 = text("""
-        WITH yearly_pin_data AS (
-                  SELECT pincode, year, SUM(insurance_count) AS yearly_transaction_count
-                  FROM top_ins GROUP BY pincode, year),
-                  growth_calc AS (
-                  SELECT p1.pincode, (p2.yearly_transaction_count - p1.yearly_transaction_count) AS growth_in_count,
-                  p2.year
-                  FROM yearly_pin_data p1
-                  JOIN yearly_pin_data p2
-                  ON p1.pincode = p2.pincode
-                  AND p2.year = p1.year + 1)
-                  SELECT pincode, growth_in_count AS growth_from_prev_year
-                  FROM growth_calc
-                  WHERE year = 2024
-                  ORDER BY growth_from_prev_year DESC
-                  LIMIT 5;""")
-    
-    df_pincode_ins_trans = pd.read_sql(q17, engine)
-    df_pincode_ins_trans = df_pincode_ins_trans.rename(columns = {"pincode":"Pincode",
-                                                              "growth_from_prev_year":"Growth From Prev Year"})
 
-    df_pincode_ins_trans["Pincode"] = df_pincode_ins_trans["Pincode"].astype(int)
-    df_pincode_ins_trans["Growth From Prev Year"] = df_pincode_ins_trans["Growth From Prev Year"].astype(int)
-    
-    df_pincode_ins_trans["Pincode"] = df_pincode_ins_trans["Pincode"].astype(str) 
-    figs["fig17"] = px.bar(df_pincode_ins_trans, x = "Pincode", y = "Growth From Prev Year", 
-                    color = "Pincode",
-                    color_discrete_sequence = px.colors.qualitative.Plotly,
-                    labels = {"Pincode":"Pincode","Growth From Prev Year":"Growth From Previous Year"},
-                    title = "Top 5 Pincodes With Highest Growth in Insurance Transactions in 2024")
-    
-    figs["fig17"].update_layout(xaxis_type = "category", bargap = 0.2)
-    return figs, state_pie_charts
+@st.cache_resource
+def get_version_state():
+    return {"checked": time.time(), "lock": threading.Lock()}
+
+
+def check_data_versions():
+    # loads the app did not run itself (ingest.py, a refresh by another process) show up as new table versions; one
+    # session per process reads them at most every VERSION_CHECK_INTERVAL seconds, the others skip the check
+    state = get_version_state()
+    if not VERSION_CHECK_INTERVAL or time.time() - state["checked"] < VERSION_CHECK_INTERVAL:
+        return
+    if not state["lock"].acquire(blocking=False):
+        return
+    try:
+        from data_backend import table_versions
+        from refresh import apply_versions
+        state["checked"] = time.time()
+        with METRICS.timed("refresh", "versions", cache="hit") as event:
+            versions = table_versions(get_engine())
+            if versions != get_figure_registry().versions:
+                event["cache"] = "miss"
+                event["figures"] = len(apply_versions(get_engine(), versions, get_built_cubes(), get_figure_registry()))
+    finally:
+        state["lock"].release()
 
-figs, state_pie_charts = load_business_figures()
 
 # ======================================================
 # MAIN STREAMLIT APP
 # ======================================================
 
-
-# Importing the necessary libraries 
-
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from sqlalchemy import create_engine, text
-import requests
-
 # Styling the app
 
 st.set_page_config(page_title="PhonePe Business Analysis", layout = "wide") # setting up the page by giving it a title and a wide configuration
@@ -614,36 +257,16 @@ color:white !important;
 </style>
 """, unsafe_allow_html = True) # a custom CSS code to customize the sidebars 
 
-def create_styled_table(df, col1, col2, title, col1_width=340, col2_width=130): # code which will be used later on to create styled tables to display the figures in the EXPLORE DATA section
-    fig = go.Figure(data=[
-        go.Table(
-            header=dict(
-                values=[f"<b>{col1}</b>", f"<b>{col2}</b>"], # sets the values by referencing columns in the code below
-                fill_color="#4B367C", # the color of the table 
-                font=dict(color="white", size=16), # font to be used in the table
-                align="left", # alignment of header
-                line_color="#322454",
-                line_width=2),
-            cells=dict(
-                values=[
-                    df[col1].astype(str), # converting values to str in the first column
-                    df[col2].apply(lambda x: f"{int(x):,}" if col2.lower() != "pincode" else x)], # converting the values to integers only if the column name is not pincode otherwise it would provide stylistic numbers '400,500' instead of '400500' which is more appropriate for pincodes.
-                fill_color=[["#2D174B", "#341E56"] * (len(df)//2 + 1)],
-                font=dict(color="white", size=15),
-                align="left",
-                line_color="#322454",
-                line_width=1,
-                height=30),
-            columnwidth=[col1_width, col2_width])])
-    fig.update_layout(
-        paper_bgcolor="#1E0E3F",
-        margin=dict(l=8, r=8, t=40, b=8), # define the margins 
-        height=400, # define the height 
-        title=dict(text=f"<b>{title}</b>", font=dict(size=22, color="white")))
-    return fig
+run_started = time.time() # every event recorded from here on by this session belongs to this run (debug panel)
+METRICS.bind_session(session_id()) # the script thread; the threads working for it bind the same id
 
 # Sidebar navigation
 r = st.sidebar.radio('NAVIGATION', ['HOME', 'EXPLORE DATA', 'BUSINESS CASES']) # Users can use this navigation bar to switch between pages of the app
+if r != 'EXPLORE DATA' and "prefetching" in st.session_state and get_prefetcher() is not None:
+    get_prefetcher().cancel(session_id()) # nobody is stepping through the quarters any more
+if r != 'HOME':
+    refresh_embedded_data() # only the pages that read data wait for a refresh (or, in a new process, for the engine)
+    check_data_versions()
 
 # Home page
 
@@ -692,17 +315,11 @@ if r == 'HOME':
 
 elif r == 'EXPLORE DATA': # EXPLORE DATA section
     st.markdown("<h2 style='color:white;'>Explore Data</h2>", unsafe_allow_html=True)
+    from explore_data import DATASETS, build_choropleth, create_styled_table
+    from geo import load_map_geometry
+    from prefetch import prefetch_targets
     
-    # Setting up the SQL environment, connecting to MySQL so that the queries can run in the background 
-    import os
-    
-    DB_USER = os.environ["DB_USER"]
-    DB_PASSWORD = os.environ["DB_PASSWORD"]
-    DB_HOST = os.environ["DB_HOST"]
-    DB_PORT = os.environ["DB_PORT"]
-    DB_NAME = os.environ["DB_NAME"]
-
-    connection_string = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # The queries below run on the engine returned by get_engine() (MySQL or the embedded DuckDB backend)
 
     st.sidebar.header("Select Data") # Users can select different data categories 
     dataset_type = st.sidebar.radio("Choose Data Category:", ("Transactions", "Insurance", "Users")) # These are the three categories users can explore 
@@ -712,21 +329,25 @@ elif r == 'EXPLORE DATA': # EXPLORE DATA section
     map_table, top_table, agg_table = table_map[dataset_type]
 
     try:
-        with engine.connect() as conn:
-            years = pd.read_sql(f"SELECT DISTINCT Year FROM {map_table} ORDER BY Year;", conn)["Year"].tolist() 
-            quarters = pd.read_sql(f"SELECT DISTINCT Quarter FROM {map_table} ORDER BY Quarter;", conn)["Quarter"].tolist() 
+        with METRICS.timed("explore", f"cube:{dataset_type}", cache="hit") as event:
+            cube = get_explore_cube(dataset_type, event) # the quarters of this category, each read once, see explore_data.py
+        years = cube.years
+        quarters = cube.quarters
         selected_year = st.sidebar.selectbox("Select Year", years, index=len(years) - 1) # Here users can make the selection
         selected_quarter = st.sidebar.selectbox("Select Quarter", quarters) # Users can select the quarters
-        query = text(f"""SELECT * FROM {map_table} WHERE Year = :year AND Quarter = :quarter""") # run the query based on the year and quarter combination user selected
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn, params={"year": selected_year, "quarter": selected_quarter})
+        with METRICS.timed("explore", f"slice:{dataset_type}") as event:
+            event["cache"] = "hit" if cube.is_built((selected_year, selected_quarter)) else "miss" # a hit when it was prefetched
+            view = cube.get(selected_year, selected_quarter) # look up the selected year and quarter combination
+
+        if get_prefetcher() is not None: # read the neighbouring quarters and the other categories while this view is on screen
+            get_prefetcher().prefetch(prefetch_owner(), prefetch_targets(cube, DATASETS, selected_year, selected_quarter), get_built_cubes())
 
         st.subheader(f"{dataset_type} Data Overview - {selected_year} Q{selected_quarter}") # Data Overview changes based on the selected year and quarter
 
         # Metrics
         if dataset_type == "Transactions": # User selects transaction
-            total_txn_count = df["Transaction_count"].sum() # provides count of transactions 
-            total_txn_amount = df["Transaction_amount"].sum() # total transaction amount
+            total_txn_count = view.totals["Transaction_count"] # provides count of transactions 
+            total_txn_amount = view.totals["Transaction_amount"] # total transaction amount
             avg_txn_value = total_txn_amount / total_txn_count if total_txn_count else 0 # calculate average value
             # Create separate columns which will display aggregate values 
             col1, col2, col3 = st.columns(3) 
@@ -735,8 +356,8 @@ elif r == 'EXPLORE DATA': # EXPLORE DATA section
             col3.metric("Average Transaction Value", f"₹{avg_txn_value:,.0f}")
 
         elif dataset_type == "Insurance": # User selects Insurance 
-            total_ins_count = df["Insurance_count"].sum() # Insurance transaction count
-            total_ins_amount = df["Insurance_amount"].sum() # Insurance amount 
+            total_ins_count = view.totals["Insurance_count"] # Insurance transaction count
+            total_ins_amount = view.totals["Insurance_amount"] # Insurance amount 
             avg_ins_value = total_ins_amount / total_ins_count if total_ins_count else 0 # Average insurance value 
             # Create separate columns which will display aggregate values 
             col1, col2, col3 = st.columns(3)
@@ -745,179 +366,57 @@ elif r == 'EXPLORE DATA': # EXPLORE DATA section
             col3.metric("Average Insurance Amount", f"₹{avg_ins_value:,.0f}")
 
         else: # if user selects Users
-            total_users = df["Registered_users"].sum() # number of registered users
-            total_apps = df["Number_of_app_opens"].sum() # frequency of PhonePe app opens
+            total_users = view.totals["Registered_users"] # number of registered users
+            total_apps = view.totals["Number_of_app_opens"] # frequency of PhonePe app opens
             col1, col2 = st.columns(2)
             col1.metric("Total Registered Users", f"{(total_users):,.0f}")
             col2.metric("PhonePe App Opens", f"{(total_apps):,.0f}")
 
-        # Columns based on dataset type
-        if dataset_type == "Transactions":
-            value_column = "Transaction_amount"
-        elif dataset_type == "Insurance":
-            value_column = "Insurance_amount"
-        else:
-            value_column = "Registered_users"
-
         # Payment Categories styled table
         if dataset_type == "Transactions":
             if agg_table:
-                with engine.connect() as conn:
-                    payment_category_query = text(f"""SELECT Transaction_type AS Transaction_type, SUM(Transaction_amount) AS Total_Value
-                                                      FROM {agg_table}
-                                                      WHERE Year = :year AND Quarter = :quarter
-                                                      GROUP BY Transaction_type
-                                                      ORDER BY Total_Value DESC""")
-                    category_df = pd.read_sql(payment_category_query, conn, params={"year": selected_year, "quarter": selected_quarter})
-                    category_df["Total_Value"] = pd.to_numeric(category_df["Total_Value"].round(0), downcast="integer")
-                fig = create_styled_table(category_df, "Transaction_type", "Total_Value", "Payment Categories", 120, 150)
+                fig = create_styled_table(view.categories, "Transaction_type", "Total_Value", "Payment Categories", 120, 150)
                 fig.update_layout(height = 250)
-                st.plotly_chart(fig, use_container_width = True)
+                render_chart(fig, "table:categories")
                         
             else:
                 st.warning("Aggregation table for Payment Categories not available.")
 
-        # Fetch top 10 districts and pincodes styled tables
+        # District and pincode rankings, paged tables with the create_styled_table formatting
+        period = f"{dataset_type}:{selected_year}Q{selected_quarter}" # a new quarter starts at page 1 again
         if top_table:
-            with engine.connect() as conn:
-                top_districts = pd.read_sql(
-                    f"""SELECT District_name, SUM({value_column}) AS Total_Value FROM {map_table}
-                    WHERE Year = {selected_year} AND Quarter = {selected_quarter}
-                    GROUP BY District_name ORDER BY Total_Value DESC LIMIT 10;""", conn)
-                top_pincodes = pd.read_sql(
-                    f"""SELECT Pincode, SUM({value_column}) AS Total_Value FROM {top_table}
-                    WHERE Year = {selected_year} AND Quarter = {selected_quarter}
-                    GROUP BY Pincode ORDER BY Total_Value DESC LIMIT 10;""", conn)
-                top_pincodes["Pincode"] = top_pincodes["Pincode"].astype(float).astype(int).astype(str)
-                top_districts["Total_Value"] = pd.to_numeric(top_districts["Total_Value"].round(0), downcast="integer")
-                top_pincodes["Total_Value"] = pd.to_numeric(top_pincodes["Total_Value"].round(0), downcast="integer")
-
             colA, colB = st.columns(2)
-            # apply the create_styled_table formatting on to these tables 
-            # showing styled table for top 10 districts
+            # every district of the selected quarter, 10 per page
             with colA:
-                st.plotly_chart(create_styled_table(top_districts, "District_name", "Total_Value", "Top 10 Districts", 340, 150), use_container_width=True)
-            # showing styled table for top 10 pincodes 
+                ranking_table(view.districts, "District_name", "Total_Value", "Districts", f"districts:{period}", 340, 150)
+            # every postal code of the selected quarter
             with colB:
-                st.plotly_chart(create_styled_table(top_pincodes, "Pincode", "Total_Value", "Top 10 Postal Codes", 120, 150), use_container_width=True)
+                ranking_table(view.pincodes, "Pincode", "Total_Value", "Postal Codes", f"pincodes:{period}", 120, 150)
         else:
-            with engine.connect() as conn:
-                # querying the database for top 10 districts based on selected year and quarter
-                top_districts = pd.read_sql(
-                    f"""SELECT District_name, SUM(Registered_users) AS Total_Users FROM {map_table}
-                    WHERE Year = {selected_year} AND Quarter = {selected_quarter}
-                    GROUP BY District_name ORDER BY Total_Users DESC LIMIT 10;""", conn)
-            # rounding and casting Total_Users to integer for cleaner display
-            top_districts["Total_Users"] = pd.to_numeric(top_districts["Total_Users"].round(0), downcast="integer")
-            st.plotly_chart(create_styled_table(top_districts, "District_name", "Total_Users", "Top 10 Districts", 340, 150), use_container_width=True)
+            # every district by registered users for the selected year and quarter
+            ranking_table(view.districts, "District_name", "Total_Users", "Districts", f"districts:{period}", 340, 150)
 
         # Choropleth Map
-        url = "https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/india_states.geojson" # URL of the JSON files consisting of Indian state boundaries
-        india_geojson = requests.get(url).json() # downloading and parsing the GeoJSON file into a python dictionary
-        df_filtered = df[(df["Year"] == selected_year) & (df["Quarter"] == selected_quarter)] # filtering the main DataFrame for the selected year and quarter
-
-        if dataset_type == "Transactions":
-            df_filtered["Average_value"] = df_filtered["Transaction_amount"] / df_filtered["Transaction_count"] # computing average transaction value 
-            map_df = df_filtered.groupby("State").agg({
-                "Transaction_amount": "sum",
-                "Transaction_count": "sum",
-                "Average_value": "mean"}).reset_index() # these are the values that would be displayed when the user hovers over a specific region of India 
-
-            value_column = "Transaction_amount"
-            hover_text = (
-                "<b>%{location}</b><br>"
-                "All Transactions: %{customdata[1]:,.0f}<br>"
-                "Total Payment Value: ₹%{customdata[0]:,.0f}<br>"
-                "Avg. Transaction Value: ₹%{customdata[2]:,.0f}<extra></extra>") # basic styling for the hover text
-            custom_data = [map_df["Transaction_amount"], map_df["Transaction_count"], map_df["Average_value"]]
-
-        # this is repeated for when the user selects "Insurance"
-        elif dataset_type == "Insurance":
-            df_filtered["Average_insurance"] = df_filtered["Insurance_amount"] / df_filtered["Insurance_count"]
-            map_df = df_filtered.groupby("State").agg({
-                "Insurance_amount": "sum", # display the insurance amount 
-                "Insurance_count": "sum", # display the insurance count 
-                "Average_insurance": "mean"}).reset_index() # display the average insurance amount 
-
-            value_column = "Insurance_amount"
-            hover_text = (
-                "<b>%{location}</b><br>"
-                "All Insurance Transactions: %{customdata[1]:,.0f}<br>"
-                "Total Insurance Value: ₹%{customdata[0]:,.0f}<br>"
-                "Avg. Insurance Value: ₹%{customdata[2]:,.0f}<extra></extra>")
-            custom_data = [map_df["Insurance_amount"], map_df["Insurance_count"], map_df["Average_insurance"]]
-
-        # repeated when the user selects "Users"
-        else:
-            map_df = df_filtered.groupby("State").agg({
-                "Registered_users": "sum", # display the registered users for that state in the specific year/quarter
-                "Number_of_app_opens": "sum"}).reset_index() # display the number of app opens 
-
-            value_column = "Registered_users"
-            hover_text = (
-                "<b>%{location}</b><br>"
-                "Total Registered Users: %{customdata[0]:,.0f}<br>"
-                "App Opens: %{customdata[1]:,.0f}<extra></extra>")
-            custom_data = [map_df["Registered_users"], map_df["Number_of_app_opens"]]
-
-        vmin = map_df[value_column].quantile(0.05)
-        vmax = map_df[value_column].quantile(0.95)
+        with METRICS.timed("explore", "geojson"):
+            geometry = load_map_geometry() # local, simplified and compacted Indian state boundaries, built once per process (see geo.py)
+        map_df = view.map_df # state-level totals for the selected year and quarter, precomputed in the cube
 
         st.markdown(f"### {dataset_type} Data Across India ({selected_year} Q{selected_quarter})")
 
-        fig = px.choropleth( # creating a chloropleth map for Indian states 
-            map_df, # using the map_df table
-            geojson=india_geojson, # defining India's state boundaries 
-            featureidkey="properties.ST_NM", # GeoJSON field that contains the state name 
-            locations="State", # column in map_df to match with featureidkey
-            color=value_column, # column used to determine fill colour (eg: transaction_amount)
-            color_continuous_scale="YlOrRd", # yellow-orange-red color scale
-            range_color=(vmin, vmax), # fixed color range 
-            custom_data=custom_data, # extra columns for rich hover text
-        )
-        
-        # using a custom hover template to show detailed metrics when hovering a state 
-        fig.update_traces(hovertemplate = hover_text)
-
-        # fitting the map to the provided locations and hiding default geographic areas
-        fig.update_geos(fitbounds="locations", visible = True, showframe = False, projection_type = "mercator",
-                       showcountries = False, showcoastlines = False,)
-
-        # configuring the layout of the map
-        fig.update_layout(
-            margin={"r": 0, "t": 0, "l": 0, "b": 0}, # removing outer margins 
-            geo_bgcolor="rgba(0,0,0,0)", # transparent map background
-            paper_bgcolor="#0E001A", # overall figure background color 
-            plot_bgcolor="#0E001A", # plot area background color 
-            coloraxis_colorbar=dict(
-                title=f"{dataset_type} Value", # colorbar title
-                tickformat=",.0f", # comma-separated integers on the color bar 
-                tickfont=dict(color="white"),
-            ),
-            font=dict(color="white"),
-            height=500,
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with METRICS.timed("explore", f"choropleth:{dataset_type}"):
+            fig = build_choropleth(map_df, geometry, dataset_type) # see explore_data.py
+        render_chart(fig, "choropleth", measure=True)
 
     except Exception as e:
         st.error(f"Error: {e}")
 
 # -----------------------------------------Creating the BUSINESS CASES PAGE---------------------------------------
 else:
-    DB_USER = os.environ["DB_USER"]
-    DB_PASSWORD = os.environ["DB_PASSWORD"]
-    DB_HOST = os.environ["DB_HOST"]
-    DB_PORT = os.environ["DB_PORT"]
-    DB_NAME = os.environ["DB_NAME"]
-
-    connection_string = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
     st.markdown("<h2 style='color:white;'>Business Case Studies</h2>", unsafe_allow_html=True) # the title for the page
     
     st.markdown("<h4>Explore different Business Case Studies and learn about them!</h4>", unsafe_allow_html = True) 
-    business_cs = ["Decoding Transaction Dynamics on PhonePe", "Device Dominance and User Engagement Analysis",
-                   "Insurance Penetration and Growth Potential Analysis", "User Engagement and Growth Strategy",
-                   "Insurance Transactions Analysis"] # different business case studies
+    from business_data import CASE_STUDY_FIGURES
+    business_cs = list(CASE_STUDY_FIGURES) # different business case studies
     
     selected_cs = st.selectbox("Select a Business Case Study",business_cs) # selectbox will give users the ability to choose between different case studies
     generate = st.button("Generate Report") # Users can click on this button to generate reports based on the case study 
@@ -925,6 +424,8 @@ else:
 
     # The business report consists of three parts: 1. Observations from the plots, 2. Analysis based on the observations, 3. Business recommendations (if applicable) to improve any declining trend or strengthen an already positive trend to boost PhonePe's business.
     if generate:
+        slots = {} # figure name -> placeholder; the text below is shown right away and every chart as soon as it is ready
+
         if selected_cs == "Decoding Transaction Dynamics on PhonePe":
             st.subheader("Decoding Transaction Dynamics on PhonePe")
             
@@ -935,7 +436,7 @@ else:
             
             st.markdown("<h5> 1. Growth of PhonePe's Total Transaction Volume and Value Over the Years </h5>", unsafe_allow_html = True)
 
-            st.plotly_chart(figs["fig1"], use_container_width = True)
+            chart_slot(slots, "fig1")
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
             - The percentage growth in number of transactions has decreased from 2019 to 2024 overall from 277.69% to 54.54%. 
@@ -959,7 +460,7 @@ else:
             # Problem 2 
             
             st.markdown("<h5> 2. Top 5 States with Highest Average Year on Year Transaction Growth </h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig2"], use_container_width = True)
+            chart_slot(slots, "fig2")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -983,7 +484,7 @@ else:
             # Problem 3
             
             st.markdown("<h5> 3. Top 5 States showing the most decline in Transaction Growth from 2021-2024 </h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig3"], use_container_width = True)
+            chart_slot(slots, "fig3")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1008,7 +509,7 @@ else:
             # Problem 4
             
             st.markdown("<h5> 4. Quarters with Highest Transaction Spikes in each Year </h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig4"], use_container_width = True)
+            chart_slot(slots, "fig4")
 
             st.markdown("<b>What is a Transaction Spike?</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1035,7 +536,7 @@ else:
             # Problem 5
             
             st.markdown("<h5> 5. Percentage Share of All Transactions By Each Payment Type </h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig5"], use_container_width = True)
+            chart_slot(slots, "fig5")
 
             st.markdown("<b>What do each payment type mean?</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1070,7 +571,7 @@ else:
 
             st.markdown("<h5> 1. Device Brands with the Highest and Lowest Number of PhonePe App Users </h5>", unsafe_allow_html = True)
 
-            st.plotly_chart(figs["fig6"], use_container_width = True)
+            chart_slot(slots, "fig6")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1095,7 +596,7 @@ else:
             # Problem 7
 
             st.markdown("<h5> 2. Top 3 and Bottom 3 States with the Highest and Lowest App Engagement Rates </h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig7"], use_container_width = True)
+            chart_slot(slots, "fig7")
 
             st.markdown("<b>What does App Engagement Rate mean?</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1122,7 +623,7 @@ else:
             # Problem 8
 
             st.markdown("<h5> 3. Quarters with the Highest and Lowest App Engagement Rate each Year</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig8"], use_container_width = True)
+            chart_slot(slots, "fig8")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1151,7 +652,7 @@ else:
             # Problem 9
             
             st.markdown("<h5>1. Growth in Insurance Transactions and Value each over the years across all states</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig9"], use_container_width = True)
+            chart_slot(slots, "fig9")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1175,7 +676,7 @@ else:
             # Problem 10
             
             st.markdown("<h5>2. Top 5 States with Highest Insurance Transaction Value over the past years</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig10"], use_container_width = True)
+            chart_slot(slots, "fig10")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1194,7 +695,7 @@ else:
             
             # Problem 11 
             st.markdown("<h5>3. Identifying Untapped States (High Total Transaction Values but Relatively Low Insurance Penetration)</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig11"], use_container_width = True)
+            chart_slot(slots, "fig11")
 
             st.markdown("<b>What is meant by Untapped States?</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1227,7 +728,7 @@ else:
             # Problem 12
 
             st.markdown("<h5>1. States showing consistent growth in both user registration and repeat transaction</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig12"], use_container_width = True)
+            chart_slot(slots, "fig12")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1250,8 +751,7 @@ else:
             # Problem 13
             
             st.markdown("<h5>2. Percentage Distribution Of App Opens Across Districts Within Top 3 States</h5>", unsafe_allow_html = True)
-            for state, fig in state_pie_charts.items():
-                st.plotly_chart(fig, use_container_width = True)
+            chart_slot(slots, "state_pie_charts")
 
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1280,7 +780,7 @@ else:
             # Problem 14 
 
             st.markdown("<h5>1. Top 3 Regions recording the highest total Insurance Transaction amount in 2024</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig14"], use_container_width = True)
+            chart_slot(slots, "fig14")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1296,7 +796,7 @@ else:
             # Problem 15 
 
             st.markdown("<h5>2. Year and Quarter combinations saw the highest total insurance transaction volume?</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig15"], use_container_width = True)
+            chart_slot(slots, "fig15")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1310,7 +810,7 @@ else:
             # Problem 16
 
             st.markdown("<h5>3. Top 5 Districts with Highest Total Insurance Transaction Volume in 2024</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig16"], use_container_width = True)
+            chart_slot(slots, "fig16")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1326,7 +826,7 @@ else:
             # Problem 17
 
             st.markdown("<h5>4. Top 5 Pincodes with Highest Growth in Insurance Transaction Count in 2024</h5>", unsafe_allow_html = True)
-            st.plotly_chart(figs["fig17"], use_container_width = True)
+            chart_slot(slots, "fig17")
             
             st.markdown("<b>Observations</b>", unsafe_allow_html = True)
             st.markdown("""
@@ -1337,49 +837,24 @@ else:
             - These postal codes belong to prominent urban and suburban cities like Bengaluru (560103, 560091), Indore (452001), Mumbai suburban region (401208) and Jaipur (302102)
             - These regions have higher concentration of working professionals, wealthier residents and a strong digital adoption culture fueling rapid insurance uptake through PhonePe.
             - It is also likely that PhonePe actively focused its marketing and outreach efforts in these postal codes, tapping into neighbourhoods known for early tech adoption and openness to digital financial products.
-            - Postal codes such as 560103, which corresponds to the Belandur area in Bengaluru, are hubs for IT parks, tech campuses, and newly developed residential complexes, leading to a surge in new residents. As people relocate or find new jobs, insurance purchases, especially health, life or property - often spike as part of onboarding financial planning.""")    
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+            - Postal codes such as 560103, which corresponds to the Belandur area in Bengaluru, are hubs for IT parks, tech campuses, and newly developed residential complexes, leading to a surge in new residents. As people relocate or find new jobs, insurance purchases, especially health, life or property - often spike as part of onboarding financial planning.""")
 
 
+        with METRICS.timed("business", selected_cs):
+            fill_chart_slots(slots, get_figure_registry().iter_figures(CASE_STUDY_FIGURES[selected_cs])) # only the figures of the selected case study are computed
 
 
+# ======================================================
+# DEBUG PANEL
+# ======================================================
 
+METRICS.record({"stage": "page", "name": r, "ms": (time.time() - run_started) * 1000})
+if first_run: # from the first line of the script to the end of the first page this process rendered
+    METRICS.record({"stage": "startup", "name": "first_page", "page": r, "ms": (time.time() - script_started) * 1000})
+if METRICS_PROM:
+    METRICS.write_prometheus(METRICS_PROM) # Prometheus text snapshot for operations, rewritten after every run
 
+if DEBUG_PANEL and st.sidebar.checkbox("Show performance metrics"): # opt-in, only offered with PULSE_DEBUG_PANEL=1
+    with st.sidebar.expander("Performance metrics (this run)", expanded=True):
+        st.dataframe(summarize_events(METRICS.since(run_started, session_id())), hide_index=True)
+        st.download_button("Prometheus snapshot", METRICS.prometheus(), file_name="pulse_metrics.prom")
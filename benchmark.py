@@ -0,0 +1,198 @@
+# ======================================================
+# BENCHMARKS
+# ======================================================
+
+# Times every stage of the app offline against a local stand-in database (the embedded DuckDB backend
+# loaded from the bundled CSVs, or any SQLAlchemy URL): each shared business-case scan and figure build,
+# the EXPLORE DATA cube build, lookup and single-quarter read for every dataset type, create_styled_table and the
+# choropleth, and the startup of app.py in a new process (see bench_startup). Every stage runs --repeat times after one warm-up run and is reported as min / median /
+# p90 / p95 / max in milliseconds. --output writes the results as JSON and --compare prints the
+# median change against an earlier results file, so two commits can be compared. A stage that cannot
+# run here (the choropleth without the map boundaries of geo.py) is listed under "skipped" with the reason.
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --compare bench.json --stages query explore
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+STAGES = ["query", "figure", "explore", "table", "choropleth", "startup"]
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# run in a new interpreter per sample: the app's first run (HOME), then its first EXPLORE DATA run, with the
+# startup events app.py records itself
+STARTUP_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+app = AppTest.from_file("app.py", default_timeout=600).run()
+first_page = time.perf_counter()
+app.sidebar.radio[0].set_value("EXPLORE DATA").run()
+first_explore = time.perf_counter()
+if app.exception:
+    sys.exit(str(app.exception))
+from instrumentation import METRICS
+imports = [event["ms"] for event in METRICS.since(0) if event["stage"] == "startup" and event["name"] == "imports"]
+print(json.dumps({"imports": imports[0], "first_page": (first_page - started) * 1000, "first_explore": (first_explore - first_page) * 1000}))
+"""
+
+
+def timed(fn, repeat):
+    # one warm-up run (connection setup, imports, plotly template loading), then repeat timed runs in ms
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, samples
+
+
+def summarize(samples):
+    values = np.asarray(samples)
+    return {"runs": len(values), "min_ms": float(values.min()), "median_ms": float(np.median(values)),
+            "p90_ms": float(np.percentile(values, 90)), "p95_ms": float(np.percentile(values, 95)),
+            "max_ms": float(values.max())}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+# ------------------------------------------------------
+# Stages
+# ------------------------------------------------------
+
+def bench_business(engine, repeat, stages):
+    from business_data import BUSINESS_FIGURES, SCANS, build_figure
+    results = {}
+    scans = {}
+    for name, query in SCANS.items():
+        scans[name], samples = timed(lambda: pd.read_sql(query, engine), repeat)
+        if "query" in stages:
+            results[f"query:{name}"] = samples
+    if "figure" in stages:
+        for name in BUSINESS_FIGURES:
+            _, samples = timed(lambda: build_figure(name, scans), repeat)
+            results[f"figure:{name}"] = samples
+    return results
+
+
+def bench_explore(engine, repeat, stages, skipped):
+    from explore_data import DATASETS, build_choropleth, build_explore_cube, create_styled_table, open_explore_cube, ranking_page, ranking_pages
+    results = {}
+    geometry = None
+    if "choropleth" in stages:
+        from geo import load_map_geometry
+        try:
+            geometry = load_map_geometry()
+        except FileNotFoundError as e: # assets/ not built (python geo.py); reported, not silently left out
+            skipped["choropleth"] = str(e)
+
+    for dataset_type in DATASETS:
+        cube, samples = timed(lambda: build_explore_cube(engine, dataset_type), repeat)
+        year, quarter = cube.years[-1], cube.quarters[-1]
+        view = cube.get(year, quarter)
+        if "explore" in stages:
+            results[f"explore:cube:{dataset_type}"] = samples
+            results[f"explore:lookup:{dataset_type}"] = timed(lambda: cube.get(year, quarter), repeat)[1]
+            results[f"explore:slice:{dataset_type}"] = timed(lambda: open_explore_cube(engine, dataset_type).get(year, quarter), repeat)[1] # a view that was not prefetched
+        if "table" in stages:
+            value_column = "Total_Users" if dataset_type == "Users" else "Total_Value"
+            for sort, page in [("Highest first", 0), ("Name Z-A", ranking_pages(view.districts) - 1)]: # the first and the last page
+                results[f"table:districts:{dataset_type}:{sort}"] = timed(
+                    lambda: create_styled_table(ranking_page(view.districts, sort, page), "District_name", value_column, "Districts", 340, 150), repeat)[1]
+        if geometry is not None:
+            fig, samples = timed(lambda: build_choropleth(view.map_df, geometry, dataset_type), repeat)
+            results[f"choropleth:build:{dataset_type}"] = samples
+            results[f"choropleth:to_json:{dataset_type}"] = timed(fig.to_json, repeat)[1] # what st.plotly_chart sends to the browser
+            print(f"choropleth payload {dataset_type}: {len(fig.to_json()) / 1024:,.0f} KB per render")
+    return results
+
+
+def bench_startup(repeat):
+    # import time of app.py, time to its first page (HOME) and to the first EXPLORE DATA page of a new process,
+    # against the embedded DuckDB backend unless PULSE_BACKEND says otherwise
+    env = {"PULSE_BACKEND": "duckdb", **os.environ}
+    results = {}
+
+    def sample():
+        done = subprocess.run([sys.executable, "-W", "ignore", "-c", STARTUP_SCRIPT], cwd=APP_DIR, env=env,
+                              capture_output=True, text=True, check=True)
+        for name, ms in json.loads(done.stdout.strip().splitlines()[-1]).items():
+            results.setdefault(f"startup:{name}", []).append(ms)
+
+    timed(sample, repeat)
+    return {name: samples[1:] for name, samples in results.items()} # without the warm-up run
+
+
+def run(engine, repeat=5, stages=STAGES):
+    samples = {}
+    skipped = {} # stage -> why it did not run
+    if {"query", "figure"} & set(stages):
+        samples.update(bench_business(engine, repeat, stages))
+    if {"explore", "table", "choropleth"} & set(stages):
+        samples.update(bench_explore(engine, repeat, stages, skipped))
+    if "startup" in stages:
+        samples.update(bench_startup(repeat))
+    return {"meta": {"commit": git_commit(), "backend": engine.dialect.name, "repeat": repeat,
+                     "python": platform.python_version(), "pandas": pd.__version__,
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "stages": {name: summarize(values) for name, values in samples.items()},
+            "skipped": skipped}
+
+
+def print_report(results, baseline=None):
+    baseline_stages = (baseline or {}).get("stages", {})
+    print(f"{'stage':<40}{'median':>10}{'p90':>10}{'p95':>10}" + (f"{'vs base':>10}" if baseline else ""))
+    for name, stats in results["stages"].items():
+        line = f"{name:<40}{stats['median_ms']:>10.3f}{stats['p90_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+        if name in baseline_stages:
+            change = stats["median_ms"] / baseline_stages[name]["median_ms"] - 1
+            line += f"{change:>+10.0%}"
+        print(line)
+    total = sum(stats["median_ms"] for stats in results["stages"].values())
+    print(f"{'total of medians':<40}{total:>10.3f}")
+    for stage, reason in results.get("skipped", {}).items():
+        print(f"{stage:<40}{'skipped':>10}  {reason}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PhonePe Pulse dashboard stages offline.")
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: the embedded DuckDB backend built from the CSVs)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage (after one warm-up run)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare the medians against")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.url)
+    else:
+        from data_backend import create_duckdb_engine
+        engine = create_duckdb_engine()
+
+    results = run(engine, args.repeat, args.stages)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
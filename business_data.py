@@ -1 +1,780 @@
-
+# ======================================================
+# BUSINESS DATA
+# ======================================================
+
+# Shared table scans and Plotly figure builders behind the BUSINESS CASES page. Each table is read
+# once, as one compact aggregate (SCANS), and every business case is derived from those aggregates
+# in pandas, so a cold load costs one query per table instead of one per figure. Figures are built
+# lazily through FigureRegistry, only when a case study needs them. The missing scans run
+# concurrently on a small thread pool and each figure is built as soon as the scans it reads have
+# arrived. Scans and figures can also be persisted with disk_cache.py.
+
+import functools
+import hashlib
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from sqlalchemy import text
+
+from data_backend import TABLES, table_version
+from disk_cache import cache_key, cached_read_sql
+from explore_data import partition_filter
+from growth import add_growth, aggregate, rank_within, round_half_up
+from instrumentation import METRICS
+from schema import apply_schema
+
+SERIAL_QUERIES = os.environ.get("PULSE_SERIAL_QUERIES", "0") == "1" # set to 1 to run the queries one after another (debugging)
+
+
+# ======================================================
+# SHARED SCANS
+# ======================================================
+
+# One aggregate per table, at the finest grain any business case needs; kept in memory by FigureRegistry.
+# The GROUP BY columns follow the composite indexes in migrations.py, so the database can aggregate in index order.
+# {where} is empty for the full scan; a refresh fills it in to re-read only the changed quarters (see scan_query).
+SCAN_SQL = {
+    "agg_trans": """
+        SELECT Year, Quarter, State, Transaction_type, SUM(Transaction_count) AS Transaction_count,
+        SUM(Transaction_amount) AS Transaction_amount
+        FROM agg_trans{where}
+        GROUP BY Year, Quarter, State, Transaction_type;""",
+    "agg_ins": """
+        SELECT Year, Quarter, State, SUM(Insurance_count) AS Insurance_count, SUM(Insurance_amount) AS Insurance_amount
+        FROM agg_ins{where}
+        GROUP BY Year, Quarter, State;""",
+    "top_ins": """
+        SELECT Year, Quarter, Pincode, State, SUM(Insurance_count) AS Insurance_count, SUM(Insurance_amount) AS Insurance_amount
+        FROM top_ins{where}
+        GROUP BY Year, Quarter, Pincode, State;""",
+    "map_user": """
+        SELECT Year, Quarter, State, District_name, SUM(Registered_users) AS Registered_users,
+        SUM(Number_of_app_opens) AS Number_of_app_opens,
+        COUNT(Registered_users) AS registered_rows, COUNT(Number_of_app_opens) AS app_open_rows
+        FROM map_user{where}
+        GROUP BY Year, Quarter, State, District_name;""",
+    "agg_user": """
+        SELECT Brand_name, SUM(User_count) AS User_count
+        FROM agg_user
+        GROUP BY Brand_name;""",
+    "map_ins": """
+        SELECT Year, Quarter, State, District_name, SUM(Insurance_amount) AS Insurance_amount
+        FROM map_ins{where}
+        GROUP BY Year, Quarter, State, District_name;"""}
+
+SCANS = {name: text(sql.format(where="")) for name, sql in SCAN_SQL.items()}
+PARTITIONED_SCANS = {name for name, sql in SCAN_SQL.items() if "{where}" in sql} # grouped by (Year, Quarter), so a quarter can be re-read on its own
+
+
+# ======================================================
+# QUERY 1
+# ======================================================
+def yearly_transactions(trans):
+    yearly = aggregate(trans, ["Transaction_count", "Transaction_amount"])
+    return yearly.rename(columns={"Transaction_count": "total_transactions", "Transaction_amount": "transaction_amount"})
+
+
+def build_fig1(df_trans_value_growth):
+    df_trans_value_growth = add_growth(df_trans_value_growth, ["total_transactions", "transaction_amount"])
+    df_trans_value_growth["Transaction Number Growth (%)"] = df_trans_value_growth["total_transactions_growth_pct"]
+    df_trans_value_growth["Transaction Amount Growth (%)"] = df_trans_value_growth["transaction_amount_growth_pct"]
+    df_trans_value_growth_fil = df_trans_value_growth[df_trans_value_growth["Year"] != 2018]
+
+    fig = px.bar(
+                        df_trans_value_growth_fil,
+                        x="Year",
+                        y=["Transaction Number Growth (%)", "Transaction Amount Growth (%)"],
+                        barmode="group",
+                        title="Growth in Transaction Volume Over Years", color_discrete_sequence = ["#636EFA","#EF553B"])
+    return fig
+
+
+# ======================================================
+# QUERY 2
+# ======================================================
+def state_growth_extremes(trans):
+    # the states among the 3 fastest or 3 slowest growing of any year, top 5 by their average YoY growth since 2019
+    df = add_growth(aggregate(trans, ["Transaction_count"], keys=["State"]), ["Transaction_count"], keys=["State"])
+    df["YoY_Transaction_Growth_Percent"] = round_half_up(df["Transaction_count_growth_pct"])
+    growth = df[df["YoY_Transaction_Growth_Percent"].notna()]
+    extremes = growth[(rank_within(growth, ["Year"], "YoY_Transaction_Growth_Percent") <= 3) |
+                      (rank_within(growth, ["Year"], "YoY_Transaction_Growth_Percent", ascending=True) <= 3)]
+    selected = df[df["State"].isin(extremes["State"]) & (df["Year"] >= 2019)]
+    averages = selected.groupby("State", observed=True)["YoY_Transaction_Growth_Percent"].mean()
+    return averages.rename("avg_txn_growth_pct").reset_index().sort_values("avg_txn_growth_pct", ascending=False, kind="stable").head(5).reset_index(drop=True)
+
+
+def build_fig2(df_state_yoy_growth):
+    df_state_yoy_growth.fillna(0, inplace = True)
+    fig = px.bar(df_state_yoy_growth, x = "State", y = "avg_txn_growth_pct", color = "State", color_discrete_sequence = px.colors.qualitative.Plotly,
+                          labels = {"avg_txn_growth_pct": "Average Transaction Growth (%)", "State": "State"},
+                          title = "Top 5 States with Highest Average YoY Transaction Growth")
+    fig.update_layout(height = 500)
+    return fig
+
+
+# ======================================================
+# QUERY 3
+# ======================================================
+def declining_state_growth(trans):
+    # YoY growth of the 5 states that grew the least in 2024, every year since 2021
+    yearly = aggregate(trans[trans["Year"].between(2020, 2024)], ["Transaction_count"], keys=["State"])
+    df = add_growth(yearly, ["Transaction_count"], keys=["State"])
+    df["YoY Transaction Growth (%)"] = round_half_up(df["Transaction_count_growth_pct"])
+    growth = df[df["Transaction_count_prev"].notna()]
+    declining = growth[growth["Year"] == 2024].sort_values("YoY Transaction Growth (%)", kind="stable").head(5)["State"]
+    selected = growth[growth["State"].isin(declining)].sort_values(["State", "Year"], kind="stable")
+    return selected[["State", "Year", "YoY Transaction Growth (%)"]].reset_index(drop=True)
+
+
+def build_fig3(df_trans_growth_decline):
+    fig = px.line(df_trans_growth_decline, x = "Year", y = "YoY Transaction Growth (%)", color = "State", markers = True,
+                           color_discrete_sequence = px.colors.qualitative.Plotly,
+                           labels = {"State":"Regions", "YoY Transaction Growth (%)":"YoY Transaction Growth (%)"},
+                           title="Top 5 Regions Showing Most Decline in Transaction Growth From 2021-2024")
+    fig.update_xaxes(tickmode = "array", tickvals = [2019, 2020, 2021, 2022, 2023, 2024], 
+                      ticktext = ["2019","2020","2021","2022","2023","2024"])
+    fig.update_traces(mode = "lines + markers", marker = dict(size = 6))
+    return fig
+
+
+# ======================================================
+# QUERY 4
+# ======================================================
+def quarter_spikes(trans):
+    # the quarter of each year with the biggest QoQ jump in transactions
+    quarterly = aggregate(trans[trans["Year"].between(2018, 2024)], ["Transaction_count"], period="quarter")
+    df = add_growth(quarterly, ["Transaction_count"], period="quarter")
+    top = df[rank_within(df, ["Year"], "Transaction_count_growth_pct") == 1].sort_values("Year")
+    return pd.DataFrame({"Year": top["Year"].to_numpy(), "Quarter With Max Pct Spike": top["Quarter"].to_numpy(),
+                         "Total Transactions": top["Transaction_count"].to_numpy(),
+                         "Prev Total Transactions": top["Transaction_count_prev"].to_numpy(),
+                         "Spike Pct": round_half_up(top["Transaction_count_growth_pct"]).to_numpy()})
+
+
+def build_fig4(df_quarter_spike):
+    df_quarter_spike["Quarter With Max Pct Spike"] = df_quarter_spike["Quarter With Max Pct Spike"].astype(str)
+    
+    fig = px.bar(df_quarter_spike, x = "Year", y = "Spike Pct", color = "Quarter With Max Pct Spike",
+                  labels = {"Year":"Year","Spike Pct":"Transaction Spike (%)","Quarter With Max Pct Spike":"Quarter"},
+                  color_discrete_sequence = px.colors.qualitative.Plotly,
+                  title = "Quarters with Highest Transaction Spike in Each Year")
+    return fig
+
+
+# ======================================================
+# QUERY 5
+# ======================================================
+def payment_type_share(trans):
+    # average over the years of each payment type's share of that year's transaction amount
+    amounts = trans.groupby(["Year", "Transaction_type"], observed=True)["Transaction_amount"].sum()
+    shares = amounts * 100.0 / amounts.groupby(level="Year").transform("sum")
+    averages = round_half_up(shares.groupby(level="Transaction_type").mean())
+    return pd.DataFrame({"Transaction Type": averages.index.to_numpy(), "Average Share Pct": averages.to_numpy()})
+
+
+def build_fig5(df_trans_type_high_share):
+    fig = px.pie(df_trans_type_high_share, names = "Transaction Type", values = "Average Share Pct", 
+                          color = "Transaction Type",
+                          color_discrete_sequence = px.colors.qualitative.Plotly,
+                          title = "Percentage Share of All Transactions By Each Payment Type")
+
+    fig.update_traces(textposition = "outside", pull = 0.1)
+    fig.update_layout(width = 600, height = 500, uniformtext_minsize = 14, uniformtext_mode = "show")
+    return fig
+
+
+# ======================================================
+# QUERY 6
+# ======================================================
+def brand_extremes(brands):
+    # the 3 most and 3 least used device brands (RANK() semantics: ties are all kept)
+    df = brands.rename(columns={"Brand_name": "Brandname", "User_count": "Totalusers"})
+    keep = (df["Totalusers"].rank(method="min", ascending=False) <= 3) | (df["Totalusers"].rank(method="min") <= 3)
+    return df[keep].sort_values("Totalusers", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def build_fig6(df_device_brand_users):
+    df_device_brand_users = df_device_brand_users.rename(columns = {"Brandname":"Brand Name", 
+                                                                "Totalusers":"Total Users"})
+    top3_df = df_device_brand_users.iloc[0:3]
+    bottom3_df = df_device_brand_users.iloc[3:]
+    
+    palette = px.colors.qualitative.Plotly
+    
+    top3_colors = [palette[i % len(palette)] for i in range(len(top3_df))]
+    bottom3_colors = [palette[i % len(palette)] for i in range(len(bottom3_df))]
+    
+    fig = make_subplots(rows = 1, cols = 2, subplot_titles = ("Top 3 Mobile Brands",
+                                                               "Bottom 3 Mobile Brands"))
+    fig.add_trace(go.Bar(x = top3_df["Brand Name"], y = top3_df["Total Users"],
+                          marker_color = top3_colors), row = 1, col = 1)
+    fig.add_trace(go.Bar(x = bottom3_df["Brand Name"], y = bottom3_df["Total Users"],
+                         marker_color = bottom3_colors), row = 1, col = 2)
+    
+    fig.update_layout(title_text = "Total Number of PhonePe Users For Each Device Brand", showlegend = False)
+    return fig
+
+
+# ======================================================
+# QUERY 7
+# ======================================================
+def engagement_extremes(users):
+    # the 3 states with the highest and lowest app opens per registered user (averages over the district rows)
+    states = users.groupby("State", observed=True)[["Registered_users", "Number_of_app_opens", "registered_rows", "app_open_rows"]].sum()
+    average_users = round_half_up(states["Registered_users"] / states["registered_rows"])
+    average_opens = round_half_up(states["Number_of_app_opens"] / states["app_open_rows"])
+    rates = round_half_up(average_opens / average_users)
+    extremes = pd.concat([rates.sort_values(ascending=False, kind="stable").head(3), rates.sort_values(kind="stable").head(3)])
+    extremes = extremes.sort_values(ascending=False, kind="stable")
+    return pd.DataFrame({"State": extremes.index.to_numpy(), "EngagementRate": extremes.to_numpy()})
+
+
+def build_fig7(df_state_user_eng_rate):
+    df_state_user_eng_rate = df_state_user_eng_rate.rename(columns = {"EngagementRate":"Engagement Rate"})
+
+    top3_eng = df_state_user_eng_rate.iloc[0:3]
+    bottom3_eng = df_state_user_eng_rate.iloc[3:]
+    
+    palette = px.colors.qualitative.Plotly
+    
+    top3_colors = [palette[i % len(palette)] for i in range(len(top3_eng))]
+    bottom3_colors = [palette[i % len(palette)] for i in range(len(bottom3_eng))]
+    
+    fig = make_subplots(rows = 1, cols = 2, subplot_titles = ("Top 3 Regions",
+                                                               "Bottom 3 Regions"))
+    fig.add_trace(go.Bar(x = top3_eng["State"], y = top3_eng["Engagement Rate"],
+                          marker_color = top3_colors), row = 1, col = 1)
+    fig.add_trace(go.Bar(x = bottom3_eng["State"], y = bottom3_eng["Engagement Rate"],
+                         marker_color = bottom3_colors), row = 1, col = 2)
+    
+    fig.update_layout(title_text = "PhonePe App Engagement Rates For Each Region", showlegend = False)
+    return fig
+
+
+# ======================================================
+# QUERY 8
+# ======================================================
+def quarter_engagement_extremes(users):
+    # the most and least engaged quarter of every year (RANK() semantics: ties are all kept)
+    quarters = users.groupby(["Year", "Quarter"], observed=True)[["Number_of_app_opens", "Registered_users"]].sum().reset_index()
+    quarters["Engagement Rate"] = round_half_up(quarters["Number_of_app_opens"] / quarters["Registered_users"], 4)
+    by_year = quarters.groupby("Year")["Engagement Rate"]
+    keep = (quarters["Engagement Rate"] == by_year.transform("max")) | (quarters["Engagement Rate"] == by_year.transform("min"))
+    extremes = quarters.loc[keep, ["Year", "Quarter", "Engagement Rate"]]
+    return extremes.sort_values(["Year", "Quarter", "Engagement Rate"], kind="stable").reset_index(drop=True)
+
+
+def build_fig8(df_quarter_user_eng_rate):
+    df_quarter_user_eng_rate = df_quarter_user_eng_rate[df_quarter_user_eng_rate["Year"]!=2018]
+    df_quarter_user_eng_rate["Quarter"] = df_quarter_user_eng_rate["Quarter"].astype(str)
+    df_quarter_user_eng_rate = df_quarter_user_eng_rate.sort_values(["Year","Engagement Rate"], ascending = [True, True])
+    fig = px.bar(df_quarter_user_eng_rate, x = "Year", y = "Engagement Rate",
+                          barmode = "group", labels = {"Year":"Year", "Quarter":"Quarter", "Engagement Rate":"Engagement Rate"}, 
+                          color = "Quarter",
+                          color_discrete_sequence = px.colors.qualitative.Plotly,
+                          title = "Highest and Lowest PhonePe App User Engagement Rate Per Year")
+    return fig
+
+
+# ======================================================
+# QUERY 9
+# ======================================================
+def insurance_growth(ins):
+    metrics = ["Insurance_count", "Insurance_amount"]
+    df = add_growth(aggregate(ins[ins["Year"].between(2020, 2024)], metrics), metrics)
+    df = df[df["Insurance_count_prev"].notna() & df["Insurance_amount_prev"].notna()]
+    return pd.DataFrame({"Year": df["Year"].to_numpy(), "No of Insurance Transactions": df["Insurance_count"].to_numpy(),
+                         "Total Insurance Amount": df["Insurance_amount"].to_numpy(),
+                         "Insurance Transaction Growth (%)": round_half_up(df["Insurance_count_growth_pct"]).to_numpy(),
+                         "Insurance Amount Growth (%)": round_half_up(df["Insurance_amount_growth_pct"]).to_numpy()})
+
+
+def build_fig9(df_ins_growth_each_year):
+    fig = px.bar(df_ins_growth_each_year, x = "Year", y = ["Insurance Transaction Growth (%)", "Insurance Amount Growth (%)"],
+                          barmode = "group",
+                          color_discrete_sequence = px.colors.qualitative.Plotly,
+                          labels = {"Year":"Year","Insurance Transaction Growth (%)":"Insurance Transaction Growth (%)",
+                                    "Insurance Amount Growth (%)":"Insurance Amount Growth (%)","variable":"Metric", 
+                                    "value":"Growth (%)"},
+                          title = "Growth in Number Of Transactions and Total Insurance Transactions Over The Years")
+    return fig
+
+
+# ======================================================
+# QUERY 10
+# ======================================================
+def insurance_value_range(ins):
+    # spread between the best and the worst year of each state, top 5
+    totals = aggregate(ins, ["Insurance_amount"], keys=["State"]).groupby("State", observed=True)["Insurance_amount"]
+    spread = (totals.max() - totals.min()).rename("InsuranceTransactionValue").reset_index()
+    return spread.sort_values("InsuranceTransactionValue", ascending=False, kind="stable").head(5).reset_index(drop=True)
+
+
+def build_fig10(df_high_insurance_trans):
+    df_high_insurance_trans["InsuranceTransactionValue"] = df_high_insurance_trans["InsuranceTransactionValue"]/1e7
+
+    df_high_insurance_trans = df_high_insurance_trans.rename(columns = 
+                                                             {"InsuranceTransactionValue":"Insurance Transaction Value (in Cr)"})
+    
+    fig = px.bar(df_high_insurance_trans, x = "State", y = "Insurance Transaction Value (in Cr)",
+                   color = "State",
+                   color_discrete_sequence = px.colors.qualitative.Plotly,
+                   labels = {"State":"State","Insurance Transaction Value (in Cr)":"Insurance Transaction Value (in Cr)"},
+                   title = "Top 5 States with Highest Insurance Transaction Value Over The Years")
+    return fig
+
+
+# ======================================================
+# QUERY 11
+# ======================================================
+def untapped_states(trans, ins):
+    # states with the lowest share of transactions that are insurance purchases
+    df = trans.groupby("State", observed=True)[["Transaction_count", "Transaction_amount"]].sum(min_count=1)
+    df = df.join(ins.groupby("State", observed=True)[["Insurance_count", "Insurance_amount"]].sum(min_count=1), how="left")
+    penetration = round_half_up(df["Insurance_count"] * 100.0 / df["Transaction_count"].where(df["Transaction_count"] != 0), 5)
+    value_share = round_half_up(df["Insurance_amount"] * 100.0 / df["Transaction_amount"].where(df["Transaction_amount"] != 0), 5)
+    df = pd.DataFrame({"State": df.index.to_numpy(), "Total Transactions": df["Transaction_count"].to_numpy(),
+                       "Total Transaction Amount": df["Transaction_amount"].to_numpy(), "Total Insurances": df["Insurance_count"].to_numpy(),
+                       "Total Insurance Amount": df["Insurance_amount"].to_numpy(), "Insurance Penetration Rate": penetration.to_numpy(),
+                       "Insurance Value Share": value_share.to_numpy()})
+    df = df[df["Insurance Penetration Rate"].notna()]
+    return df.sort_values("Insurance Penetration Rate", kind="stable").head(5).reset_index(drop=True)
+
+
+def build_fig11(df_untapped_region):
+    fig = px.bar(df_untapped_region, x = "State", y = ["Insurance Penetration Rate"], 
+                           color = 'State',
+                           color_discrete_sequence = px.colors.qualitative.Plotly, 
+                           labels = {"State": "State","variable": "Metric","value": "Insurance Penetration Rate"},
+                           title = "Untapped States - High Total Transaction Values But Relatively Low Insurance Penetration")
+    return fig
+
+
+# ======================================================
+# QUERY 12
+# ======================================================
+def consistent_growth(users, trans):
+    # states whose registered users and transactions both grew on average, top 10 by transaction growth
+    user_growth = add_growth(aggregate(users, ["Registered_users"], keys=["State"]), ["Registered_users"], keys=["State"])
+    txn_growth = add_growth(aggregate(trans, ["Transaction_count"], keys=["State"]), ["Transaction_count"], keys=["State"])
+    df = user_growth.merge(txn_growth, on=["State", "Year"])
+    df = df[df["Registered_users_prev"].notna() & df["Transaction_count_prev"].notna()]
+    averages = df.assign(reg_growth_pct=round_half_up(df["Registered_users_growth_pct"]), txn_growth_pct=round_half_up(df["Transaction_count_growth_pct"])) \
+                 .groupby("State", observed=True)[["reg_growth_pct", "txn_growth_pct"]].mean()
+    averages = round_half_up(averages[(averages["reg_growth_pct"] > 0) & (averages["txn_growth_pct"] > 0)])
+    averages = averages.sort_values("txn_growth_pct", ascending=False, kind="stable").head(10).reset_index()
+    return averages.rename(columns={"State": "state", "reg_growth_pct": "avg_user_growth_pct", "txn_growth_pct": "avg_txn_growth_pct"})
+
+
+def build_fig12(df_state_consistent_growth):
+    df_state_consistent_growth = df_state_consistent_growth.rename(columns = {"state":"State", 
+                                                                          "avg_user_growth_pct":"Average User Growth (%)",
+                                                                          "avg_txn_growth_pct":"Average Transaction Growth (%)"})
+
+    fig = px.bar(df_state_consistent_growth, x = "State", y = ["Average User Growth (%)", "Average Transaction Growth (%)"], 
+               barmode = "group", color_discrete_sequence = px.colors.qualitative.Plotly, 
+               labels = {"State": "State","variable": "Metric","value": "Growth (%)"},
+               title = "States Showing Consistent Growth in User Registration and Repeat Transaction")
+    return fig
+
+
+# ======================================================
+# QUERY 13 (STATE PIE CHARTS)
+# ======================================================
+def top_state_districts(users):
+    # the 5 biggest districts (by registered users) of the 3 biggest states, with their share of the state's app opens
+    districts = users.groupby(["State", "District_name"], observed=True)[["Registered_users", "Number_of_app_opens"]].sum().reset_index()
+    states = districts.groupby("State", observed=True)[["Registered_users", "Number_of_app_opens"]].sum()
+    districts["App Open Share"] = round_half_up(districts["Number_of_app_opens"] / districts.groupby("State", observed=True)["Number_of_app_opens"].transform("sum") * 100)
+    top_states = states["Registered_users"].sort_values(ascending=False, kind="stable").head(3).index
+    districts = districts[districts["State"].isin(top_states)]
+    districts = districts.assign(district_rank=rank_within(districts, ["State"], "Registered_users"))
+    districts = districts[districts["district_rank"] <= 5].sort_values(["State", "district_rank"])
+    return pd.DataFrame({"State": districts["State"].to_numpy(), "District Name": districts["District_name"].to_numpy(),
+                         "Total App Opens": districts["Number_of_app_opens"].to_numpy(), "App Open Share": districts["App Open Share"].to_numpy()})
+
+
+def build_state_pie_charts(df_district_metrics):
+    state_pie_charts = {}
+    states = df_district_metrics['State'].unique()
+    
+    for state in states:
+        df_state = df_district_metrics[df_district_metrics['State'] == state]
+        
+        pie = px.pie(
+            df_state,
+            values = 'App Open Share',
+            names = 'District Name',
+            title = f'App Open Share Percent for {state}',
+            hole = 0.3 
+        )
+        pie.update_traces(textposition ='inside', textinfo='percent+label')
+        state_pie_charts[state] = pie
+    return state_pie_charts
+
+
+# ======================================================
+# QUERY 14
+# ======================================================
+def top_insurance_states(top):
+    states = top[top["Year"] == 2024].groupby("State", observed=True)["Insurance_amount"].sum(min_count=1)
+    states = round_half_up(states).sort_values(ascending=False, kind="stable").head(3)
+    return pd.DataFrame({"state": states.index.to_numpy(), "total_insurance_amount": states.to_numpy()})
+
+
+def build_fig14(df_high_total_trans_region):
+    df_high_total_trans_region = df_high_total_trans_region.rename(columns = {"state":"State",
+                                                                        "total_insurance_amount":"Total Insurance Amount"})
+
+    df_high_total_trans_region = df_high_total_trans_region.sample(frac = 1).reset_index(drop = True)
+    fig = px.bar(df_high_total_trans_region, x = "State", y = "Total Insurance Amount", 
+                   color = "State",
+                   color_discrete_sequence = px.colors.qualitative.Plotly, 
+                   labels = {"State": "Regions","Total Insurance Amount":"Total Insurance Amount"},
+                   title = "Top 3 Regions Recording the Highest Total Insurance Transaction Amount in 2024")
+    return fig
+
+
+# ======================================================
+# QUERY 15
+# ======================================================
+def top_insurance_quarters(top):
+    # the quarter with the highest insurance amount of every year (RANK() semantics: ties are all kept)
+    quarters = top.groupby(["Year", "Quarter"], observed=True)["Insurance_amount"].sum(min_count=1).reset_index()
+    quarters = quarters[quarters["Insurance_amount"] == quarters.groupby("Year")["Insurance_amount"].transform("max")]
+    return pd.DataFrame({"year": quarters["Year"].to_numpy(), "quarter": quarters["Quarter"].to_numpy(),
+                         "total_insurance_trans_volume": quarters["Insurance_amount"].to_numpy()})
+
+
+def build_fig15(df_y_q_high_trans):
+    df_y_q_high_trans = df_y_q_high_trans.rename(columns = {"year":"Year","quarter":"Quarter",
+                                                        "total_insurance_trans_volume":"Total Insurance Trans Volume"})
+
+    df_y_q_high_trans["Quarter"] = df_y_q_high_trans["Quarter"].astype(str)
+    fig = px.bar(df_y_q_high_trans, x = "Year", y = "Total Insurance Trans Volume",
+                   color = "Quarter", 
+                   color_discrete_sequence = px.colors.qualitative.Plotly,
+                   labels = {"State": "State","Total Insurance Trans Volume":"Total Insurance Trans Volume","Quarter":"Quarter"},
+                   title = "Year and Quarter Combinations With Highest Total Insurance Transaction Volume")
+    return fig
+
+
+# ======================================================
+# QUERY 16
+# ======================================================
+def top_insurance_districts(districts):
+    totals = districts[districts["Year"] == 2024].groupby("District_name", observed=True)["Insurance_amount"].sum(min_count=1)
+    totals = totals.sort_values(ascending=False, kind="stable").head(5)
+    return pd.DataFrame({"district_name": totals.index.to_numpy(), "total_insurance_value": totals.to_numpy()})
+
+
+def build_fig16(df_top5_districts_ins):
+    df_top5_districts_ins = df_top5_districts_ins.rename(columns = {"district_name":"District Name", 
+                                                                  "total_insurance_value":"Total Insurance Volume"})
+
+    fig = px.bar(df_top5_districts_ins, x = "District Name", y = "Total Insurance Volume",
+               color = "District Name",
+               color_discrete_sequence = px.colors.qualitative.Plotly,
+               labels = {"District Name":"District Name","Total Insurance Volume":"Total Insurance Volume"},
+               title = "Top 5 Districts With Highest Total Insurance Transaction Volume In 2024")
+    return fig
+
+
+# ======================================================
+# QUERY 17
+# ======================================================
+def pincode_growth(top):
+    # pincodes with the biggest rise in insurance transactions from 2023 to 2024
+    yearly = aggregate(top[top["Year"].between(2023, 2024)], ["Insurance_count"], keys=["Pincode"])
+    df = add_growth(yearly, ["Insurance_count"], keys=["Pincode"])
+    growth = df[(df["Year"] == 2024) & df["Insurance_count_prev"].notna()]
+    growth = growth.sort_values("Insurance_count_growth", ascending=False, kind="stable").head(5)
+    return pd.DataFrame({"pincode": growth["Pincode"].to_numpy(), "growth_from_prev_year": growth["Insurance_count_growth"].to_numpy()})
+
+
+def build_fig17(df_pincode_ins_trans):
+    df_pincode_ins_trans = df_pincode_ins_trans.rename(columns = {"pincode":"Pincode",
+                                                              "growth_from_prev_year":"Growth From Prev Year"})
+
+    df_pincode_ins_trans["Pincode"] = df_pincode_ins_trans["Pincode"].astype(int)
+    df_pincode_ins_trans["Growth From Prev Year"] = df_pincode_ins_trans["Growth From Prev Year"].astype(int)
+    
+    df_pincode_ins_trans["Pincode"] = df_pincode_ins_trans["Pincode"].astype(str) 
+    fig = px.bar(df_pincode_ins_trans, x = "Pincode", y = "Growth From Prev Year", 
+                    color = "Pincode",
+                    color_discrete_sequence = px.colors.qualitative.Plotly,
+                    labels = {"Pincode":"Pincode","Growth From Prev Year":"Growth From Previous Year"},
+                    title = "Top 5 Pincodes With Highest Growth in Insurance Transactions in 2024")
+    
+    fig.update_layout(xaxis_type = "category", bargap = 0.2)
+    return fig
+
+# ======================================================
+# FIGURE REGISTRY
+# ======================================================
+
+# Each figure is declared once with the scans it reads, the function deriving the figure's data from
+# them and the builder that turns that data into a figure. "state_pie_charts" builds a dict of pie
+# charts, one per state (Query 13).
+FigureSpec = namedtuple("FigureSpec", ["scans", "derive", "builder"])
+
+BUSINESS_FIGURES = {
+    "fig1": FigureSpec(("agg_trans",), yearly_transactions, build_fig1),
+    "fig2": FigureSpec(("agg_trans",), state_growth_extremes, build_fig2),
+    "fig3": FigureSpec(("agg_trans",), declining_state_growth, build_fig3),
+    "fig4": FigureSpec(("agg_trans",), quarter_spikes, build_fig4),
+    "fig5": FigureSpec(("agg_trans",), payment_type_share, build_fig5),
+    "fig6": FigureSpec(("agg_user",), brand_extremes, build_fig6),
+    "fig7": FigureSpec(("map_user",), engagement_extremes, build_fig7),
+    "fig8": FigureSpec(("map_user",), quarter_engagement_extremes, build_fig8),
+    "fig9": FigureSpec(("agg_ins",), insurance_growth, build_fig9),
+    "fig10": FigureSpec(("agg_ins",), insurance_value_range, build_fig10),
+    "fig11": FigureSpec(("agg_trans", "agg_ins"), untapped_states, build_fig11),
+    "fig12": FigureSpec(("map_user", "agg_trans"), consistent_growth, build_fig12),
+    "state_pie_charts": FigureSpec(("map_user",), top_state_districts, build_state_pie_charts),
+    "fig14": FigureSpec(("top_ins",), top_insurance_states, build_fig14),
+    "fig15": FigureSpec(("top_ins",), top_insurance_quarters, build_fig15),
+    "fig16": FigureSpec(("map_ins",), top_insurance_districts, build_fig16),
+    "fig17": FigureSpec(("top_ins",), pincode_growth, build_fig17)}
+
+# the figures each entry of the BUSINESS CASES selectbox displays, in the order they appear on the page
+CASE_STUDY_FIGURES = {
+    "Decoding Transaction Dynamics on PhonePe": ["fig1", "fig2", "fig3", "fig4", "fig5"],
+    "Device Dominance and User Engagement Analysis": ["fig6", "fig7", "fig8"],
+    "Insurance Penetration and Growth Potential Analysis": ["fig9", "fig10", "fig11"],
+    "User Engagement and Growth Strategy": ["fig12", "state_pie_charts"],
+    "Insurance Transactions Analysis": ["fig14", "fig15", "fig16", "fig17"]}
+
+
+def figure_data(name, scans):
+    # scans: {scan name: frame}; the derive functions never modify the scans, which are shared by several figures
+    spec = BUSINESS_FIGURES[name]
+    return spec.derive(*[scans[scan] for scan in spec.scans])
+
+
+def build_figure(name, scans):
+    return BUSINESS_FIGURES[name].builder(figure_data(name, scans))
+
+
+def query_tables(query):
+    # the tables a query reads, found by name in its SQL
+    return frozenset(table for table in TABLES if re.search(rf"\b{table}\b", str(query)))
+
+
+SCAN_TABLES = {name: query_tables(query) for name, query in SCANS.items()}
+FIGURE_TABLES = {name: frozenset().union(*[SCAN_TABLES[scan] for scan in spec.scans]) for name, spec in BUSINESS_FIGURES.items()}
+
+
+def figure_version(name, versions):
+    return table_version(FIGURE_TABLES[name], versions)
+
+
+# the code the figures are built by: the scans, derive functions and builders, the growth engine, and the dtypes
+# schema.py gives the scanned frames (categoricals and integer widths change how they group, sort and round)
+FIGURE_SOURCES = ["business_data.py", "growth.py", "schema.py"]
+FIGURE_LIBRARIES = [pd, np, plotly] # their versions too: the same code can derive other frames or draw other figures on another release
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    # fingerprint of the figure code, read once per process: a figure built by other code is stale even if the
+    # data has not changed, so it is part of every figure's cache key and of the prerender.py manifest
+    digest = hashlib.sha256()
+    for name in FIGURE_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+            digest.update(f.read())
+    for library in FIGURE_LIBRARIES:
+        digest.update(f"{library.__name__}=={library.__version__}".encode())
+    return digest.hexdigest()[:16]
+
+
+def scan_query(name, partitions):
+    # the scan limited to the given (year, quarter) partitions, and its parameters
+    where, params = partition_filter(partitions)
+    return text(SCAN_SQL[name].format(where=where)), params
+
+
+def query_workers(engine):
+    # one worker per pooled connection, so the pool never makes a worker wait for a connection
+    size = getattr(engine.pool, "size", None)
+    return max(1, size()) if callable(size) else 1
+
+
+def run_scans(engine, names, serial=SERIAL_QUERIES, cache=None, versions=None):
+    # yields (scan name, frame) in completion order; the caller builds figures while the remaining scans are still running.
+    # Frames come back with the compact dtypes of schema.py, like every other table read. A scan that fails yields
+    # its exception in place of the frame, so only the figures reading it fail
+    session = METRICS.current_session()
+
+    def read(name):
+        METRICS.bind_session(session) # pool threads work for whichever session asked last
+        try:
+            return apply_schema(cached_read_sql(cache, engine, SCANS[name], version=table_version(SCAN_TABLES[name], versions), name="scan:" + name))
+        except Exception as e:
+            return e
+
+    if serial:
+        for name in names:
+            yield name, read(name)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(names), query_workers(engine)), thread_name_prefix="pulse-query") as pool:
+        futures = {pool.submit(read, name): name for name in names}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+class FigureRegistry:
+    # Builds figures on demand and memoizes each one individually, along with the table scans they are
+    # derived from. Every figure and every scan has its own lock, so two sessions asking for the same figure
+    # compute it once and a table is scanned once, while a slow figure never blocks unrelated ones. With a
+    # DiskCache, figures and scans are also persisted under the versions of the tables they read, so a
+    # restarted process loads them from disk instead of querying the database. Figures prerendered for the
+    # current data (see prerender.py) are loaded before either is tried.
+
+    def __init__(self, engine, serial=SERIAL_QUERIES, cache=None, versions=None, prerendered=None):
+        self.engine = engine
+        self.serial = serial
+        self.cache = cache
+        self.prerendered = prerendered # prerender.PrerenderedFigures, consulted before the cache
+        self.versions = dict(versions or {})
+        self._figures = {}
+        self._scans = {}
+        self._locks = {name: threading.Lock() for name in BUSINESS_FIGURES}
+        self._scan_locks = {name: threading.Lock() for name in SCANS}
+
+    def _figure_key(self, name):
+        queries = " ".join(str(SCANS[scan]) for scan in BUSINESS_FIGURES[name].scans)
+        return cache_key("figure:" + name, queries, version=f"{figure_version(name, self.versions)}@{code_version()}")
+
+    def scans(self, names):
+        # yields (scan name, frame) for the given scans, memoized ones first, the others as they are read;
+        # the locks are taken after the figure locks (a fixed order, so no deadlocks)
+        for name in names:
+            if name in self._scans:
+                yield name, self._scans[name]
+        locked = sorted(name for name in set(names) if name not in self._scans)
+        for name in locked:
+            self._scan_locks[name].acquire()
+        try:
+            for name in locked:
+                if name in self._scans: # read by another session meanwhile
+                    yield name, self._scans[name]
+            missing = [name for name in locked if name not in self._scans]
+            if missing:
+                for name, df in run_scans(self.engine, missing, serial=self.serial, cache=self.cache, versions=self.versions):
+                    if not isinstance(df, Exception): # a failed scan is tried again on the next request
+                        self._scans[name] = df
+                    yield name, df
+        finally:
+            for name in locked:
+                self._scan_locks[name].release()
+
+    def iter_figures(self, names):
+        # yields (name, figure) as each one is ready - memoized figures first, then the ones found on disk, then
+        # the built ones in the order their scans arrive - so the page can show every chart as soon as it exists.
+        # A figure whose scan or builder fails yields (name, exception) instead, and the other figures carry on
+        done = [name for name in names if name in self._figures]
+        for name in done:
+            METRICS.record({"stage": "figure", "name": name, "cache": "hit"})
+            yield name, self._figures[name]
+        locked = sorted(set(names) - set(done)) # fixed lock order, no deadlocks
+        for name in locked:
+            self._locks[name].acquire()
+        try:
+            for name in locked:
+                if name in self._figures: # another session built it meanwhile
+                    yield name, self._figures[name]
+            missing = [name for name in locked if name not in self._figures]
+            if self.prerendered is not None:
+                for name in missing:
+                    with METRICS.timed("figure", name) as event:
+                        figure = self.prerendered.get(name, figure_version(name, self.versions))
+                        event["cache"] = "miss" if figure is None else "prerendered"
+                    if figure is not None:
+                        self._figures[name] = figure
+                        yield name, figure
+                missing = [name for name in missing if name not in self._figures]
+            if self.cache is not None:
+                for name in missing:
+                    with METRICS.timed("figure", name) as event:
+                        figure = self.cache.get_figure(self._figure_key(name))
+                        event["cache"] = "miss" if figure is None else "disk"
+                    if figure is not None:
+                        self._figures[name] = figure
+                        yield name, figure
+                missing = [name for name in missing if name not in self._figures]
+            if missing:
+                # each figure is built as soon as the last scan it reads has arrived
+                needed = sorted({scan for name in missing for scan in BUSINESS_FIGURES[name].scans})
+                frames = {}
+                for scan, df in self.scans(needed):
+                    frames[scan] = df
+                    ready = [name for name in missing if all(s in frames for s in BUSINESS_FIGURES[name].scans)]
+                    for name in ready:
+                        failed = [frames[scan] for scan in BUSINESS_FIGURES[name].scans if isinstance(frames[scan], Exception)]
+                        if failed:
+                            yield name, failed[0]
+                            continue
+                        try:
+                            with METRICS.timed("figure", name, cache="build"):
+                                figure = build_figure(name, frames)
+                        except Exception as e:
+                            yield name, e
+                            continue
+                        self._figures[name] = figure
+                        if self.cache is not None:
+                            self.cache.set_figure(self._figure_key(name), self._figures[name])
+                        yield name, self._figures[name]
+                    missing = [name for name in missing if name not in ready]
+        finally:
+            for name in locked:
+                self._locks[name].release()
+
+    def get(self, names):
+        figures = dict(self.iter_figures(names))
+        for figure in figures.values():
+            if isinstance(figure, Exception):
+                raise figure
+        return {name: figures[name] for name in names}
+
+    def refresh(self, versions, changes=None):
+        # new table versions after a data refresh: only the scans and figures that read a changed table are
+        # dropped and rebuilt on their next request, every other figure (and its disk cache entry) stays valid.
+        # With changes ({table: [(year, quarter), ...]}, see refresh.refresh_tables) a memoized scan re-reads only
+        # the changed quarters and splices them in, so the database work grows with the delta, not the history
+        changed = {table for table in set(versions) | set(self.versions) if versions.get(table) != self.versions.get(table)}
+        for name in sorted(scan for scan, tables in SCAN_TABLES.items() if tables & changed):
+            with self._scan_locks[name]:
+                scan = self._scans.pop(name, None)
+                partitions = sorted({partition for table in SCAN_TABLES[name] for partition in (changes or {}).get(table, [])})
+                if scan is not None and name in PARTITIONED_SCANS and partitions and all(table in changes for table in SCAN_TABLES[name] & changed):
+                    self._scans[name] = self._splice(name, scan, partitions, versions)
+        stale = [name for name, tables in FIGURE_TABLES.items() if tables & changed]
+        for name in sorted(stale):
+            with self._locks[name]:
+                self._figures.pop(name, None)
+        self.versions = dict(versions)
+        return stale
+
+    def _splice(self, name, scan, partitions, versions):
+        # the memoized scan with the rows of the given partitions replaced by a fresh read of just those quarters;
+        # stored under the new version of the full scan, so other processes sharing the cache do not scan either
+        query, params = scan_query(name, partitions)
+        version = table_version(SCAN_TABLES[name], versions)
+        delta = cached_read_sql(self.cache, self.engine, query, params, version, name=f"scan:{name}:delta")
+        keys = pd.MultiIndex.from_frame(scan[["Year", "Quarter"]].astype(int))
+        df = pd.concat([scan[~keys.isin(partitions)], apply_schema(delta)], ignore_index=True)
+        df = apply_schema(df.sort_values(["Year", "Quarter"], kind="stable", ignore_index=True)) # categories of both sides
+        if self.cache is not None:
+            self.cache.set_frame(cache_key("query", SCANS[name], version=version), df)
+        return df
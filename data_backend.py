@@ -0,0 +1,166 @@
+# ======================================================
+# DATA BACKENDS
+# ======================================================
+
+# The app reads the nine PhonePe Pulse tables either from the remote MySQL database (default)
+# or from an embedded, in-process DuckDB database that is built once from the CSV snapshots
+# bundled with the repo (or that queries a partitioned Parquet snapshot in place, see snapshot.py). The backend is
+# picked with the PULSE_BACKEND environment variable ("mysql" or "duckdb") so the same queries run
+# unchanged against either one.
+
+import hashlib
+import os
+import time
+import warnings
+from sqlalchemy import Column, Double, MetaData, String, Table, create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from schema import sql_type_name
+
+TABLES = ["agg_trans", "agg_ins", "agg_user",
+          "map_trans", "map_ins", "map_user",
+          "top_trans", "top_ins", "top_user"] # every table the dashboard queries, one CSV per table
+
+# the measure summed into each table's fingerprint (see table_versions)
+CHECKSUM_COLUMNS = {"agg_trans": "Transaction_amount", "agg_ins": "Insurance_amount", "agg_user": "User_count",
+                    "map_trans": "Transaction_amount", "map_ins": "Insurance_amount", "map_user": "Registered_users",
+                    "top_trans": "Transaction_amount", "top_ins": "Insurance_amount", "top_user": "Registered_users"}
+
+DATA_DIR = os.environ.get("PULSE_DATA_DIR", os.path.dirname(os.path.abspath(__file__))) # folder holding agg_trans.csv etc.
+SNAPSHOT_DIR = os.environ.get("PULSE_SNAPSHOT_DIR", "") # load the embedded backend from a Parquet snapshot instead of the CSVs
+# the version of every table, written by ingest.py and refresh.py in the transaction that loads it, so the
+# app reads nine rows instead of scanning every table to find out what changed (see table_versions)
+VERSIONS = Table("pulse_versions", MetaData(), Column("table_name", String(64), primary_key=True),
+                 Column("version", String(64), nullable=False), Column("updated_at", Double))
+
+UNRECORDED_VERSIONS = {} # (engine, table) -> version, for databases the app cannot write the versions table of
+
+POOL_SIZE = int(os.environ.get("PULSE_POOL_SIZE", "5")) # number of pooled connections, shared by both backends
+
+
+def backend_name():
+    return os.environ.get("PULSE_BACKEND", "mysql").strip().lower()
+
+
+def create_mysql_engine():
+    return create_engine(
+        f"mysql+pymysql://{os.environ['DB_USER']}:{os.environ['DB_PASSWORD']}@"
+        f"{os.environ['DB_HOST']}:{os.environ['DB_PORT']}/{os.environ['DB_NAME']}",
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=POOL_SIZE
+    )
+
+
+def cast_columns(columns):
+    # cast to the types declared in schema.py, e.g. counts stored as "3.0" become BIGINT
+    return ", ".join(f"CAST({column} AS {sql_type_name(column)}) AS {column}" for column in columns)
+
+
+def create_duckdb_engine(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR):
+    import duckdb # only needed for the embedded backend
+    from duckdb_engine import ConnectionWrapper
+
+    database = duckdb.connect(":memory:") # a single in-memory database, loaded once per process
+    if snapshot_dir:
+        from snapshot import read_manifest, snapshot_glob
+        manifest = read_manifest(snapshot_dir)
+    for table in TABLES:
+        if snapshot_dir:
+            # a partitioned Parquet snapshot (see snapshot.py) is not loaded but queried in place through a view: Year and
+            # Quarter come from the folder names, so a query filtering on them only opens the files of those quarters,
+            # and only the columns it selects are decoded
+            columns = manifest["tables"][table]["columns"]
+            path = snapshot_glob(snapshot_dir, table).replace("'", "''")
+            database.execute(f"CREATE VIEW {table} AS SELECT {cast_columns(columns)} FROM read_parquet('{path}', hive_partitioning = true)")
+        else:
+            relation = database.read_csv(os.path.join(data_dir, f"{table}.csv"))
+            relation.project(cast_columns(relation.columns)).create(table)
+
+    # every pooled connection is a cursor on the same database, so all of them see the loaded tables
+    # and can run queries from different threads at the same time
+    engine = create_engine(
+        "duckdb://",
+        creator=lambda: ConnectionWrapper(database.cursor()),
+        pool_size=POOL_SIZE
+    )
+    with engine.begin() as conn:
+        write_versions(conn, TABLES)
+    return engine
+
+
+BACKENDS = {"mysql": create_mysql_engine,
+            "duckdb": create_duckdb_engine}
+
+
+def create_engine_from_config():
+    name = backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PULSE_BACKEND {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def table_versions_query(tables=TABLES):
+    return " UNION ALL ".join(
+        f"SELECT '{table}' AS table_name, COUNT(*) AS row_count, MAX(Year * 10 + Quarter) AS latest, "
+        f"ROUND(SUM({CHECKSUM_COLUMNS[table]}), 0) AS checksum FROM {table}"
+        for table in tables)
+
+
+def fingerprint_versions(conn, tables=TABLES):
+    # a fingerprint of every given table, in one round trip: row count, latest (Year, Quarter) and the
+    # rounded sum of its main measure. A reload that adds, removes or corrects rows changes the fingerprint
+    # of that table only, so caches of figures built from other tables stay valid.
+    rows = conn.execute(text(table_versions_query(tables))).fetchall()
+    return {row[0]: version_hash(row[1], row[2], row[3]) for row in rows}
+
+
+def version_hash(row_count, latest, checksum):
+    return hashlib.sha256(repr((int(row_count), int(latest or 0), int(float(checksum or 0)))).encode("utf-8")).hexdigest()[:16]
+
+
+def read_versions(conn):
+    # {table: version} from the versions table, empty if the database has none (loaded by other means)
+    try:
+        return dict(conn.execute(VERSIONS.select().with_only_columns(VERSIONS.c.table_name, VERSIONS.c.version)).fetchall())
+    except DBAPIError:
+        conn.rollback()
+        return {}
+
+
+def write_versions(conn, tables, versions=None):
+    # fingerprints the given tables (unless their versions are given) and records them; called inside the transaction
+    # that loaded them, so a reader never pairs the new data with the old version
+    versions = versions if versions is not None else fingerprint_versions(conn, tables)
+    VERSIONS.create(conn, checkfirst=True)
+    conn.execute(VERSIONS.delete().where(VERSIONS.c.table_name.in_(list(versions))))
+    conn.execute(VERSIONS.insert(), [{"table_name": table, "version": version, "updated_at": time.time()} for table, version in versions.items()])
+    return versions
+
+
+def table_versions(engine, tables=TABLES):
+    # the version of every table: a lookup in the versions table. The tables it does not cover (a database loaded
+    # without ingest.py) are fingerprinted once and recorded there, so the full-table scans do not run again on every
+    # version check; without write access the fingerprints are kept for the life of the process instead, with a warning
+    with engine.connect() as conn:
+        versions = read_versions(conn)
+    missing = [table for table in tables if table not in versions and (engine, table) not in UNRECORDED_VERSIONS]
+    if missing:
+        with engine.connect() as conn:
+            fingerprints = fingerprint_versions(conn, missing)
+        versions.update(fingerprints)
+        try:
+            with engine.begin() as conn:
+                write_versions(conn, missing, fingerprints)
+        except DBAPIError as e:
+            warnings.warn(f"Could not record the versions of {', '.join(missing)} in {VERSIONS.name} ({type(e).__name__}); "
+                          "changes to these tables are not noticed until the app restarts or `python ingest.py --record-versions` runs")
+            UNRECORDED_VERSIONS.update({(engine, table): version for table, version in fingerprints.items()})
+    return {table: versions.get(table) or UNRECORDED_VERSIONS[(engine, table)] for table in tables}
+
+
+def table_version(tables, versions):
+    # fingerprint of the data behind a query, scan or figure: the versions of the tables it reads
+    if not versions:
+        return ""
+    return ",".join(f"{table}:{versions.get(table, '')}" for table in sorted(tables))
@@ -0,0 +1,419 @@
+# ======================================================
+# SHARED PERSISTENT CACHE
+# ======================================================
+
+# A cache for query results (stored as Parquet) and figures (stored as Plotly JSON) that lives outside
+# the process: it survives restarts and redeploys, and every Streamlit process pointed at the same
+# store shares it, so a fresh replica warm-starts instead of re-running the SQL and rebuilding every
+# figure. Keys are built from the query text, its parameters and the data-version fingerprint. Entries
+# expire after a TTL, and the store evicts the least recently used entries once it grows past its
+# size budget.
+#
+# The store is pluggable: FileStore keeps one file per entry in a directory (local disk or a shared
+# volume), SQLiteStore keeps them in one SQLite database. Both only need the local filesystem.
+#
+# Reads are single-flight: when several sessions, or several processes sharing the store, ask for the
+# same query and parameters at once, one of them runs it and the others wait for its result instead of
+# sending the same query to the database. Within a process a lock per key does this; across processes
+# the computing one holds a lease on the key in the store, renewed while it computes, which expires if its
+# holder dies.
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import plotly.io as pio
+
+from instrumentation import METRICS, frame_bytes, query_label, read_sql_into
+
+CACHE_DIR = os.environ.get("PULSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "pulse"))
+CACHE_MAX_BYTES = int(float(os.environ.get("PULSE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+CACHE_ENABLED = os.environ.get("PULSE_DISK_CACHE", "1") == "1"
+CACHE_STORE = os.environ.get("PULSE_CACHE_STORE", "file") # file or sqlite
+CACHE_TTL = float(os.environ.get("PULSE_CACHE_TTL", "86400")) # seconds an entry stays valid, 0 = until evicted
+LEASE_TIMEOUT = 120.0 # seconds after which a lease whose holder stopped renewing it is considered abandoned
+LEASE_RENEW = LEASE_TIMEOUT / 4 # seconds between two renewals while the holder computes
+LEASE_POLL = 0.05
+EVICT_TO = 0.9 # eviction brings the store down to this share of its budget, so a full store is not swept on every write
+CACHE_FORMAT = 2 # bump when the stored layout changes, so old entries are ignored (figure keys include business_data.code_version())
+
+
+def cache_key(kind, query, params=None, version=""):
+    # kind separates query results from figures; str(query) works for both text() clauses and plain SQL strings
+    payload = json.dumps([CACHE_FORMAT, kind, str(query), params or {}, version], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def figure_to_json(figure):
+    # a figure, or a dict of figures (the per-state pie charts), as UTF-8 JSON; also the format of prerender.py
+    if isinstance(figure, dict):
+        payload = {"figures": {name: pio.to_json(fig) for name, fig in figure.items()}}
+    else:
+        payload = {"figure": pio.to_json(figure)}
+    return json.dumps(payload).encode("utf-8")
+
+
+def figure_from_json(value):
+    payload = json.loads(value)
+    if "figures" in payload:
+        return {name: pio.from_json(spec) for name, spec in payload["figures"].items()}
+    return pio.from_json(payload["figure"])
+
+
+# ------------------------------------------------------
+# Stores: bytes by key, with an expiry time, leases for single-flight and LRU eviction
+# ------------------------------------------------------
+
+class FileStore:
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None # running total of the entry sizes, from the last sweep plus this process' writes since
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix=".entry"):
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def get(self, key):
+        # an entry is "<expires at>\n<payload>"; expired, missing or half-written entries are a miss
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires, _, value = f.read().partition(b"\n")
+            expires = float(expires)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        if expires and expires < time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path) # the modification time doubles as "last used" for eviction
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl=CACHE_TTL):
+        # written to a temporary file first so readers never see a partial entry
+        header = f"{time.time() + ttl if ttl else 0}\n".encode("ascii")
+        replaced = self._size_of(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._grow(len(header) + len(value) - replaced)
+
+    def delete(self, key):
+        size = self._size_of(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            return
+        self._grow(-size)
+
+    def _size_of(self, key):
+        try:
+            return os.stat(self._path(key)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _grow(self, delta):
+        # the directory is only swept when the running total goes over budget (or is not known yet)
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+            over = delta > 0 and (self._size is None or self._size > self.max_bytes)
+        if over:
+            self.evict()
+
+    def acquire_lease(self, key, timeout=LEASE_TIMEOUT):
+        # the lease is a lock file created atomically; one older than timeout belongs to a process that died
+        path = self._path(key, ".lease")
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(path).st_mtime <= timeout:
+                        return False
+                    os.remove(path) # abandoned, try once more
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def renew_lease(self, key):
+        try:
+            os.utime(self._path(key, ".lease"))
+        except FileNotFoundError:
+            pass
+
+    def release_lease(self, key):
+        try:
+            os.remove(self._path(key, ".lease"))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        # drop the least recently used entries until the store fits in max_bytes (down to EVICT_TO of it); the sweep
+        # also resets the running total, which picks up what other processes sharing the directory wrote
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".entry"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes * EVICT_TO:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            self._size = total
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
+        with self._lock:
+            self._size = 0
+
+
+class SQLiteStore:
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "cache.sqlite"), max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None # running total of the entry sizes, as in FileStore
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL") # readers in other processes are not blocked by a writer
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, used REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, taken REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used)")
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per call, so the store can be used from any thread
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] and row[1] < now:
+                self._delete(conn, key)
+                return None
+            conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def set(self, key, value, ttl=CACHE_TTL):
+        now = time.time()
+        with self._connect() as conn:
+            replaced = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, value, len(value), now + ttl if ttl else 0, now))
+        self._grow(len(value) - (replaced[0] if replaced else 0))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            self._delete(conn, key)
+
+    def _delete(self, conn, key):
+        row = conn.execute("DELETE FROM entries WHERE key = ? RETURNING size", (key,)).fetchone()
+        if row is not None:
+            self._grow(-row[0])
+
+    def _grow(self, delta):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+            over = delta > 0 and (self._size is None or self._size > self.max_bytes)
+        if over:
+            self.evict()
+
+    def acquire_lease(self, key, timeout=LEASE_TIMEOUT):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND taken < ?", (key, now - timeout)) # abandoned by a process that died
+            return conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?)", (key, now)).rowcount == 1
+
+    def renew_lease(self, key):
+        with self._connect() as conn:
+            conn.execute("UPDATE leases SET taken = ? WHERE key = ?", (time.time(), key))
+
+    def release_lease(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def evict(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE expires > 0 AND expires < ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY used").fetchall():
+                    if total <= self.max_bytes * EVICT_TO:
+                        break
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+        with self._lock:
+            self._size = total
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM leases")
+        with self._lock:
+            self._size = 0
+
+
+STORES = {"file": lambda: FileStore(), "sqlite": lambda: SQLiteStore()}
+
+
+def create_store(name=CACHE_STORE):
+    name = name.strip().lower()
+    if name not in STORES:
+        raise ValueError(f"Unknown PULSE_CACHE_STORE {name!r}, expected one of {sorted(STORES)}")
+    return STORES[name]()
+
+
+# ------------------------------------------------------
+# Cache: frames and figures on top of a store
+# ------------------------------------------------------
+
+class DiskCache:
+
+    def __init__(self, store=None, ttl=CACHE_TTL):
+        self.store = store if store is not None else create_store()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flights = {} # key -> [lock held by the thread of this process computing it, threads using it]
+
+    # query results
+    def get_frame(self, key):
+        value = self.store.get(key)
+        if value is None:
+            return None
+        try:
+            return pd.read_parquet(io.BytesIO(value))
+        except (ValueError, OSError):
+            return None # an unreadable entry is a miss
+
+    def set_frame(self, key, df):
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        self.store.set(key, buffer.getvalue(), self.ttl)
+
+    # figures, either a single figure or a dict of figures (the per-state pie charts)
+    def get_figure(self, key):
+        value = self.store.get(key)
+        if value is None:
+            return None
+        try:
+            return figure_from_json(value)
+        except ValueError:
+            return None
+
+    def set_figure(self, key, figure):
+        self.store.set(key, figure_to_json(figure), self.ttl)
+
+    def single_flight(self, key, load, compute, store):
+        # returns (value, how): load() if the entry exists ("disk"); otherwise one caller - across the threads of this
+        # process and the processes sharing the store - runs compute() and store()s it ("miss"), and everyone else
+        # waits for that entry ("coalesced"). A lease left behind by a dead process expires after LEASE_TIMEOUT
+        value = load()
+        if value is not None:
+            return value, "disk"
+        with self._flight(key):
+            value = load()
+            if value is not None:
+                return value, "coalesced"
+            while not self.store.acquire_lease(key):
+                time.sleep(LEASE_POLL)
+                value = load()
+                if value is not None:
+                    return value, "coalesced"
+            try:
+                value = load() # stored between our last look and taking the lease
+                if value is not None:
+                    return value, "coalesced"
+                with self._renewing(key):
+                    value = compute()
+                store(value)
+                return value, "miss"
+            finally:
+                self.store.release_lease(key)
+
+    @contextmanager
+    def _flight(self, key):
+        # the lock of the key within this process, dropped once no thread uses it so _flights does not keep every key
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    @contextmanager
+    def _renewing(self, key):
+        # renews the lease every LEASE_RENEW seconds while compute() runs, so a query slower than LEASE_TIMEOUT is
+        # not taken for abandoned and run a second time by another process
+        done = threading.Event()
+
+        def renew():
+            while not done.wait(LEASE_RENEW):
+                self.store.renew_lease(key)
+
+        threading.Thread(target=renew, name="pulse-lease", daemon=True).start()
+        try:
+            yield
+        finally:
+            done.set()
+
+    def evict(self):
+        self.store.evict()
+
+    def clear(self):
+        self.store.clear()
+
+
+def cached_read_sql(cache, engine, query, params=None, version="", name=None):
+    # pd.read_sql with the shared cache in front of it; cache=None reads straight from the database
+    with METRICS.timed("query", name or query_label(query)) as event:
+        if cache is None:
+            return read_sql_into(event, query, engine, params)
+        key = cache_key("query", query, params, version)
+        df, event["cache"] = cache.single_flight(key, lambda: cache.get_frame(key),
+                                                 lambda: read_sql_into(event, query, engine, params),
+                                                 lambda df: cache.set_frame(key, df))
+        if event["cache"] != "miss":
+            event["rows"] = len(df)
+            event["bytes"] = frame_bytes(df)
+        return df
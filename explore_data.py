@@ -0,0 +1,410 @@
+# ======================================================
+# EXPLORE DATA CUBE
+# ======================================================
+
+# Everything the EXPLORE DATA page shows for one dataset type (Transactions, Insurance or Users) is
+# precomputed here in a single pass per table: the headline metrics, the Payment Categories table,
+# the ranking of every district and postal code and the state-level figures behind the choropleth, for every
+# Year x Quarter. Changing the year or quarter on the page is then a dictionary lookup instead of
+# six database queries. The database does the projection and the summing: the choropleth reads one
+# row per state and quarter (SUM/AVG in SQL), never the district rows. The app opens the cube lazily
+# (open_explore_cube): it knows which quarters have data, reads a quarter's slice the first time it
+# is asked for, and prefetch.py reads the slices the user is likely to open next in the background.
+# The styled tables and the choropleth drawn from a slice are built at the end of this file.
+
+import threading
+from collections import namedtuple
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from sqlalchemy import text
+
+from data_backend import table_version
+from geo import feature_id
+from disk_cache import cached_read_sql
+from instrumentation import METRICS, frame_bytes
+from schema import apply_schema
+
+# map_table, top_table, agg_table, the columns summed for the headline metrics and the ranking column
+ExploreDataset = namedtuple("ExploreDataset", ["map_table", "top_table", "agg_table", "metric_columns", "value_column"])
+
+DATASETS = {
+    "Transactions": ExploreDataset("map_trans", "top_trans", "agg_trans", ["Transaction_count", "Transaction_amount"], "Transaction_amount"),
+    "Insurance": ExploreDataset("map_ins", "top_ins", None, ["Insurance_count", "Insurance_amount"], "Insurance_amount"),
+    "Users": ExploreDataset("map_user", None, None, ["Registered_users", "Number_of_app_opens"], "Registered_users")}
+
+# state-level columns of the choropleth: (output column, SQL aggregate); the averages shown on hover are the
+# mean of the per-district averages
+MAP_COLUMNS = {
+    "Transactions": [("Transaction_amount", "SUM(Transaction_amount)"), ("Transaction_count", "SUM(Transaction_count)"),
+                     ("Average_value", "AVG(Transaction_amount / NULLIF(Transaction_count, 0))")],
+    "Insurance": [("Insurance_amount", "SUM(Insurance_amount)"), ("Insurance_count", "SUM(Insurance_count)"),
+                  ("Average_insurance", "AVG(Insurance_amount / NULLIF(Insurance_count, 0))")],
+    "Users": [("Registered_users", "SUM(Registered_users)"), ("Number_of_app_opens", "SUM(Number_of_app_opens)")]}
+
+PAGE_SIZE = 10 # rows per page of the district and postal code tables
+
+# a full ranking of one quarter, ordered once by value (highest first) and once by name, so a page in any
+# of the RANKING_SORTS orders is a positional slice, whatever the number of districts or postal codes
+Ranking = namedtuple("Ranking", ["by_value", "by_name"])
+RANKING_SORTS = {"Highest first": ("value", True), "Lowest first": ("value", False), "Name A-Z": ("name", False), "Name Z-A": ("name", True)}
+
+# everything the page needs for one (year, quarter); totals maps each metric column to its sum
+ExploreSlice = namedtuple("ExploreSlice", ["totals", "categories", "districts", "pincodes", "map_df"])
+
+
+def round_to_int(values):
+    return pd.to_numeric(values.round(0), downcast="integer")
+
+
+def rank(df, key, value_column, total_name):
+    # every key by summed value within every (Year, Quarter), returned as {(year, quarter): Ranking}
+    totals = df.groupby(["Year", "Quarter", key], as_index=False, observed=True)[value_column].sum()
+    totals = totals.rename(columns={value_column: total_name}).sort_values(total_name, ascending=False, kind="stable")
+    totals[total_name] = round_to_int(totals[total_name])
+    ranked = {}
+    for (year, quarter), group in totals.groupby(["Year", "Quarter"], sort=False):
+        by_value = group[[key, total_name]].reset_index(drop=True)
+        by_name = by_value.sort_values(key, key=lambda names: names.astype(str), kind="stable").reset_index(drop=True)
+        ranked[(year, quarter)] = Ranking(by_value, by_name)
+    return ranked
+
+
+def empty_ranking(key, total_name):
+    frame = pd.DataFrame(columns=[key, total_name])
+    return Ranking(frame, frame)
+
+
+def ranking_page(ranking, sort, page, page_size=PAGE_SIZE):
+    # rows [page * page_size, (page + 1) * page_size) of the ranking in one of the RANKING_SORTS orders; the
+    # reversed orders are read from the end of the stored ones, so no page needs a sort
+    column, descending = RANKING_SORTS[sort]
+    frame = ranking.by_value if column == "value" else ranking.by_name
+    start = page * page_size
+    if descending == (column == "value"): # the order the frame is stored in
+        return frame.iloc[start:start + page_size].reset_index(drop=True)
+    stop = max(len(frame) - start, 0)
+    return frame.iloc[max(stop - page_size, 0):stop].iloc[::-1].reset_index(drop=True)
+
+
+def ranking_pages(ranking, page_size=PAGE_SIZE):
+    return max(-(-len(ranking.by_value) // page_size), 1)
+
+
+class ExploreCube:
+
+    def __init__(self, dataset_type, slices, partitions=None, engine=None, cache=None, versions=None):
+        # partitions: every (year, quarter) with data, defaults to the keys of slices; with an engine, the
+        # slices that are not built yet are read on first use, through the shared cache if there is one
+        self.dataset_type = dataset_type
+        self.engine = engine
+        self.cache = cache
+        self.versions = versions
+        self.viewed = set() # slices get() has returned, so prefetch.py never evicts them
+        self._lock = threading.Lock()
+        self._loading = {} # (year, quarter) -> lock held while the slice is read
+        self.set_slices(slices, partitions)
+
+    def set_slices(self, slices, partitions=None):
+        self.slices = slices
+        self.partitions = sorted(slices if partitions is None else partitions)
+        self.years = sorted({year for year, _ in self.partitions})
+        self.quarters = sorted({quarter for _, quarter in self.partitions})
+
+    def get(self, year, quarter):
+        key = (int(year), int(quarter))
+        view = self.slices.get(key)
+        if view is None and self.engine is not None and key in self.partitions:
+            view = self.load(key)
+        self.viewed.add(key)
+        return view or self.empty_slice()
+
+    def is_built(self, key):
+        return key in self.slices or key not in self.partitions # nothing to read for a quarter without data
+
+    def load(self, key):
+        # reads one slice unless it is built already; a second caller (the page while the prefetcher reads the
+        # same quarter) waits for the first read instead of repeating it
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self.slices:
+                view = build_slices(self.engine, self.dataset_type, [key], self.cache, self.versions).get(key) or self.empty_slice()
+                with self._lock:
+                    self.slices = {**self.slices, key: view} # a new dict, so readers never see it change
+        return self.slices[key]
+
+    def discard(self, key):
+        with self._lock:
+            self.slices = {other: view for other, view in self.slices.items() if other != key}
+
+    def adjacent(self, year, quarter):
+        # the quarters right before and after (year, quarter) on the timeline, the next one first
+        partitions = self.partitions
+        if (year, quarter) not in partitions:
+            return []
+        i = partitions.index((year, quarter))
+        return partitions[i + 1:i + 2] + partitions[max(i - 1, 0):i]
+
+    def empty_slice(self):
+        # a year/quarter with no rows (e.g. insurance before 2020 Q2) shows zeros and empty tables
+        dataset = DATASETS[self.dataset_type]
+        columns = [name for name, _ in MAP_COLUMNS[self.dataset_type]]
+        return ExploreSlice({column: 0 for column in dataset.metric_columns},
+                            pd.DataFrame(columns=["Transaction_type", "Total_Value"]),
+                            empty_ranking("District_name", "Total_Users" if dataset.top_table is None else "Total_Value"),
+                            empty_ranking("Pincode", "Total_Value"),
+                            pd.DataFrame(columns=["State"] + columns))
+
+    def refresh(self, engine, partitions, versions=None):
+        # recompute only the given (year, quarter) slices, e.g. after refresh.py loaded a new quarter; every
+        # slice depends on its own partition only, so the rest of the cube stays as it is. A lazy cube
+        # re-reads its list of quarters and only rebuilds the changed slices it had read already.
+        # versions are the new table versions, so the shared cache is not asked for the old data
+        partitions = {(int(year), int(quarter)) for year, quarter in partitions}
+        if not partitions:
+            return
+        if versions is not None:
+            self.versions = versions
+        available, rebuild = None, partitions
+        if self.engine is not None:
+            available = read_partitions(engine, self.dataset_type, self.cache, self.versions)
+            rebuild = partitions & set(self.slices)
+        slices = {key: value for key, value in self.slices.items() if key not in partitions}
+        for partition in sorted(rebuild): # one quarter per read, so the database groups it in index order
+            slices.update(build_slices(engine, self.dataset_type, [partition], self.cache, self.versions))
+        with self._lock:
+            self.set_slices(slices, available) # swapped in one go, so a concurrent reader sees the old or the new slices
+
+
+def slice_bytes(view):
+    # the totals dict is a handful of numbers
+    frames = [view.categories, view.map_df, *view.districts, *view.pincodes]
+    return sum(frame_bytes(frame) for frame in frames)
+
+
+def partition_filter(partitions):
+    # WHERE clause and bound parameters selecting the given (year, quarter) partitions; None selects everything
+    if partitions is None:
+        return "", {}
+    clauses, params = [], {}
+    for i, (year, quarter) in enumerate(sorted(partitions)):
+        clauses.append(f"(Year = :year{i} AND Quarter = :quarter{i})")
+        params[f"year{i}"], params[f"quarter{i}"] = year, quarter
+    return " WHERE " + " OR ".join(clauses), params
+
+
+def slice_queries(dataset_type, partitions=None):
+    # the reads behind build_slices and their bound parameters; only the columns each view needs, already summed
+    # per (Year, Quarter) and grouped in the order of the composite indexes (see migrations.py advise)
+    dataset = DATASETS[dataset_type]
+    where, params = partition_filter(partitions)
+    ranked = dataset.value_column if dataset.top_table else "Registered_users"
+    aggregates = ", ".join(f"{sql} AS {name}" for name, sql in MAP_COLUMNS[dataset_type])
+    queries = {
+        "states": text(f"SELECT Year, Quarter, State, {aggregates} FROM {dataset.map_table}{where} GROUP BY Year, Quarter, State"),
+        "districts": text(f"SELECT Year, Quarter, State, District_name, SUM({ranked}) AS {ranked} FROM {dataset.map_table}{where} "
+                          "GROUP BY Year, Quarter, State, District_name")}
+    if dataset.agg_table:
+        queries["categories"] = text(f"SELECT Year, Quarter, Transaction_type, SUM(Transaction_amount) AS Transaction_amount "
+                                     f"FROM {dataset.agg_table}{where} GROUP BY Year, Quarter, Transaction_type")
+    if dataset.top_table:
+        queries["pincodes"] = text(f"SELECT Year, Quarter, Pincode, SUM({dataset.value_column}) AS {dataset.value_column} "
+                                   f"FROM {dataset.top_table}{where} GROUP BY Year, Quarter, Pincode")
+    return queries, params
+
+
+def partitions_query(dataset_type):
+    return text(f"SELECT DISTINCT Year, Quarter FROM {DATASETS[dataset_type].map_table}")
+
+
+def read_view(engine, dataset_type, query, params, name, cache=None, versions=None):
+    # one typed read; with a cache, concurrent sessions and processes asking for the same slice share one query
+    version = table_version(dataset_tables(dataset_type), versions)
+    return apply_schema(cached_read_sql(cache, engine, query, params, version, name))
+
+
+def read_partitions(engine, dataset_type, cache=None, versions=None):
+    df = read_view(engine, dataset_type, partitions_query(dataset_type), {}, f"{DATASETS[dataset_type].map_table}:partitions", cache, versions)
+    return sorted((int(year), int(quarter)) for year, quarter in df[["Year", "Quarter"]].itertuples(index=False))
+
+
+def build_slices(engine, dataset_type, partitions=None, cache=None, versions=None):
+    dataset = DATASETS[dataset_type]
+    queries, params = slice_queries(dataset_type, partitions)
+
+    def read(view, name):
+        return read_view(engine, dataset_type, queries[view], params, name, cache, versions)
+
+    state_df = read("states", f"{dataset.map_table}:states")
+    district_df = read("districts", f"{dataset.map_table}:districts")
+    state_df[dataset.metric_columns] = state_df[dataset.metric_columns].fillna(0) # SQL sums only NULLs to NULL, the map shows 0
+
+    # headline metrics
+    totals = state_df.groupby(["Year", "Quarter"])[dataset.metric_columns].sum()
+
+    # Payment Categories table (Transactions only)
+    categories = {}
+    if dataset.agg_table:
+        category_totals = read("categories", f"{dataset.agg_table}:categories")
+        category_totals = category_totals.rename(columns={"Transaction_amount": "Total_Value"})
+        category_totals = category_totals.sort_values("Total_Value", ascending=False, kind="stable")
+        for key, group in category_totals.groupby(["Year", "Quarter"], sort=False):
+            group = group[["Transaction_type", "Total_Value"]].reset_index(drop=True)
+            group["Total_Value"] = round_to_int(group["Total_Value"])
+            categories[key] = group
+
+    # rankings of every district and postal code
+    if dataset.top_table:
+        districts = rank(district_df, "District_name", dataset.value_column, "Total_Value")
+        top_df = read("pincodes", f"{dataset.top_table}:pincodes").dropna(subset=["Pincode"])
+        top_df["Pincode"] = top_df["Pincode"].astype(str) # Int32, so no "400001.0"
+        pincodes = rank(top_df, "Pincode", dataset.value_column, "Total_Value")
+    else:
+        districts = rank(district_df, "District_name", "Registered_users", "Total_Users")
+        pincodes = {}
+
+    # state-level figures for the choropleth
+    states = {key: group.drop(columns=["Year", "Quarter"]).reset_index(drop=True)
+              for key, group in state_df.groupby(["Year", "Quarter"], sort=False)}
+
+    slices = {}
+    for key in totals.index:
+        slices[(int(key[0]), int(key[1]))] = ExploreSlice(
+            totals.loc[key].to_dict(),
+            categories.get(key, pd.DataFrame(columns=["Transaction_type", "Total_Value"])),
+            districts[key],
+            pincodes.get(key, empty_ranking("Pincode", "Total_Value")),
+            states[key])
+    return slices
+
+
+def build_explore_cube(engine, dataset_type):
+    # every slice at once, in one read per view
+    return ExploreCube(dataset_type, build_slices(engine, dataset_type))
+
+
+def open_explore_cube(engine, dataset_type, cache=None, versions=None):
+    # only the list of quarters; each slice is read the first time it is needed
+    return ExploreCube(dataset_type, {}, read_partitions(engine, dataset_type, cache, versions), engine, cache, versions)
+
+
+def dataset_tables(dataset_type):
+    dataset = DATASETS[dataset_type]
+    return {table for table in (dataset.map_table, dataset.top_table, dataset.agg_table) if table}
+
+
+# ------------------------------------------------------
+# Figures
+# ------------------------------------------------------
+
+def format_thousands(values):
+    # 1234567 -> "1,234,567" for a whole column at once
+    digits = pd.to_numeric(values).fillna(0).round().astype("int64").astype(str)
+    return digits.str.replace(r"\B(?=(\d{3})+(?!\d))", ",", regex=True)
+
+
+def create_styled_table(df, col1, col2, title, col1_width=340, col2_width=130): # styled tables used to display the figures in the EXPLORE DATA section
+    fig = go.Figure(data=[
+        go.Table(
+            header=dict(
+                values=[f"<b>{col1}</b>", f"<b>{col2}</b>"], # sets the values by referencing columns in the code below
+                fill_color="#4B367C", # the color of the table 
+                font=dict(color="white", size=16), # font to be used in the table
+                align="left", # alignment of header
+                line_color="#322454",
+                line_width=2),
+            cells=dict(
+                values=[
+                    df[col1].astype(str), # converting values to str in the first column
+                    format_thousands(df[col2]) if col2.lower() != "pincode" else df[col2]], # thousands separators only if the column is not pincode, which reads better as '400500' than '400,500'.
+                fill_color=[["#2D174B", "#341E56"] * (len(df)//2 + 1)],
+                font=dict(color="white", size=15),
+                align="left",
+                line_color="#322454",
+                line_width=1,
+                height=30),
+            columnwidth=[col1_width, col2_width])])
+    fig.update_layout(
+        paper_bgcolor="#1E0E3F",
+        margin=dict(l=8, r=8, t=40, b=8), # define the margins 
+        height=400, # define the height 
+        title=dict(text=f"<b>{title}</b>", font=dict(size=22, color="white")))
+    return fig
+
+
+def build_choropleth(map_df, geometry, dataset_type):
+    # state-level map of the selected year and quarter; map_df is ExploreSlice.map_df, geometry is geo.load_map_geometry()
+    # (compact boundaries with integer feature ids, matched through the State names)
+    map_df = map_df.assign(feature_id=[feature_id(geometry, state) for state in map_df["State"]])
+    unmatched = map_df["feature_id"].isna()
+    if unmatched.any(): # a state the boundary file does not have cannot be drawn; counted so it does not go unnoticed
+        METRICS.record({"stage": "explore", "name": "unmatched_states", "rows": int(unmatched.sum()),
+                        "states": ", ".join(map_df.loc[unmatched, "State"].astype(str))})
+    map_df = map_df[~unmatched].astype({"feature_id": int}) # the None of unmatched states made the column float
+    if dataset_type == "Transactions":
+        value_column = "Transaction_amount"
+        hover_text = (
+            "<b>%{location}</b><br>"
+            "All Transactions: %{customdata[1]:,.0f}<br>"
+            "Total Payment Value: ₹%{customdata[0]:,.0f}<br>"
+            "Avg. Transaction Value: ₹%{customdata[2]:,.0f}<extra></extra>") # basic styling for the hover text
+        custom_data = [map_df["Transaction_amount"], map_df["Transaction_count"], map_df["Average_value"]] # these are the values that would be displayed when the user hovers over a specific region of India 
+
+    # this is repeated for when the user selects "Insurance"
+    elif dataset_type == "Insurance":
+        value_column = "Insurance_amount"
+        hover_text = (
+            "<b>%{location}</b><br>"
+            "All Insurance Transactions: %{customdata[1]:,.0f}<br>"
+            "Total Insurance Value: ₹%{customdata[0]:,.0f}<br>"
+            "Avg. Insurance Value: ₹%{customdata[2]:,.0f}<extra></extra>")
+        custom_data = [map_df["Insurance_amount"], map_df["Insurance_count"], map_df["Average_insurance"]]
+
+    # repeated when the user selects "Users"
+    else:
+        value_column = "Registered_users"
+        hover_text = (
+            "<b>%{location}</b><br>"
+            "Total Registered Users: %{customdata[0]:,.0f}<br>"
+            "App Opens: %{customdata[1]:,.0f}<extra></extra>")
+        custom_data = [map_df["Registered_users"], map_df["Number_of_app_opens"]]
+
+    hover_text = hover_text.replace("%{location}", f"%{{customdata[{len(custom_data)}]}}") # the state name, not its feature id
+    custom_data.append(map_df["State"])
+
+    vmin = map_df[value_column].quantile(0.05)
+    vmax = map_df[value_column].quantile(0.95)
+
+    fig = px.choropleth( # creating a chloropleth map for Indian states 
+        map_df, # using the map_df table
+        geojson=geometry.geojson, # defining India's state boundaries
+        locations="feature_id", # matched with the integer "id" of every boundary feature
+        color=value_column, # column used to determine fill colour (eg: transaction_amount)
+        color_continuous_scale="YlOrRd", # yellow-orange-red color scale
+        range_color=(vmin, vmax), # fixed color range 
+        custom_data=custom_data, # extra columns for rich hover text
+    )
+
+    # using a custom hover template to show detailed metrics when hovering a state 
+    fig.update_traces(hovertemplate = hover_text)
+
+    # fitting the map to the provided locations and hiding default geographic areas
+    fig.update_geos(fitbounds="locations", visible = True, showframe = False, projection_type = "mercator",
+                   showcountries = False, showcoastlines = False,)
+
+    # configuring the layout of the map
+    fig.update_layout(
+        margin={"r": 0, "t": 0, "l": 0, "b": 0}, # removing outer margins 
+        geo_bgcolor="rgba(0,0,0,0)", # transparent map background
+        paper_bgcolor="#0E001A", # overall figure background color 
+        plot_bgcolor="#0E001A", # plot area background color 
+        coloraxis_colorbar=dict(
+            title=f"{dataset_type} Value", # colorbar title
+            tickformat=",.0f", # comma-separated integers on the color bar 
+            tickfont=dict(color="white"),
+        ),
+        font=dict(color="white"),
+        height=500,
+    )
+    return fig
@@ -0,0 +1,292 @@
+# ======================================================
+# INDIA STATE BOUNDARIES
+# ======================================================
+
+# The choropleth on the EXPLORE DATA page needs the boundaries of India's states. They are committed
+# as assets under assets/, so the app renders the map without network access: india_states.geojson is
+# the full-detail file (properties.ST_NM holds the state name) and india_states_<level>.geojson are
+# simplified copies with fewer polygon points, which make the figure much smaller. The app only reads
+# them; downloading and simplifying is a build step (python geo.py), never done at request time.
+#
+# The simplification keeps the states' shared borders identical: every ring is cut into arcs at the
+# points where the set of rings sharing it changes, and each arc is simplified once, so two neighbours
+# get the same simplified border and the map has no gaps or overlaps between them.
+#
+# The boundaries are embedded in the figure on every render, so load_map_geometry() compacts them
+# further for the browser: coordinates are quantized to a grid of QUANTIZE_DIGITS decimals (points
+# that fall on the same grid point are merged), every property is dropped and each state gets an
+# integer feature id. feature_id() maps the State names of our tables to those ids, so the choropleth
+# matches by id instead of by the ST_NM string; names that the file spells differently are matched by
+# their normalized prefix ("Andaman & Nicobar Islands" and "Andaman & Nicobar"), and the build step
+# checks that every State of the Pulse data ends up on exactly one feature.
+#
+#   python geo.py          # download the full file once (if missing), precompute every simplified level,
+#                          # check the State names and print the bytes each level adds to a render;
+#                          # commit assets/ afterwards
+
+import functools
+import json
+import os
+import re
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+GEOJSON_URL = "https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/india_states.geojson"
+
+SIMPLIFY_TOLERANCES = {"full": 0.0, "medium": 0.01, "low": 0.05} # Douglas-Peucker tolerance in degrees for each level
+MAP_DETAIL = os.environ.get("PULSE_MAP_DETAIL", "medium") # the level used by the app
+QUANTIZE_DIGITS = 3 # about 100 m, well below the simplification tolerance of the medium level
+
+# geojson as sent to the browser (integer "id" per feature, no properties) and {name_key(State name): id}
+MapGeometry = namedtuple("MapGeometry", ["geojson", "state_ids"])
+
+
+def asset_path(level):
+    if level == "full":
+        return os.path.join(ASSET_DIR, "india_states.geojson")
+    return os.path.join(ASSET_DIR, f"india_states_{level}.geojson")
+
+
+def write_json(path, payload):
+    # write to a temporary file first so a crashed write never leaves a broken asset behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def fetch_india_geojson(url=GEOJSON_URL, timeout=30):
+    import requests # only needed by the build step
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    geojson = response.json()
+    write_json(asset_path("full"), geojson)
+    return geojson
+
+
+# ------------------------------------------------------
+# Geometry simplification (Douglas-Peucker on shared arcs)
+# ------------------------------------------------------
+
+def douglas_peucker(points, tolerance):
+    # mask of the points to keep; the first and the last are always kept
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack: # iterative, so large rings cannot hit the recursion limit
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0: # closed ring: measure the distance from the start point instead
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def geometry_rings(geometry):
+    # the rings of a Polygon or MultiPolygon, in order
+    if geometry["type"] == "Polygon":
+        return list(geometry["coordinates"])
+    if geometry["type"] == "MultiPolygon":
+        return [ring for polygon in geometry["coordinates"] for ring in polygon]
+    return []
+
+
+def with_rings(geometry, rings):
+    # geometry with its rings replaced, in the order of geometry_rings()
+    rings = iter(rings)
+    if geometry["type"] == "Polygon":
+        coordinates = [next(rings) for _ in geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        coordinates = [[next(rings) for _ in polygon] for polygon in geometry["coordinates"]]
+    else:
+        return geometry
+    return {"type": geometry["type"], "coordinates": coordinates}
+
+
+def ring_arcs(ring, users):
+    # cuts a closed ring (without its repeated last point) into arcs that start and end at a junction: a point
+    # where the set of rings using it (users) changes. A ring without one starts at its smallest point, so
+    # two copies of the same ring are cut the same way.
+    n = len(ring)
+    junctions = [i for i in range(n) if users[ring[i]] != users[ring[i - 1]] or users[ring[i]] != users[ring[(i + 1) % n]]]
+    if not junctions:
+        junctions = [ring.index(min(ring))]
+    arcs = []
+    for k, start in enumerate(junctions):
+        end = junctions[(k + 1) % len(junctions)]
+        arcs.append([ring[(start + i) % n] for i in range((end - start) % n or n)] + [ring[end]])
+    return arcs
+
+
+def simplify_geojson(geojson, tolerance):
+    # Douglas-Peucker per shared arc: an arc is simplified once, in one orientation, and reused (reversed if
+    # needed) by every ring it belongs to. Rings that would fall below 4 points keep their full detail.
+    if tolerance <= 0:
+        return geojson
+    features = geojson["features"]
+    rings = [[tuple(point[:2]) for point in ring[:-1]] for feature in features for ring in geometry_rings(feature["geometry"])]
+    users = {}
+    for i, ring in enumerate(rings):
+        for point in ring:
+            users.setdefault(point, set()).add(i)
+    users = {point: frozenset(ids) for point, ids in users.items()}
+
+    simplified_arcs = {}
+    def simplify_arc(arc):
+        key = min(tuple(arc), tuple(reversed(arc)))
+        if key not in simplified_arcs:
+            points = np.asarray(key, dtype=float)
+            simplified_arcs[key] = [tuple(point) for point in points[douglas_peucker(points, tolerance)].round(6).tolist()]
+        return simplified_arcs[key] if key == tuple(arc) else simplified_arcs[key][::-1]
+
+    simplified_rings = []
+    for ring in rings:
+        if len(ring) < 4:
+            simplified_rings.append([list(point) for point in ring + ring[:1]])
+            continue
+        points = []
+        for arc in ring_arcs(ring, users):
+            points += simplify_arc(arc)[:-1]
+        if len(points) < 3: # a ring needs at least 4 points (first == last); keep small islands as they are
+            points = ring
+        simplified_rings.append([list(point) for point in points + points[:1]])
+
+    simplified_rings = iter(simplified_rings)
+    result = []
+    for feature in features:
+        geometry = feature["geometry"]
+        ring_count = len(geometry_rings(geometry))
+        result.append(dict(feature, geometry=with_rings(geometry, [next(simplified_rings) for _ in range(ring_count)])))
+    return dict(geojson, features=result)
+
+
+def build_simplified_assets(geojson=None):
+    geojson = geojson or read_asset("full")
+    for level, tolerance in SIMPLIFY_TOLERANCES.items():
+        if level != "full":
+            write_json(asset_path(level), simplify_geojson(geojson, tolerance))
+
+
+def read_asset(level):
+    # the app never downloads or writes here: a missing asset is a build problem, not something to retry per rerun
+    path = asset_path(level)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Map boundaries {path} are missing; build them with `python geo.py` and commit assets/")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def load_india_geojson(level=MAP_DETAIL):
+    # parsed once per process and level, then shared by every rerun and session
+    if level not in SIMPLIFY_TOLERANCES:
+        raise ValueError(f"Unknown map detail level {level!r}, expected one of {sorted(SIMPLIFY_TOLERANCES)}")
+    return read_asset(level)
+
+
+# ------------------------------------------------------
+# Compact geometry for the browser
+# ------------------------------------------------------
+
+def quantize_ring(coords, digits=QUANTIZE_DIGITS):
+    points = np.asarray(coords, dtype=float)[:, :2].round(digits)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1) # consecutive points on the same grid point
+    points = points[keep]
+    if len(points) < 4: # a ring needs at least 4 points (first == last); keep small islands as they are
+        return coords
+    return points.tolist()
+
+
+def quantize_geometry(geometry, digits=QUANTIZE_DIGITS):
+    if geometry["type"] == "Polygon":
+        coordinates = [quantize_ring(ring, digits) for ring in geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        coordinates = [[quantize_ring(ring, digits) for ring in polygon] for polygon in geometry["coordinates"]]
+    else:
+        return geometry
+    return {"type": geometry["type"], "coordinates": coordinates}
+
+
+def name_key(name):
+    # "Jammu and Kashmir" and "Jammu & Kashmir" are the same state
+    return re.sub(r"[^a-z]", "", str(name).lower().replace("&", "and"))
+
+
+def compact_geojson(geojson, digits=QUANTIZE_DIGITS):
+    # integer ids in ST_NM order, quantized coordinates, no properties; returns (geojson, {ST_NM: id})
+    features = sorted(geojson["features"], key=lambda feature: feature["properties"]["ST_NM"])
+    ids = {feature["properties"]["ST_NM"]: i for i, feature in enumerate(features)}
+    compact = [{"type": "Feature", "id": i, "geometry": quantize_geometry(feature["geometry"], digits)}
+               for i, feature in enumerate(features)]
+    return {"type": "FeatureCollection", "features": compact}, ids
+
+
+def state_ids(boundary_ids):
+    # {name_key(ST_NM): feature id}
+    return {name_key(name): i for name, i in boundary_ids.items()}
+
+
+def feature_id(geometry, state):
+    # the feature of a State name: the same normalized name, or else the only one that starts with it or that it
+    # starts with; None if the boundary file has no such state (or the prefix is ambiguous)
+    key = name_key(state)
+    if key in geometry.state_ids:
+        return geometry.state_ids[key]
+    candidates = {i for name, i in geometry.state_ids.items() if name.startswith(key) or key.startswith(name)}
+    return candidates.pop() if len(candidates) == 1 else None
+
+
+def check_state_ids(geometry, states):
+    # every State of our tables on its own feature and every feature used; raises ValueError listing what is not
+    ids = {state: feature_id(geometry, state) for state in states}
+    problems = [f"no boundary for {state!r}" for state, i in sorted(ids.items()) if i is None]
+    matched = {}
+    for state, i in ids.items():
+        if i is not None:
+            matched.setdefault(i, []).append(state)
+    problems += [f"{sorted(shared)} share one boundary" for shared in matched.values() if len(shared) > 1]
+    unused = len(geometry.geojson["features"]) - len(matched)
+    if unused:
+        problems.append(f"{unused} boundaries match no State")
+    if problems:
+        raise ValueError("State names and map boundaries do not match: " + "; ".join(problems))
+
+
+@functools.lru_cache(maxsize=None)
+def load_map_geometry(level=MAP_DETAIL):
+    # compacted once per process and level
+    geojson, boundary_ids = compact_geojson(load_india_geojson(level))
+    return MapGeometry(geojson, state_ids(boundary_ids))
+
+
+def payload_bytes(geojson):
+    return len(json.dumps(geojson, separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    full = read_asset("full") if os.path.exists(asset_path("full")) else fetch_india_geojson()
+    build_simplified_assets(full)
+    import pandas as pd
+    from data_backend import DATA_DIR
+    states = pd.read_csv(os.path.join(DATA_DIR, "map_trans.csv"), usecols=["State"])["State"].unique()
+    for level in SIMPLIFY_TOLERANCES:
+        check_state_ids(load_map_geometry(level), states)
+    print(f"all {len(states)} States map to their own boundary")
+    for level in SIMPLIFY_TOLERANCES:
+        print(f"{level:>6}: {os.path.getsize(asset_path(level)) / 1024:,.0f} KB on disk, "
+              f"{payload_bytes(load_map_geometry(level).geojson) / 1024:,.0f} KB per render")
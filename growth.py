@@ -0,0 +1,98 @@
+# ======================================================
+# GROWTH ANALYTICS
+# ======================================================
+
+# One definition of year-over-year and quarter-over-quarter growth for every business case, instead of
+# LAG() windows and self-joins repeated in each query. The database only returns plain aggregates
+# (SUM ... GROUP BY key, Year[, Quarter]); add_growth() then sorts them once and compares every row
+# with the row before it in a single vectorized pass.
+#
+# Definition: the growth of a period is measured against the period immediately before it (the
+# previous year, or the previous quarter) for the same key. If that period has no row, or its value
+# is 0 or missing, the growth is missing (NULL), never infinite.
+#
+#   yearly = aggregate(df, ["Transaction_count"], keys=["State"])
+#   yearly = add_growth(yearly, ["Transaction_count"], keys=["State"])
+#   yearly["Transaction_count_growth_pct"]
+
+import numpy as np
+import pandas as pd
+
+PERIOD_COLUMNS = {"year": ["Year"], "quarter": ["Year", "Quarter"]}
+
+
+def period_index(df, period):
+    # consecutive integers for consecutive periods, so "the previous period" is simply index - 1
+    if period == "year":
+        return df["Year"].to_numpy(dtype=np.int64)
+    if period == "quarter":
+        return df["Year"].to_numpy(dtype=np.int64) * 4 + df["Quarter"].to_numpy(dtype=np.int64) - 1
+    raise ValueError(f"Unknown period {period!r}, expected one of {sorted(PERIOD_COLUMNS)}")
+
+
+def aggregate(df, metrics, keys=(), period="year"):
+    # one row per key and period, e.g. state-year totals from quarterly rows
+    columns = list(keys) + PERIOD_COLUMNS[period]
+    return df.groupby(columns, as_index=False, observed=True, dropna=False)[list(metrics)].sum(min_count=1)
+
+
+def key_codes(df, keys):
+    # one integer per distinct combination of key values, in sorted key order; -1 where any key is missing
+    codes = np.zeros(len(df), dtype=np.int64)
+    missing = np.zeros(len(df), dtype=bool)
+    for key in keys:
+        key_code, uniques = pd.factorize(df[key], sort=True)
+        codes = codes * (len(uniques) + 1) + key_code
+        missing |= key_code < 0
+    codes[missing] = -1
+    return codes
+
+
+def add_growth(df, metrics, keys=(), period="year"):
+    # adds <metric>_prev, <metric>_growth (absolute) and <metric>_growth_pct for every metric and returns
+    # the rows sorted by key and period; df must have one row per key and period (see aggregate)
+    codes = key_codes(df, keys)
+    index = period_index(df, period)
+    order = np.lexsort((index, codes))
+    codes, index = codes[order], index[order]
+    df = df.take(order).reset_index(drop=True)
+
+    # a row has a previous period if the row before it has the same key and the period right before it
+    has_prev = np.zeros(len(df), dtype=bool)
+    has_prev[1:] = (index[1:] - index[:-1] == 1) & (codes[1:] == codes[:-1]) & (codes[1:] >= 0)
+
+    columns = {}
+    for metric in metrics:
+        values = pd.to_numeric(df[metric]).to_numpy(dtype=float, na_value=np.nan)
+        prev = np.full(len(df), np.nan)
+        prev[1:] = values[:-1]
+        prev[~has_prev] = np.nan
+        valid = ~np.isnan(prev) & (prev != 0)
+        pct = np.full(len(df), np.nan)
+        pct[valid] = (values[valid] - prev[valid]) * 100.0 / prev[valid]
+        columns[f"{metric}_prev"] = prev
+        columns[f"{metric}_growth"] = values - prev
+        columns[f"{metric}_growth_pct"] = pct
+    return pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
+
+
+def round_half_up(values, digits=2):
+    # SQL ROUND(): halves go away from zero (pandas/numpy round them to even), so 156.125 -> 156.13 like the database did
+    scale = 10.0 ** digits
+    values = values.astype(float)
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+def rank_within(df, by, column, ascending=False):
+    # 1, 2, 3 ... within each group of `by` (like ROW_NUMBER() OVER (PARTITION BY ... ORDER BY column)),
+    # missing values last; ties keep the row order of df
+    values = pd.to_numeric(df[column]).to_numpy(dtype=float, na_value=np.nan)
+    values = np.where(np.isnan(values), np.inf, values if ascending else -values)
+    groups = key_codes(df, by)
+    order = np.lexsort((np.arange(len(df)), values, groups))
+    starts = np.ones(len(df), dtype=bool)
+    starts[1:] = groups[order][1:] != groups[order][:-1]
+    positions = np.arange(len(df))
+    ranks = np.empty(len(df), dtype=np.int64)
+    ranks[order] = positions - np.maximum.accumulate(np.where(starts, positions, 0)) + 1
+    return pd.Series(ranks, index=df.index)
@@ -0,0 +1,166 @@
+# ======================================================
+# BULK INGESTION
+# ======================================================
+
+# Loads the nine PhonePe Pulse CSV snapshots (agg_*.csv, map_*.csv, top_*.csv) into the tables the
+# app queries. Every file is first bulk-loaded into a staging table (<table>__new) with the column
+# types declared in schema.py, then all staging tables are swapped in together and the composite
+# indexes declared in migrations.py are rebuilt, so the app never sees a half-loaded drop. The new
+# version of every loaded table is written to the versions table (see data_backend.VERSIONS) with the swap,
+# and the fingerprints of its (Year, Quarter) partitions to pulse_partitions for later incremental refreshes.
+#
+#   python ingest.py                                  # load into the configured backend (PULSE_BACKEND / DB_* variables)
+#   python ingest.py --url sqlite:///pulse.db         # load into any SQLAlchemy URL, e.g. a local SQLite file
+#   python ingest.py --data-dir ./pulse_2025_q1 --tables agg_trans map_trans
+#   python ingest.py --incremental                    # only replace the (Year, Quarter) partitions that changed, see refresh.py
+#   python ingest.py --record-versions                # only rewrite the versions table, after loading tables by other means
+
+import argparse
+import os
+import time
+from collections import namedtuple
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+
+from data_backend import DATA_DIR, TABLES, create_engine_from_config, write_versions
+from migrations import create_indexes
+from refresh import record_fingerprints
+from schema import COLUMNS, apply_schema, table_definition
+
+CHUNK_SIZE = 50_000 # rows per batched insert
+STAGING_SUFFIX = "__new"
+RETIRED_SUFFIX = "__old"
+
+# what ingest() did: {table: rows staged}, {table: seconds spent staging it}, and the seconds the swap and index builds took
+IngestReport = namedtuple("IngestReport", ["rows", "seconds", "swap_seconds"])
+
+
+def csv_path(data_dir, table):
+    return os.path.join(data_dir, f"{table}.csv")
+
+
+# ------------------------------------------------------
+# Loading into the staging tables
+# ------------------------------------------------------
+
+def load_chunks(conn, staging, path, chunksize):
+    # portable path: read the CSV in chunks and insert each one with a single executemany
+    # (SQLite runs it in one transaction, pymysql rewrites it into multi-row INSERTs)
+    rows = 0
+    names = {column: "str" for column in staging.columns.keys() if COLUMNS[column].dtype == "category"}
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=names):
+        chunk = apply_schema(chunk) # counts stored as "3.0" become integers, blank pincodes NULL
+        chunk.to_sql(staging.name, conn, if_exists="append", index=False, chunksize=chunksize)
+        rows += len(chunk)
+    return rows
+
+
+def load_duckdb(conn, staging, path, chunksize):
+    # DuckDB reads the CSV natively, which is much faster than inserting from Python
+    columns = ", ".join(staging.columns.keys())
+    quoted_path = path.replace("'", "''")
+    conn.execute(text(f"INSERT INTO {staging.name} ({columns}) SELECT {columns} FROM read_csv('{quoted_path}', header = true)"))
+    return conn.execute(text(f"SELECT COUNT(*) FROM {staging.name}")).scalar()
+
+
+BULK_LOADERS = {"duckdb": load_duckdb}
+
+
+def load_staging(engine, table, path, chunksize=CHUNK_SIZE):
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    staging = table_definition(table + STAGING_SUFFIX, columns)
+    loader = BULK_LOADERS.get(engine.dialect.name, load_chunks)
+    with engine.begin() as conn:
+        staging.drop(conn, checkfirst=True) # leftovers of an interrupted run
+        staging.create(conn)
+        return loader(conn, staging, path, chunksize)
+
+
+# ------------------------------------------------------
+# Swapping the staging tables in
+# ------------------------------------------------------
+
+def swap_mysql(engine, tables):
+    # MySQL DDL commits implicitly, but one RENAME TABLE statement swaps every table atomically
+    with engine.begin() as conn:
+        for table in tables:
+            create_indexes(conn, table, target=table + STAGING_SUFFIX)
+    existing = set(inspect(engine).get_table_names())
+    renames = []
+    for table in tables:
+        if table in existing:
+            renames.append(f"{table} TO {table}{RETIRED_SUFFIX}")
+        renames.append(f"{table}{STAGING_SUFFIX} TO {table}")
+    with engine.begin() as conn:
+        conn.execute(text("RENAME TABLE " + ", ".join(renames)))
+        for table in tables:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}{RETIRED_SUFFIX}"))
+        record_fingerprints(conn, write_versions(conn, tables))
+
+
+def swap_transactional(engine, tables):
+    # SQLite and DuckDB run DDL inside transactions: readers see either the old tables or the new ones.
+    # Index names are global in SQLite, so the old table is dropped before its indexes are recreated.
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table in tables:
+            if table in existing:
+                conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text(f"ALTER TABLE {table}{STAGING_SUFFIX} RENAME TO {table}"))
+            create_indexes(conn, table)
+        record_fingerprints(conn, write_versions(conn, tables))
+
+
+SWAPS = {"mysql": swap_mysql}
+
+
+def ingest(engine, data_dir=DATA_DIR, tables=TABLES, chunksize=CHUNK_SIZE):
+    # loads and swaps in the tables without printing anything; returns an IngestReport for the caller to show or log
+    rows, seconds = {}, {}
+    for table in tables:
+        started = time.perf_counter()
+        rows[table] = load_staging(engine, table, csv_path(data_dir, table), chunksize)
+        seconds[table] = time.perf_counter() - started
+    started = time.perf_counter()
+    SWAPS.get(engine.dialect.name, swap_transactional)(engine, list(tables))
+    return IngestReport(rows, seconds, time.perf_counter() - started)
+
+
+def print_ingest_report(report):
+    for table, rows in report.rows.items():
+        print(f"{table:>10}: {rows:>8,} rows staged in {report.seconds[table]:.2f}s")
+    print(f"swapped in {len(report.rows)} tables and built indexes in {report.swap_seconds:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load the PhonePe Pulse CSV snapshots into the database.")
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: the configured PULSE_BACKEND)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="folder holding agg_trans.csv etc.")
+    parser.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, metavar="TABLE", help="tables to load (default: all nine)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="rows per batched insert")
+    parser.add_argument("--incremental", action="store_true", help="only replace new or changed (Year, Quarter) partitions of existing tables")
+    parser.add_argument("--record-versions", action="store_true", help="only fingerprint the tables and rewrite the versions table")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url) if args.url else create_engine_from_config()
+    started = time.perf_counter()
+    if args.record_versions:
+        with engine.begin() as conn:
+            versions = write_versions(conn, args.tables)
+        for table, version in versions.items():
+            print(f"{table:>10}: {version}")
+        return
+    if args.incremental:
+        from refresh import refresh_tables
+        changes, replaced = refresh_tables(engine, args.data_dir, args.tables)
+        for table, partitions in changes.items():
+            print(f"{table:>10}: {len(partitions)} partitions, {replaced[table]:,} rows replaced")
+        print(f"{sum(len(partitions) for partitions in changes.values())} partitions refreshed in {time.perf_counter() - started:.2f}s")
+        return
+    report = ingest(engine, args.data_dir, args.tables, args.chunksize)
+    print_ingest_report(report)
+    print(f"loaded {sum(report.rows.values()):,} rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
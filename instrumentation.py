@@ -0,0 +1,164 @@
+# ======================================================
+# INSTRUMENTATION
+# ======================================================
+
+# A lightweight record of every query, figure build and chart render: wall time, rows and bytes
+# returned, cache hit/miss and the time spent waiting for a pooled connection. Events are kept in a
+# bounded in-memory buffer (shown in the sidebar debug panel with PULSE_DEBUG_PANEL=1), optionally
+# appended to a JSON lines file (PULSE_METRICS_LOG) and summed into totals that can be exported as
+# a Prometheus text snapshot (PULSE_METRICS_PROM, rewritten after every app run). Events are tagged with
+# the browser session the recording thread works for (bind_session), so the panel shows that session only.
+#
+#   with METRICS.timed("figure", "fig1") as event:
+#       fig = build_fig1(df)
+#       event["cache"] = "miss"
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEBUG_PANEL = os.environ.get("PULSE_DEBUG_PANEL", "0") == "1"
+METRICS_LOG = os.environ.get("PULSE_METRICS_LOG", "") # JSON lines, one event per line
+METRICS_PROM = os.environ.get("PULSE_METRICS_PROM", "") # Prometheus text exposition format
+RECENT_EVENTS = 2000 # events kept in memory for the debug panel
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def query_label(query):
+    # a readable default name for ad-hoc queries: the first words of the SQL
+    return re.sub(r"\s+", " ", str(query)).strip()[:60]
+
+
+class Metrics:
+
+    def __init__(self, log_path=METRICS_LOG, keep=RECENT_EVENTS):
+        self.log_path = log_path
+        self.events = deque(maxlen=keep)
+        self.totals = {} # (stage, name) -> running sums, never trimmed, for the Prometheus export
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def bind_session(self, session):
+        # tags the events this thread records from now on; worker threads bind the session of each task they run
+        self._local.session = session
+
+    def current_session(self):
+        return getattr(self._local, "session", None)
+
+    @contextmanager
+    def timed(self, stage, name, **fields):
+        # yields the event dict so the caller can add rows, bytes, cache etc. before it is recorded
+        event = {"stage": stage, "name": name, **fields}
+        started = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event["error"] = type(e).__name__
+            raise
+        finally:
+            event["ms"] = (time.perf_counter() - started) * 1000
+            self.record(event)
+
+    def record(self, event):
+        event.setdefault("ts", time.time())
+        event.setdefault("ms", 0.0)
+        if "session" not in event and self.current_session() is not None:
+            event["session"] = self.current_session()
+        with self._lock:
+            self.events.append(event)
+            totals = self.totals.setdefault((event["stage"], event["name"]), {
+                "count": 0, "seconds": 0.0, "rows": 0, "bytes": 0, "wait_seconds": 0.0, "errors": 0, "cache": {}})
+            totals["count"] += 1
+            totals["seconds"] += event["ms"] / 1000
+            totals["rows"] += event.get("rows", 0)
+            totals["bytes"] += event.get("bytes", 0)
+            totals["wait_seconds"] += event.get("wait_ms", 0.0) / 1000
+            totals["errors"] += "error" in event
+            if "cache" in event:
+                totals["cache"][event["cache"]] = totals["cache"].get(event["cache"], 0) + 1
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event, default=str) + "\n")
+
+    def since(self, ts, session=None):
+        with self._lock:
+            return [event for event in self.events if event["ts"] >= ts and (session is None or event.get("session") == session)]
+
+    def prometheus(self):
+        with self._lock:
+            totals = {key: dict(value, cache=dict(value["cache"])) for key, value in self.totals.items()}
+        lines = []
+
+        def metric(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in rows:
+                label_text = ",".join(f'{key}="{str(val).replace(chr(34), chr(39))}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        def per_step(field):
+            return [({"stage": stage, "name": name}, values[field]) for (stage, name), values in sorted(totals.items())]
+
+        metric("pulse_step_seconds_total", "counter", "Wall time spent in each instrumented step.", per_step("seconds"))
+        metric("pulse_step_calls_total", "counter", "Number of times each step ran.", per_step("count"))
+        metric("pulse_step_errors_total", "counter", "Steps that raised an exception.", per_step("errors"))
+        metric("pulse_rows_total", "counter", "Rows returned by queries.", per_step("rows"))
+        metric("pulse_bytes_total", "counter", "In-memory bytes of the frames returned by queries.", per_step("bytes"))
+        metric("pulse_connection_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.", per_step("wait_seconds"))
+        metric("pulse_cache_requests_total", "counter", "Cache lookups by result.",
+               [({"stage": stage, "name": name, "result": result}, count)
+                for (stage, name), values in sorted(totals.items()) for result, count in sorted(values["cache"].items())])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=METRICS_PROM):
+        # written to a temporary file first, so a scraper reading the file never sees half a snapshot
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics() # shared by every session and worker thread of the process
+
+
+def read_sql_into(event, query, engine, params=None):
+    # pd.read_sql that fills in the connection wait, rows and bytes of an event
+    import pandas as pd # imported on first use, so importing this module (app.py does on every page) stays cheap
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        event["wait_ms"] = (time.perf_counter() - started) * 1000
+        df = pd.read_sql(query, conn, params=params)
+    event["rows"] = len(df)
+    event["bytes"] = frame_bytes(df)
+    return df
+
+
+def read_sql(query, engine, params=None, name=None):
+    with METRICS.timed("query", name or query_label(query)) as event:
+        return read_sql_into(event, query, engine, params)
+
+
+def summarize_events(events):
+    # one row per step for the debug panel, slowest first
+    import pandas as pd
+    if not events:
+        return pd.DataFrame(columns=["stage", "name", "calls", "total_ms", "max_ms", "rows", "bytes", "wait_ms", "cache"])
+    df = pd.DataFrame(events)
+    for column in ["rows", "bytes", "wait_ms"]:
+        if column not in df:
+            df[column] = 0
+    df["cache"] = df["cache"].fillna("") if "cache" in df else ""
+    summary = df.groupby(["stage", "name"], sort=False).agg(
+        calls=("ms", "size"), total_ms=("ms", "sum"), max_ms=("ms", "max"), rows=("rows", "sum"),
+        bytes=("bytes", "sum"), wait_ms=("wait_ms", "sum"),
+        cache=("cache", lambda values: " ".join(value for value in values if value))).reset_index()
+    return summary.sort_values("total_ms", ascending=False, kind="stable").reset_index(drop=True)
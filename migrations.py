@@ -0,0 +1,207 @@
+# ======================================================
+# INDEXES AND QUERY ADVISOR
+# ======================================================
+
+# The composite indexes of the nine tables, declared once and built by ingest.py after every load, and
+# a migration command that brings an existing database in line with them (creating missing indexes and
+# dropping the ix_* indexes that are no longer declared). Every index starts with (Year, Quarter), the
+# filter of every EXPLORE DATA read, followed by the columns the shared business scans group by, so
+# the database can read a single quarter and aggregate in index order.
+#
+# The advisor runs EXPLAIN for every query the app sends - the business scans, the EXPLORE DATA reads
+# for one quarter and for the full cube, the list of quarters, the refresh fingerprints and the table
+# versions - and flags any full table scan or sort the indexes do not cover. Queries that read a whole
+# table by design (the scans, the cube build, the list of quarters) may scan it, but must not sort. It understands SQLite and MySQL plans,
+# so it can be run against a local SQLite stand-in loaded with ingest.py.
+#
+#   python migrations.py migrate                           # the configured backend
+#   python migrations.py migrate --url sqlite:///pulse.db --dry-run
+#   python migrations.py advise --url sqlite:///pulse.db   # exits with 1 if anything is flagged
+
+import argparse
+import re
+import sys
+from collections import namedtuple
+from sqlalchemy import create_engine, inspect, text
+
+from data_backend import TABLES, create_engine_from_config
+
+INDEXES = {
+    "agg_trans": [("Year", "Quarter", "State", "Transaction_type"), ("Year", "Quarter", "Transaction_type")],
+    "agg_ins": [("Year", "Quarter", "State")],
+    "agg_user": [("Year", "Quarter", "State"), ("Brand_name",)],
+    "map_trans": [("Year", "Quarter", "State", "District_name")],
+    "map_ins": [("Year", "Quarter", "State", "District_name")],
+    "map_user": [("Year", "Quarter", "State", "District_name")],
+    "top_trans": [("Year", "Quarter", "Pincode", "State")],
+    "top_ins": [("Year", "Quarter", "Pincode", "State")],
+    "top_user": [("Year", "Quarter", "Pincode", "State")]}
+
+DROP_INDEX = {"mysql": "DROP INDEX {name} ON {table}"} # default: DROP INDEX {name}
+
+RegisteredQuery = namedtuple("RegisteredQuery", ["name", "query", "params", "reads_whole_table"])
+Finding = namedtuple("Finding", ["query", "table", "problem", "detail"])
+
+
+def index_name(table, columns):
+    return f"ix_{table}_" + "_".join(column.lower() for column in columns)
+
+
+def declared_indexes(table):
+    return {index_name(table, columns): columns for columns in INDEXES.get(table, [])}
+
+
+def create_indexes(conn, table, target=None):
+    # target lets MySQL build the indexes on the staging table before the swap; index names are per table there
+    for name, columns in declared_indexes(table).items():
+        conn.execute(text(f"CREATE INDEX {name} ON {target or table} ({', '.join(columns)})"))
+
+
+# ------------------------------------------------------
+# Migrations
+# ------------------------------------------------------
+
+def existing_indexes(conn, table):
+    # names of the indexes this module manages (ix_<table>_*); duckdb-engine cannot reflect indexes
+    if conn.dialect.name == "duckdb":
+        names = {row[0] for row in conn.execute(text("SELECT index_name FROM duckdb_indexes() WHERE table_name = :table"), {"table": table})}
+    else:
+        names = {index["name"] for index in inspect(conn).get_indexes(table)}
+    return {name for name in names if name.startswith(f"ix_{table}_")}
+
+
+def plan_migration(conn, tables=TABLES):
+    # [(statement, description)] turning the indexes of the existing tables into the declared ones
+    existing_tables = set(inspect(conn).get_table_names())
+    steps = []
+    for table in tables:
+        if table not in existing_tables:
+            continue
+        existing, declared = existing_indexes(conn, table), declared_indexes(table)
+        for name in sorted(existing - set(declared)):
+            steps.append((DROP_INDEX.get(conn.dialect.name, "DROP INDEX {name}").format(name=name, table=table), f"drop {name}"))
+        for name in sorted(set(declared) - existing):
+            steps.append((f"CREATE INDEX {name} ON {table} ({', '.join(declared[name])})", f"create {name}"))
+    return steps
+
+
+def migrate(engine, tables=TABLES, dry_run=False):
+    with engine.begin() as conn:
+        steps = plan_migration(conn, tables)
+        if not dry_run:
+            for statement, _ in steps:
+                conn.execute(text(statement))
+    return steps
+
+
+# ------------------------------------------------------
+# Advisor
+# ------------------------------------------------------
+
+def registered_queries(engine, year=2024, quarter=1):
+    # every query the app sends, with the parameters of one quarter (a cube refresh reads one quarter at a time too)
+    from business_data import SCANS
+    from data_backend import VERSIONS, table_versions_query
+    from explore_data import DATASETS, partitions_query, slice_queries
+    from refresh import fingerprint_query
+
+    queries = [RegisteredQuery(f"business:{name}", query, {}, True) for name, query in SCANS.items()]
+    for dataset_type in DATASETS:
+        queries.append(RegisteredQuery(f"explore:partitions:{dataset_type}", partitions_query(dataset_type), {}, True))
+        for label, partitions, whole in [("quarter", [(year, quarter)], False), ("cube", None, True)]:
+            slice_query, params = slice_queries(dataset_type, partitions)
+            queries += [RegisteredQuery(f"explore:{label}:{dataset_type}:{view}", query, params, whole) for view, query in slice_query.items()]
+    existing = set(inspect(engine).get_table_names())
+    for table in TABLES:
+        if table in existing:
+            columns = [column["name"] for column in inspect(engine).get_columns(table)]
+            queries.append(RegisteredQuery(f"refresh:{table}", fingerprint_query(table, columns), {}, True))
+    queries.append(RegisteredQuery("table_versions", table_versions_query(), {}, True))
+    if VERSIONS.name in existing:
+        queries.append(RegisteredQuery("versions", VERSIONS.select(), {}, True))
+    return queries
+
+
+def explain_sqlite(conn, query, params):
+    # EXPLAIN QUERY PLAN: "SCAN t" reads the whole table (or a whole index), "SEARCH t USING INDEX" does not,
+    # "USE TEMP B-TREE FOR ..." is SQLite's filesort
+    problems = []
+    for row in conn.execute(text("EXPLAIN QUERY PLAN " + str(query)), params):
+        detail = row[-1]
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan:
+            problems.append((scan.group(1), "full scan", detail))
+        elif detail.startswith("USE TEMP B-TREE"):
+            problems.append(("", "filesort", detail))
+    return problems
+
+
+def explain_mysql(conn, query, params):
+    # EXPLAIN: access type ALL (table) or index (whole index) is a full scan; Extra shows sorts and temporary tables
+    problems = []
+    for row in conn.execute(text("EXPLAIN " + str(query)), params).mappings():
+        row = {key.lower(): value for key, value in row.items()}
+        if row.get("type") in ("ALL", "index"):
+            problems.append((row.get("table") or "", "full scan", f"type={row['type']} key={row.get('key')} rows={row.get('rows')}"))
+        extra = row.get("extra") or ""
+        if "Using filesort" in extra or "Using temporary" in extra:
+            problems.append((row.get("table") or "", "filesort", extra))
+    return problems
+
+
+EXPLAINERS = {"sqlite": explain_sqlite, "mysql": explain_mysql}
+
+
+def explainer(engine):
+    if engine.dialect.name not in EXPLAINERS:
+        raise ValueError(f"No EXPLAIN advisor for {engine.dialect.name!r}, expected one of {sorted(EXPLAINERS)} "
+                         "(load a SQLite stand-in with: python ingest.py --url sqlite:///pulse.db)")
+    return EXPLAINERS[engine.dialect.name]
+
+
+def advise(engine, queries=None):
+    explain = explainer(engine)
+    findings = []
+    with engine.connect() as conn:
+        for registered in queries or registered_queries(engine):
+            for table, problem, detail in explain(conn, registered.query, registered.params):
+                if problem == "full scan" and registered.reads_whole_table:
+                    continue
+                findings.append(Finding(registered.name, table, problem, detail))
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the indexes of the PhonePe Pulse tables and check the app's query plans.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in [("migrate", "create missing and drop obsolete indexes"), ("advise", "EXPLAIN every query the app runs")]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--url", help="SQLAlchemy database URL (default: the configured PULSE_BACKEND)")
+    commands.choices["migrate"].add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, metavar="TABLE")
+    commands.choices["migrate"].add_argument("--dry-run", action="store_true", help="only print the statements")
+    commands.choices["advise"].add_argument("--year", type=int, default=2024, help="quarter used for the EXPLORE DATA reads")
+    commands.choices["advise"].add_argument("--quarter", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url) if args.url else create_engine_from_config()
+    if args.command == "migrate":
+        steps = migrate(engine, args.tables, args.dry_run)
+        for statement, _ in steps:
+            print(statement)
+        print(f"{len(steps)} index changes" + (" (dry run)" if args.dry_run else ""))
+        return 0
+
+    try:
+        explainer(engine)
+    except ValueError as e:
+        parser.error(str(e))
+    queries = registered_queries(engine, args.year, args.quarter)
+    findings = advise(engine, queries)
+    for finding in findings:
+        print(f"{finding.problem:>9}  {finding.query:<32} {finding.table:<10} {finding.detail}")
+    print(f"{len(queries)} queries checked, {len(findings)} problems")
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# ======================================================
+# BACKGROUND PREFETCH
+# ======================================================
+
+# EXPLORE DATA users step through the timeline (Q1 -> Q2 -> Q3 ...) or flip between Transactions,
+# Insurance and Users for the same period. While the current view is on screen, the Prefetcher reads
+# the slices they are likely to open next - the quarters right before and after the selected one and
+# the same quarter of the other two categories - into the lazily opened cubes (see explore_data.py),
+# so the next step is a dictionary lookup. The page only opens the cube it shows; the cubes of the other
+# categories are opened by the prefetch workers, so their quarter lists are never read on the script thread.
+#
+# - bounded: one small thread pool per process (PULSE_PREFETCH_WORKERS, default 2), so prefetching
+#   never takes more than that many pooled connections away from the page
+# - cancellable: every selection replaces the queued reads of the previous one, and leaving the page
+#   cancels them; a read that has already started finishes (one quarter, a few indexed queries)
+# - memory budget: slices that were prefetched but not viewed yet may take up to PULSE_PREFETCH_MB
+#   (default 32); beyond that the oldest ones are dropped from their cube again
+#
+#   prefetcher = Prefetcher(open_cube) # open_cube(dataset_type) -> ExploreCube, opened once per process (app.py get_cube_opener)
+#   prefetcher.prefetch(session, prefetch_targets(cube, DATASETS, 2024, 2), opened)
+#   prefetcher.cancel(session)
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from explore_data import slice_bytes
+from instrumentation import METRICS
+
+PREFETCH_ENABLED = os.environ.get("PULSE_PREFETCH", "1") == "1"
+PREFETCH_WORKERS = int(os.environ.get("PULSE_PREFETCH_WORKERS", "2"))
+PREFETCH_BUDGET = int(float(os.environ.get("PULSE_PREFETCH_MB", "32")) * 1024 * 1024)
+
+
+def prefetch_targets(cube, dataset_types, year, quarter):
+    # [(dataset type, (year, quarter))], most likely next step first: the neighbouring quarters of the cube on
+    # screen, then the same quarter of the other categories, whose cubes need not be open yet
+    targets = [(cube.dataset_type, key) for key in cube.adjacent(year, quarter)]
+    targets += [(name, (year, quarter)) for name in dataset_types if name != cube.dataset_type]
+    return targets
+
+
+class Prefetcher:
+
+    def __init__(self, open_cube, workers=PREFETCH_WORKERS, budget=PREFETCH_BUDGET):
+        self.open_cube = open_cube # dataset type -> ExploreCube, called on a worker for a cube that is not open yet
+        self.budget = budget
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pulse-prefetch")
+        self._tasks = {} # (dataset_type, year, quarter) -> (future, owners that still want it)
+        self._unviewed = OrderedDict() # (cube, key) -> bytes of a prefetched slice nobody has viewed yet, oldest first
+        self._lock = threading.RLock() # re-entered by the done callback of a future that finished already
+
+    def prefetch(self, owner, targets, opened=None):
+        # replaces the reads the owner (one browser session) queued before; slices built in an open cube
+        # ({dataset type: ExploreCube}) are skipped without a worker
+        opened = opened or {}
+        with self._lock:
+            self._release(owner)
+            for dataset_type, key in targets:
+                if dataset_type in opened and opened[dataset_type].is_built(key):
+                    continue
+                task_key = (dataset_type,) + key
+                if task_key in self._tasks:
+                    self._tasks[task_key][1].add(owner)
+                    continue
+                future = self._pool.submit(self._load, owner, dataset_type, key)
+                self._tasks[task_key] = (future, {owner})
+                future.add_done_callback(lambda _, task_key=task_key: self._finished(task_key))
+
+    def cancel(self, owner):
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner):
+        # a queued read that no session wants any more is cancelled; one that has started cannot be
+        for task_key, (future, owners) in list(self._tasks.items()):
+            owners.discard(owner)
+            if not owners and future.cancel():
+                METRICS.record({"stage": "prefetch", "name": "{}:{}Q{}".format(*task_key), "cache": "cancelled"})
+
+    def _finished(self, task_key):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def _load(self, owner, dataset_type, key):
+        METRICS.bind_session(owner) # the events of the read show up in the debug panel of the session that asked first
+        with METRICS.timed("prefetch", f"{dataset_type}:{key[0]}Q{key[1]}", cache="hit") as event:
+            cube = self.open_cube(dataset_type) # reads the quarter list the first time, here rather than on the page
+            if cube.is_built(key): # the page read it meanwhile
+                return
+            event["cache"] = "miss"
+            event["bytes"] = slice_bytes(cube.load(key))
+        with self._lock:
+            self._unviewed[(cube, key)] = event["bytes"]
+            self._trim()
+
+    def _trim(self):
+        # viewed slices belong to the page now; unviewed ones beyond the budget are dropped, oldest first
+        for entry in [entry for entry in self._unviewed if entry[1] in entry[0].viewed]:
+            del self._unviewed[entry]
+        total = sum(self._unviewed.values())
+        while total > self.budget and self._unviewed:
+            (cube, key), size = self._unviewed.popitem(last=False)
+            total -= size
+            cube.discard(key)
+            METRICS.record({"stage": "prefetch", "name": f"{cube.dataset_type}:{key[0]}Q{key[1]}", "cache": "evicted", "bytes": size})
@@ -0,0 +1,120 @@
+# ======================================================
+# PRERENDERED BUSINESS FIGURES
+# ======================================================
+
+# The BUSINESS CASES charts only depend on the loaded data, so they can be built once, offline, instead
+# of in every process. `python prerender.py` builds every figure (fig1-fig17 and the per-state pie
+# charts), writes each one as Plotly JSON and records them in manifest.json with the data they were
+# built from: the versions of the tables each figure reads (see data_backend.table_versions) and a
+# fingerprint of the code that builds them. The app loads an artifact instead of building the figure
+# whenever both still match, so those charts need neither the database nor the figure builders; a
+# figure whose tables have changed since the build is built as usual.
+#
+#   python prerender.py                                        # the configured backend, into prerendered/
+#   python prerender.py --url sqlite:///pulse.db --out-dir build/figures
+#   python prerender.py --check                                # which artifacts match the current data
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine
+
+from business_data import BUSINESS_FIGURES, FigureRegistry, code_version, figure_version
+from data_backend import create_engine_from_config, table_versions
+from disk_cache import figure_from_json, figure_to_json
+
+PRERENDER_DIR = os.environ.get("PULSE_PRERENDER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prerendered"))
+PRERENDER_FORMAT = 1
+
+
+def write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def prerender(engine, out_dir=PRERENDER_DIR):
+    # builds the figures straight from the database and returns the manifest; artifact files are named after
+    # their version and the manifest is replaced last, so a running app never pairs a manifest with the wrong file
+    os.makedirs(out_dir, exist_ok=True)
+    versions = table_versions(engine)
+    code = code_version()
+    names = list(BUSINESS_FIGURES)
+    figures = FigureRegistry(engine, versions=versions).get(names)
+    manifest = {"format": PRERENDER_FORMAT, "code": code, "built": time.time(), "versions": versions, "figures": {}}
+    for name in names:
+        version = figure_version(name, versions)
+        data = figure_to_json(figures[name])
+        file_name = f"{name}-{hashlib.sha256((code + version).encode('utf-8')).hexdigest()[:12]}.json"
+        write_atomic(os.path.join(out_dir, file_name), data)
+        entry = {"file": file_name, "version": version, "bytes": len(data)}
+        if isinstance(figures[name], dict):
+            entry["entries"] = sorted(figures[name]) # the states of the pie charts
+        manifest["figures"][name] = entry
+    write_atomic(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+    current = {entry["file"] for entry in manifest["figures"].values()} | {"manifest.json"}
+    for entry in os.scandir(out_dir):
+        if entry.is_file() and entry.name.endswith(".json") and entry.name not in current:
+            os.remove(entry.path) # artifacts of earlier builds
+    return manifest
+
+
+class PrerenderedFigures:
+    # the artifacts of one prerender build; get() returns a figure only if it was built from the given data and by
+    # the current code, so FigureRegistry can ask for any figure and fall back to building it
+
+    def __init__(self, directory=PRERENDER_DIR):
+        self.directory = directory
+        try:
+            with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        usable = manifest.get("format") == PRERENDER_FORMAT and manifest.get("code") == code_version()
+        self.figures = manifest.get("figures", {}) if usable else {}
+
+    def __len__(self):
+        return len(self.figures)
+
+    def get(self, name, version):
+        entry = self.figures.get(name)
+        if entry is None or entry["version"] != version:
+            return None
+        try:
+            with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+                return figure_from_json(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prerender the BUSINESS CASES figures as Plotly JSON for the current data.")
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: the configured PULSE_BACKEND)")
+    parser.add_argument("--out-dir", default=PRERENDER_DIR, help="where the artifacts and manifest.json are written")
+    parser.add_argument("--check", action="store_true", help="only report which artifacts match the current data")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url) if args.url else create_engine_from_config()
+    if args.check:
+        prerendered, versions = PrerenderedFigures(args.out_dir), table_versions(engine)
+        stale = [name for name in BUSINESS_FIGURES if prerendered.figures.get(name, {}).get("version") != figure_version(name, versions)]
+        for name in stale:
+            print(f"stale: {name}")
+        print(f"{len(BUSINESS_FIGURES) - len(stale)} current, {len(stale)} stale")
+        return 1 if stale else 0
+
+    started = time.perf_counter()
+    manifest = prerender(engine, args.out_dir)
+    for name, entry in manifest["figures"].items():
+        print(f"{name:>16}: {entry['bytes']:>9,} bytes  {entry['file']}")
+    print(f"{len(manifest['figures'])} figures in {time.perf_counter() - started:.2f}s -> {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# ======================================================
+# INCREMENTAL REFRESH
+# ======================================================
+
+# Every PhonePe Pulse release adds a quarter (and now and then corrects an earlier one). Instead of
+# reloading every table, refresh_tables() fingerprints each (Year, Quarter) partition of the source -
+# row count plus the sum of every measure column - and only replaces the partitions that are new,
+# changed or gone, each table in one transaction. The fingerprints of the database side are not
+# re-aggregated: every load stores them in the pulse_partitions table, tagged with the table version
+# they describe, and the new table version is computed from them. Only a table without stored
+# fingerprints for its current version (loaded by other means) is aggregated, once. The database work
+# grows with the size of the delta, not with the length of the history.
+#
+# The app then updates only what those partitions feed: ExploreCube.refresh() recomputes the affected
+# Year x Quarter slices and FigureRegistry.refresh() drops the business figures whose tables changed.
+# A load done elsewhere is noticed through the versions table instead, and apply_versions() does the
+# same per changed table.
+#
+#   python ingest.py --incremental                     # the configured backend
+#   python ingest.py --incremental --url sqlite:///pulse.db --data-dir ./new_drop
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, text
+from sqlalchemy.exc import DBAPIError
+
+from data_backend import CHECKSUM_COLUMNS, DATA_DIR, TABLES, read_versions, version_hash, write_versions
+from explore_data import partition_filter
+from schema import COLUMNS, apply_schema
+
+PARTITION_COLUMNS = ["Year", "Quarter"]
+
+# the fingerprint of every partition as last loaded ({"row_count": ..., measure: sum}) and the table version it belongs to
+PARTITIONS = Table("pulse_partitions", MetaData(), Column("table_name", String(64), primary_key=True),
+                   Column("Year", Integer, primary_key=True), Column("Quarter", Integer, primary_key=True),
+                   Column("fingerprint", Text, nullable=False), Column("version", String(64), nullable=False))
+
+
+def measure_columns(columns):
+    # the columns summed into a partition fingerprint: counts and amounts, not keys
+    return [column for column in columns if COLUMNS[column].dtype in ("Int64", "float64")]
+
+
+def source_fingerprints(df):
+    measures = measure_columns(df.columns)
+    grouped = df.groupby(PARTITION_COLUMNS)
+    fingerprints = grouped.size().rename("row_count").to_frame().join(grouped[measures].sum())
+    return fingerprints.reset_index()
+
+
+def fingerprint_query(table, columns):
+    sums = "".join(f", SUM({column}) AS {column}" for column in measure_columns(columns))
+    return f"SELECT Year, Quarter, COUNT(*) AS row_count{sums} FROM {table} GROUP BY Year, Quarter"
+
+
+def table_fingerprints(engine, table, columns):
+    return pd.read_sql(fingerprint_query(table, columns), engine)
+
+
+def read_fingerprints(conn, table, version):
+    # the stored fingerprints of a table, or None if there are none for its current version
+    try:
+        rows = conn.execute(PARTITIONS.select().where(PARTITIONS.c.table_name == table)).fetchall()
+    except DBAPIError: # no pulse_partitions table yet
+        conn.rollback()
+        return None
+    if not rows or any(row.version != version for row in rows):
+        return None
+    return pd.DataFrame([{"Year": row.Year, "Quarter": row.Quarter, **json.loads(row.fingerprint)} for row in rows])
+
+
+def write_fingerprints(conn, table, fingerprints, version):
+    PARTITIONS.create(conn, checkfirst=True)
+    conn.execute(PARTITIONS.delete().where(PARTITIONS.c.table_name == table))
+    records = [{"table_name": table, "Year": int(row.pop("Year")), "Quarter": int(row.pop("Quarter")), "version": version,
+                "fingerprint": json.dumps({column: float(value) for column, value in row.items()})}
+               for row in fingerprints.to_dict("records")]
+    if records:
+        conn.execute(PARTITIONS.insert(), records)
+
+
+def record_fingerprints(conn, versions):
+    # after a full load: aggregates the loaded tables once and stores their fingerprints with their new versions
+    for table, version in versions.items():
+        columns = list(conn.execute(text(f"SELECT * FROM {table} WHERE 1 = 0")).keys())
+        write_fingerprints(conn, table, pd.read_sql(text(fingerprint_query(table, columns)), conn), version)
+
+
+def fingerprints_version(table, fingerprints):
+    # the table version (see data_backend.fingerprint_versions) from its partition fingerprints, without a table scan
+    latest = (fingerprints["Year"].astype(int) * 10 + fingerprints["Quarter"].astype(int)).max() if len(fingerprints) else 0
+    return version_hash(fingerprints["row_count"].sum(), latest, round(float(fingerprints[CHECKSUM_COLUMNS[table]].sum())))
+
+
+def replace_fingerprints(target, source, partitions):
+    # the stored fingerprints with those of the given partitions taken from the source (or dropped if it has none)
+    def keys(fingerprints):
+        return pd.MultiIndex.from_frame(fingerprints[PARTITION_COLUMNS].astype(int))
+
+    return pd.concat([target[~keys(target).isin(partitions)], source[keys(source).isin(partitions)]], ignore_index=True)
+
+
+def changed_partitions(source, target):
+    # (year, quarter) partitions that are new, changed or no longer in the source
+    merged = source.merge(target, on=PARTITION_COLUMNS, how="outer", suffixes=("", "_db"), indicator=True)
+    changed = merged["_merge"] != "both"
+    for column in [column for column in source.columns if column not in PARTITION_COLUMNS]:
+        ours = pd.to_numeric(merged[column]).fillna(0).to_numpy(dtype=float)
+        theirs = pd.to_numeric(merged[column + "_db"]).fillna(0).to_numpy(dtype=float)
+        changed |= ~np.isclose(ours, theirs, rtol=1e-9, atol=1e-6) # summation order differs between pandas and SQL
+    return sorted((int(year), int(quarter)) for year, quarter in merged.loc[changed, PARTITION_COLUMNS].itertuples(index=False))
+
+
+def apply_delta(engine, table, df, partitions, fingerprints):
+    # replaces the given partitions in one transaction, with the new version of the table and the fingerprints of all
+    # its partitions afterwards: readers see the old or the new quarter, never neither
+    where, params = partition_filter(partitions)
+    keys = pd.MultiIndex.from_frame(df[PARTITION_COLUMNS].astype(int))
+    rows = df[keys.isin(partitions)]
+    version = fingerprints_version(table, fingerprints)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {table}{where}"), params)
+        if len(rows):
+            rows.to_sql(table, conn, if_exists="append", index=False, chunksize=50_000)
+        write_versions(conn, [table], {table: version})
+        write_fingerprints(conn, table, fingerprints, version)
+    return len(rows)
+
+
+def refresh_tables(engine, data_dir=DATA_DIR, tables=TABLES):
+    # returns {table: [(year, quarter), ...]} for every table that changed, and {table: rows replaced}
+    changes, replaced = {}, {}
+    for table in tables:
+        df = apply_schema(pd.read_csv(os.path.join(data_dir, f"{table}.csv")))
+        source = source_fingerprints(df)
+        with engine.connect() as conn:
+            version = read_versions(conn).get(table)
+            target = read_fingerprints(conn, table, version)
+        if target is None: # nothing stored for the current version: aggregated once, and stored below
+            target = table_fingerprints(engine, table, df.columns)
+            with engine.begin() as conn:
+                write_fingerprints(conn, table, target, version or write_versions(conn, [table])[table])
+        partitions = changed_partitions(source, target)
+        if partitions:
+            replaced[table] = apply_delta(engine, table, df, partitions, replace_fingerprints(target, source, partitions))
+            changes[table] = partitions
+    return changes, replaced
+
+
+def changed_quarters(changes, tables):
+    # the (year, quarter) partitions that changed in any of the given tables
+    return sorted({partition for table in tables for partition in changes.get(table, [])})
+
+
+def source_stamp(data_dir=DATA_DIR, tables=TABLES):
+    # modification time and size of every source CSV: a cheap way to notice that a new drop has landed
+    stamp = []
+    for table in tables:
+        try:
+            stat = os.stat(os.path.join(data_dir, f"{table}.csv"))
+        except FileNotFoundError:
+            stamp.append(None)
+            continue
+        stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+def apply_changes(engine, changes, cubes, registry=None):
+    # updates what the changed partitions feed: the affected slices of the EXPLORE DATA cubes that have been
+    # built ({dataset_type: ExploreCube}) and the business figures that read a changed table
+    from data_backend import table_versions
+    from explore_data import dataset_tables
+
+    versions = table_versions(engine) if changes else None
+    for dataset_type, cube in list(cubes.items()):
+        cube.refresh(engine, changed_quarters(changes, dataset_tables(dataset_type)), versions)
+    if registry is not None and changes:
+        return registry.refresh(versions, changes)
+    return []
+
+
+def apply_versions(engine, versions, cubes, registry):
+    # the same for a load the app did not run itself (ingest.py, or another process), noticed as new table versions
+    # (see data_backend.table_versions): the cubes reading a changed table re-read the slices they had built, and
+    # only the figures of changed tables are dropped. Returns the names of the dropped figures
+    from explore_data import dataset_tables
+
+    changed = {table for table in set(versions) | set(registry.versions) if versions.get(table) != registry.versions.get(table)}
+    for dataset_type, cube in list(cubes.items()):
+        if dataset_tables(dataset_type) & changed:
+            cube.refresh(engine, cube.partitions, versions)
+    return registry.refresh(versions)
@@ -0,0 +1,74 @@
+# ======================================================
+# TABLE SCHEMA
+# ======================================================
+
+# One registry of column types for the nine PhonePe Pulse tables, applied by every path that loads
+# them: the ingestion command and the embedded DuckDB backend use the SQL types, and frames read back
+# into pandas are converted to the compact dtypes. Names repeated on every row (states, districts,
+# brands, payment types) become categoricals, Year/Quarter become int16/int8, pincodes int32 and
+# counts proper integers, even when the CSV stores them as "3.0". The integer columns are nullable
+# because a handful of rows have blank pincodes or counts.
+
+from collections import namedtuple
+import pandas as pd
+from sqlalchemy import BigInteger, Column, Double, Integer, MetaData, SmallInteger, String, Table
+
+from instrumentation import read_sql
+
+ColumnSchema = namedtuple("ColumnSchema", ["sql_type", "dtype"])
+
+COLUMNS = {
+    # names
+    "State": ColumnSchema(String(64), "category"),
+    "District_name": ColumnSchema(String(128), "category"),
+    "Transaction_type": ColumnSchema(String(64), "category"),
+    "Insurance_type": ColumnSchema(String(64), "category"),
+    "Brand_name": ColumnSchema(String(64), "category"),
+    # keys
+    "Year": ColumnSchema(SmallInteger(), "int16"),
+    "Quarter": ColumnSchema(SmallInteger(), "int8"),
+    "Pincode": ColumnSchema(Integer(), "Int32"),
+    # counts
+    "Transaction_count": ColumnSchema(BigInteger(), "Int64"),
+    "Insurance_count": ColumnSchema(BigInteger(), "Int64"),
+    "User_count": ColumnSchema(BigInteger(), "Int64"),
+    "Registered_users": ColumnSchema(BigInteger(), "Int64"),
+    "Number_of_app_opens": ColumnSchema(BigInteger(), "Int64"),
+    # amounts
+    "Transaction_amount": ColumnSchema(Double(), "float64"),
+    "Insurance_amount": ColumnSchema(Double(), "float64"),
+    "Percentage_of_users": ColumnSchema(Double(), "float64")}
+
+
+def column_schema(column, table=""):
+    if column not in COLUMNS:
+        raise ValueError(f"No schema declared for column {column!r}" + (f" of {table}" if table else ""))
+    return COLUMNS[column]
+
+
+def table_definition(name, columns):
+    # SQLAlchemy Table with the declared SQL types, used to create tables before loading them
+    return Table(name, MetaData(), *[Column(column, column_schema(column, name).sql_type) for column in columns])
+
+
+def sql_type_name(column, dialect=None):
+    return column_schema(column).sql_type.compile(dialect=dialect)
+
+
+def apply_schema(df):
+    # converts the columns the registry knows in place and returns df; other columns (query aliases etc.) are left alone
+    for column in df.columns:
+        if column not in COLUMNS:
+            continue
+        dtype = COLUMNS[column].dtype
+        if df[column].dtype == dtype:
+            continue
+        if dtype == "category":
+            df[column] = df[column].astype("category")
+        else:
+            df[column] = pd.to_numeric(df[column]).astype(dtype) # "3.0" -> 3; a fractional value raises instead of being truncated
+    return df
+
+
+def read_typed(query, engine, params=None, name=None):
+    return apply_schema(read_sql(query, engine, params=params, name=name))
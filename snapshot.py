@@ -0,0 +1,171 @@
+# ======================================================
+# PARTITIONED PARQUET SNAPSHOTS
+# ======================================================
+
+# Writes the nine tables as a columnar snapshot, one Parquet file per table, Year and Quarter:
+#
+#   <snapshot>/manifest.json
+#   <snapshot>/map_trans/Year=2024/Quarter=1/part-0.parquet
+#
+# The manifest records the rows, size and per-column min/max of every partition, so read_snapshot()
+# only opens the partitions that can match a year/quarter (or any other min/max) filter and only
+# decodes the columns asked for. A snapshot is a compact, versionable artifact that can be shipped
+# with a deploy and read without a database. read_snapshot() is for offline readers; with PULSE_SNAPSHOT_DIR
+# set, the DuckDB backend queries the files in place through views, and DuckDB prunes the Year=/Quarter=
+# folders and columns itself (see data_backend.py).
+#
+#   python snapshot.py export snapshots/2024Q4                         # from the CSVs in the repo
+#   python snapshot.py export snapshots/2024Q4 --url sqlite:///pulse.db  # from any database
+
+import argparse
+import json
+import os
+import shutil
+import pandas as pd
+
+from data_backend import DATA_DIR, TABLES
+from schema import apply_schema, read_typed
+
+SNAPSHOT_FORMAT = 1
+PARTITION_COLUMNS = ["Year", "Quarter"]
+MANIFEST_NAME = "manifest.json"
+
+
+def partition_path(table, year, quarter):
+    return os.path.join(table, f"Year={year}", f"Quarter={quarter}", "part-0.parquet")
+
+
+def column_stats(df):
+    # min/max of every column, skipping empty ones; categoricals are compared as strings
+    stats = {}
+    for column in df.columns:
+        values = df[column].dropna()
+        if values.empty:
+            continue
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        low, high = values.min(), values.max()
+        stats[column] = [low.item() if hasattr(low, "item") else low, high.item() if hasattr(high, "item") else high]
+    return stats
+
+
+def read_source(table, engine=None, data_dir=DATA_DIR):
+    if engine is not None:
+        return read_typed(f"SELECT * FROM {table}", engine, name=table)
+    return apply_schema(pd.read_csv(os.path.join(data_dir, f"{table}.csv")))
+
+
+def export_snapshot(directory, tables=TABLES, engine=None, data_dir=DATA_DIR):
+    # the snapshot is written next to the target and moved into place at the end, so readers never see half of one
+    staging = directory.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    manifest = {"format": SNAPSHOT_FORMAT, "partition_columns": PARTITION_COLUMNS, "tables": {}}
+    for table in tables:
+        df = read_source(table, engine, data_dir)
+        partitions = []
+        for (year, quarter), part in df.groupby(PARTITION_COLUMNS, sort=True):
+            path = partition_path(table, int(year), int(quarter))
+            os.makedirs(os.path.dirname(os.path.join(staging, path)), exist_ok=True)
+            part = part.drop(columns=PARTITION_COLUMNS).reset_index(drop=True)
+            part.to_parquet(os.path.join(staging, path), index=False, compression="zstd")
+            partitions.append({"Year": int(year), "Quarter": int(quarter), "path": path, "rows": len(part),
+                               "bytes": os.path.getsize(os.path.join(staging, path)), "stats": column_stats(part)})
+        manifest["tables"][table] = {"columns": list(df.columns), "partitions": partitions}
+    with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r} in {directory}")
+    return manifest
+
+
+def partition_matches(partition, filters):
+    # filters maps a column to a value, a (low, high) range or a list of values; a partition is skipped
+    # only when its min/max statistics prove that no row can match
+    for column, wanted in filters.items():
+        if column in PARTITION_COLUMNS:
+            low = high = partition[column]
+        elif column in partition["stats"]:
+            low, high = partition["stats"][column]
+        else:
+            continue # no statistics (e.g. an all-NULL column): the partition has to be read
+        if isinstance(wanted, tuple):
+            if wanted[1] < low or wanted[0] > high:
+                return False
+        elif isinstance(wanted, list):
+            if not any(low <= value <= high for value in wanted):
+                return False
+        elif not low <= wanted <= high:
+            return False
+    return True
+
+
+def read_snapshot(directory, table, columns=None, filters=None, manifest=None):
+    # e.g. read_snapshot(path, "map_trans", ["State", "Transaction_amount"], {"Year": 2024, "Quarter": 1})
+    manifest = manifest or read_manifest(directory)
+    entry = manifest["tables"][table]
+    filters = filters or {}
+    columns = list(columns or entry["columns"])
+    file_columns = [column for column in columns if column not in PARTITION_COLUMNS]
+
+    frames = []
+    for partition in entry["partitions"]:
+        if not partition_matches(partition, filters):
+            continue
+        part = pd.read_parquet(os.path.join(directory, partition["path"]), columns=file_columns)
+        for column in PARTITION_COLUMNS:
+            if column in columns:
+                part[column] = partition[column]
+        frames.append(part)
+
+    if not frames:
+        return apply_schema(pd.DataFrame({column: pd.Series(dtype=object) for column in columns}))
+    df = pd.concat(frames, ignore_index=True)[columns]
+    # row-level filtering for the columns that are not partition keys (the statistics only skip whole files)
+    for column, wanted in filters.items():
+        if column in PARTITION_COLUMNS or column not in df.columns:
+            continue
+        if isinstance(wanted, tuple):
+            df = df[df[column].between(*wanted)]
+        elif isinstance(wanted, list):
+            df = df[df[column].isin(wanted)]
+        else:
+            df = df[df[column] == wanted]
+    return apply_schema(df.reset_index(drop=True))
+
+
+def snapshot_glob(directory, table):
+    # every partition of a table, for readers that understand hive-style Year=/Quarter= folders (DuckDB, pyarrow)
+    return os.path.join(directory, table, "Year=*", "Quarter=*", "*.parquet")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the PhonePe Pulse tables as a partitioned Parquet snapshot.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a snapshot")
+    export.add_argument("directory")
+    export.add_argument("--url", help="SQLAlchemy database URL to read from (default: the CSVs in --data-dir)")
+    export.add_argument("--data-dir", default=DATA_DIR, help="folder holding agg_trans.csv etc.")
+    export.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, metavar="TABLE")
+    args = parser.parse_args(argv)
+
+    engine = None
+    if args.url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.url)
+    manifest = export_snapshot(args.directory, args.tables, engine, args.data_dir)
+    for table, entry in manifest["tables"].items():
+        rows = sum(partition["rows"] for partition in entry["partitions"])
+        size = sum(partition["bytes"] for partition in entry["partitions"])
+        print(f"{table:>10}: {rows:>8,} rows in {len(entry['partitions'])} partitions, {size / 1024:,.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# ======================================================
+# SYNTHETIC SCALE-UP DATA
+# ======================================================
+
+# Generates larger copies of the nine PhonePe Pulse tables from the bundled CSVs, to see how the
+# queries and pandas groupbys behave at production volumes. Two knobs:
+#
+#   --factor N       every source row becomes N rows whose counts and amounts are a random split of the
+#                    original row. In the district and pincode tables the copies become N synthetic districts
+#                    ("<district> 2", "<district> 3" ...) and pincodes (<pincode> + k * 1,000,000, never a real
+#                    one), so the number of districts and pincodes grows with the rows, the same names in every
+#                    table. States, payment types, brands, per-state totals and the quarterly seasonality stay
+#                    those of the real data; the agg_* tables keep their keys and only get more rows per key.
+#   --extra-years K  up to K years of history before the first year, shrunk by each state's first-year growth
+#                    rate, with the same quarter pattern. History never goes back past the year the dataset
+#                    started (FIRST_YEARS): 2016 for transactions and users, when PhonePe launched, and 2020 for
+#                    insurance, whose tables therefore get none.
+#
+#   python synth.py --factor 10 --out-dir data/x10                                # CSVs (PULSE_DATA_DIR / ingest.py --data-dir)
+#   python synth.py --factor 100 --out-dir data/x100 --url sqlite:///x100.db      # ... and load them into a database
+#   python synth.py --factor 100 --out-dir data/x100 --snapshot snapshots/x100    # ... and export a Parquet snapshot
+
+import argparse
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from data_backend import DATA_DIR, TABLES
+from schema import COLUMNS, apply_schema
+
+BLOCK_ROWS = 1_000_000 # generated rows held in memory at once
+KEY_COLUMNS = {"State", "District_name", "Pincode", "Year", "Quarter", "Transaction_type", "Insurance_type", "Brand_name"}
+GROWTH_LIMITS = (1.0, 3.0) # yearly growth used to extrapolate history backwards, clipped to a plausible range
+LAUNCH_YEAR = 2016 # PhonePe's first year; extrapolated history stops there
+FIRST_YEARS = {"agg_ins": 2020, "map_ins": 2020, "top_ins": 2020} # datasets that started later: insurance launched in 2020
+PINCODE_STRIDE = 1_000_000 # synthetic pincode k of a real one is pincode + k * stride, beyond any real 6-digit pincode
+MAX_FACTOR = np.iinfo(np.int32).max // PINCODE_STRIDE # the synthetic pincodes must fit the INTEGER column of schema.py
+
+SynthReport = namedtuple("SynthReport", ["rows", "seconds"]) # what generate() wrote: {table: rows}, {table: seconds}
+
+
+def additive_columns(df):
+    # counts, amounts and shares: the columns that are split between the generated rows
+    return [column for column in df.columns if column not in KEY_COLUMNS]
+
+
+def first_year_growth(df):
+    # growth of every state from the first to the second year, on the table's first measure
+    measure = additive_columns(df)[0]
+    years = sorted(df["Year"].unique())
+    if len(years) < 2:
+        return pd.Series(dtype=float)
+    totals = df[df["Year"].isin(years[:2])].groupby(["State", "Year"], observed=True)[measure].sum().unstack()
+    growth = (totals[years[1]] / totals[years[0]]).replace([np.inf, -np.inf], np.nan).fillna(1.0)
+    return growth.clip(*GROWTH_LIMITS)
+
+
+def extend_history(df, extra_years, first_year=LAUNCH_YEAR):
+    # prepend up to extra_years copies of the first year, each one divided by the state's growth rate once more,
+    # but no year before first_year (the dataset did not exist yet)
+    extra_years = min(extra_years, int(df["Year"].min()) - first_year)
+    if extra_years <= 0:
+        return df
+    growth = first_year_growth(df)
+    first = df[df["Year"] == df["Year"].min()]
+    state_growth = first["State"].astype(str).map(growth).fillna(1.0).to_numpy(dtype=float)
+    history = []
+    for k in range(1, extra_years + 1):
+        past = first.copy()
+        past["Year"] = past["Year"] - k
+        for column in additive_columns(df):
+            values = past[column].to_numpy(dtype=float, na_value=np.nan) / state_growth ** k
+            past[column] = values.round() if COLUMNS[column].dtype == "Int64" else values
+        history.append(past)
+    return apply_schema(pd.concat(history[::-1] + [df], ignore_index=True))
+
+
+def split_rows(df, factor, rng):
+    # every row becomes `factor` rows; integer columns are split with a multinomial draw (so they still sum
+    # to the original) and float columns with the same shares, which keeps averages like amount / count intact
+    if factor <= 1:
+        return df
+    columns = additive_columns(df)
+    shares = rng.dirichlet(np.ones(factor), size=len(df))
+    out = df.loc[df.index.repeat(factor)].reset_index(drop=True)
+    copy = np.tile(np.arange(factor), len(df)) # 0 keeps the real key, 1 .. factor - 1 are synthetic ones
+    if "District_name" in out.columns:
+        suffix = pd.Series(np.where(copy > 0, [f" {k + 1}" for k in copy], ""), index=out.index)
+        out["District_name"] = out["District_name"].astype(str) + suffix
+    if "Pincode" in out.columns:
+        out["Pincode"] = out["Pincode"] + pd.array(copy * PINCODE_STRIDE, dtype="Int32")
+    first_count = True
+    for column in columns:
+        values = df[column]
+        missing = values.isna().to_numpy()
+        if COLUMNS[column].dtype == "Int64":
+            counts = values.fillna(0).to_numpy(dtype=np.int64)
+            split = rng.multinomial(counts, shares)
+            if first_count: # the realised split of the first count drives every other column of the row
+                totals = np.maximum(counts, 1)[:, None]
+                shares = np.where(counts[:, None] > 0, split / totals, shares)
+                first_count = False
+            result = pd.array(split.ravel(), dtype="Int64")
+            result[np.repeat(missing, factor)] = pd.NA
+        else:
+            result = (values.fillna(0).to_numpy(dtype=float)[:, None] * shares).ravel()
+            result[np.repeat(missing, factor)] = np.nan
+        out[column] = result
+    return out
+
+
+def generate_table(source, path, factor, extra_years, rng, first_year=LAUNCH_YEAR):
+    df = extend_history(apply_schema(source), extra_years, first_year)
+    block = max(1, BLOCK_ROWS // max(factor, 1))
+    rows = 0
+    for start in range(0, len(df), block):
+        part = split_rows(df.iloc[start:start + block].reset_index(drop=True), factor, rng)
+        part.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        rows += len(part)
+    return rows
+
+
+def generate(out_dir, factor=10, extra_years=0, tables=TABLES, data_dir=DATA_DIR, seed=0):
+    # writes the CSVs without printing anything; returns a SynthReport for the caller to show or log
+    if factor > MAX_FACTOR:
+        raise ValueError(f"--factor {factor} is too large: synthetic pincodes only fit up to {MAX_FACTOR}")
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    rows, seconds = {}, {}
+    for table in tables:
+        started = time.perf_counter()
+        source = pd.read_csv(os.path.join(data_dir, f"{table}.csv"))
+        rows[table] = generate_table(source, os.path.join(out_dir, f"{table}.csv"), factor, extra_years, rng, FIRST_YEARS.get(table, LAUNCH_YEAR))
+        seconds[table] = time.perf_counter() - started
+    return SynthReport(rows, seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate scaled-up PhonePe Pulse tables from the bundled CSVs.")
+    parser.add_argument("--factor", type=int, default=10,
+                        help="rows generated per source row (10, 100, 1000 ...); the district and pincode tables get that many "
+                             "synthetic districts / pincodes per real one, the agg_* tables more rows per key")
+    parser.add_argument("--extra-years", type=int, default=0,
+                        help=f"years of extrapolated history before the first year, never before {LAUNCH_YEAR} "
+                             f"(PhonePe's launch) and none for the insurance tables, which start in 2020")
+    parser.add_argument("--out-dir", required=True, help="folder the generated CSVs are written to")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="folder holding the source agg_trans.csv etc.")
+    parser.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, metavar="TABLE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="also load the generated tables into this SQLAlchemy database (see ingest.py)")
+    parser.add_argument("--snapshot", help="also export the generated tables as a Parquet snapshot (see snapshot.py)")
+    args = parser.parse_args(argv)
+
+    report = generate(args.out_dir, args.factor, args.extra_years, args.tables, args.data_dir, args.seed)
+    for table, rows in report.rows.items():
+        print(f"{table:>10}: {rows:>12,} rows in {report.seconds[table]:.2f}s")
+    if args.url:
+        from sqlalchemy import create_engine
+        from ingest import ingest, print_ingest_report
+        print_ingest_report(ingest(create_engine(args.url), args.out_dir, args.tables))
+    if args.snapshot:
+        from snapshot import export_snapshot
+        export_snapshot(args.snapshot, args.tables, data_dir=args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# Shared fixtures: the business-case tests run against the embedded DuckDB backend loaded from the CSVs
+# in the repository, so they need neither MySQL nor network access.
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # the app modules live in the repository root
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from data_backend import DATA_DIR, create_duckdb_engine
+    return create_duckdb_engine(DATA_DIR, snapshot_dir="")
+
+
+@pytest.fixture(scope="session")
+def scans(engine):
+    # every shared scan, read with the compact dtypes like run_scans does
+    from business_data import SCANS
+    from schema import apply_schema
+    return {name: apply_schema(pd.read_sql(query, engine)) for name, query in SCANS.items()}
@@ -0,0 +1,278 @@
+# ======================================================
+# REFERENCE QUERIES
+# ======================================================
+
+# The per-figure SQL the business cases were computed with before the growth engine (growth.py) and
+# the shared scans (SCANS in business_data.py) replaced it: one query per figure, with the growth,
+# shares and rankings done by LAG/RANK/ROW_NUMBER windows in the database. Kept verbatim as the
+# expected results of the tests; the app itself no longer runs them.
+
+REFERENCE_QUERIES = {
+    "fig1": """
+    SELECT Year, SUM(Transaction_count) AS total_transactions, 
+          SUM(Transaction_amount) AS transaction_amount 
+          FROM agg_trans 
+          GROUP BY Year 
+          ORDER BY Year;""",
+    "fig2": """
+    WITH YoYGrowth AS (
+             SELECT State, Year, 
+             ROUND((SUM(Transaction_count) - LAG(SUM(Transaction_count)) OVER (PARTITION BY State ORDER BY Year)) * 100.0 /
+             NULLIF(LAG(SUM(Transaction_count)) OVER (PARTITION BY State ORDER BY Year), 0), 2) AS YoY_Transaction_Growth_Percent
+             FROM agg_trans
+             GROUP BY State, Year),
+             RankedGrowth AS (
+             SELECT State, Year, YoY_Transaction_Growth_Percent, ROW_NUMBER() OVER (PARTITION BY Year ORDER BY YoY_Transaction_Growth_Percent DESC) AS rn_desc, 
+             ROW_NUMBER() OVER (PARTITION BY Year ORDER BY YoY_Transaction_Growth_Percent ASC) AS rn_asc
+             FROM YoYGrowth
+             WHERE YoY_Transaction_Growth_Percent IS NOT NULL),
+             TopBottomStates AS (
+             SELECT DISTINCT State FROM RankedGrowth WHERE rn_desc <= 3 OR rn_asc <= 3)
+             SELECT yg.State, AVG(yg.YoY_Transaction_Growth_Percent) as avg_txn_growth_pct
+             FROM YoYGrowth yg
+             JOIN TopBottomStates tbs ON yg.State = tbs.State
+             WHERE yg.Year >= 2019
+             GROUP BY yg.State
+             ORDER BY AVG(yg.YoY_Transaction_Growth_Percent) DESC
+             LIMIT 5;""",
+    "fig3": """
+    WITH state_year_summary AS (
+             SELECT State, Year, SUM(Transaction_count) AS TotalTransactions
+             FROM agg_trans WHERE Year BETWEEN 2020 AND 2024 
+             GROUP BY State, Year),
+             growth AS (
+             SELECT s.State, s.Year, s.TotalTransactions, 
+             LAG(s.TotalTransactions) OVER (PARTITION BY s.State ORDER BY s.Year) AS PreviousYearTransactions
+             FROM state_year_summary s),
+             declining_states AS (
+             SELECT State, ROUND((TotalTransactions - PreviousYearTransactions) * 100.0 / PreviousYearTransactions, 2)
+             AS YoY_Transaction_Growth_Percent
+             FROM growth
+             WHERE PreviousYearTransactions IS NOT NULL
+             AND Year = 2024
+             ORDER BY YoY_Transaction_Growth_Percent ASC
+             LIMIT 5)
+             SELECT g.State, g.Year, ROUND((g.TotalTransactions - g.PreviousYearTransactions) * 100.0 / g.PreviousYearTransactions,2)
+             AS "YoY Transaction Growth (%)"
+             FROM growth g
+             JOIN declining_states d ON g.State = d.State
+             WHERE g.PreviousYearTransactions IS NOT NULL
+             ORDER BY g.State, g.Year;""",
+    "fig4": """
+   WITH quarterly AS (
+          SELECT Year, Quarter, SUM(Transaction_count) AS TotalTransactions
+          FROM agg_trans
+          WHERE Year BETWEEN 2018 AND 2024
+          GROUP BY Year, Quarter),
+          with_prev AS (
+          SELECT Year, Quarter, TotalTransactions, LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) AS PrevTotalTransactions,
+          CASE
+           WHEN LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) IS NULL THEN NULL
+           WHEN LAG(TotalTransactions) OVER (ORDER BY Year, Quarter) = 0 THEN NULL
+           ELSE (TotalTransactions - LAG(TotalTransactions) OVER (ORDER BY Year, Quarter)) * 100.0 / LAG(TotalTransactions) OVER (ORDER BY Year, Quarter)
+          END AS TransactionSpikePct
+          FROM quarterly)
+          SELECT Year, Quarter AS 'Quarter With Max Pct Spike', TotalTransactions as 'Total Transactions', 
+          PrevTotalTransactions as 'Prev Total Transactions', ROUND(TransactionSpikePct,2) AS 'Spike Pct'
+          FROM (SELECT *,
+          ROW_NUMBER() OVER (PARTITION BY Year ORDER BY CASE WHEN TransactionSpikePct IS NULL THEN 1 ELSE 0 END, TransactionSpikePct DESC) 
+          AS rn
+          FROM with_prev) t
+          WHERE rn = 1
+          ORDER BY Year;""",
+    "fig5": """
+    WITH yearly_totals AS (
+             SELECT Year, SUM(Transaction_amount) AS TotalTransactionAmount
+             FROM agg_trans
+             GROUP BY Year),
+             type_share AS (
+             SELECT a.Year, a.Transaction_type AS TransactionType, SUM(a.Transaction_amount) AS TransactionAmount,
+             SUM(a.Transaction_amount) * 100.0 / y.TotalTransactionAmount AS SharePct
+             FROM agg_trans a
+             JOIN yearly_totals y ON a.Year = y.Year
+             GROUP BY a.Year, a.Transaction_type, y.TotalTransactionAmount)
+             SELECT TransactionType AS "Transaction Type", ROUND(AVG(SharePct), 2) AS "Average Share Pct"
+             FROM type_share
+             GROUP BY TransactionType;""",
+    "fig6": """
+    WITH brand_users AS (
+             SELECT Brand_name AS Brandname, SUM(User_count) AS Totalusers 
+             FROM agg_user
+             GROUP BY Brand_name),
+             ranked AS (
+             SELECT Brandname, Totalusers,
+             RANK() OVER (ORDER BY Totalusers DESC) AS rank_highest,
+             RANK() OVER (ORDER BY Totalusers ASC) AS rank_lowest
+             FROM brand_users)
+             SELECT Brandname, Totalusers 
+             FROM ranked 
+             WHERE rank_highest <= 3 OR rank_lowest <= 3
+             ORDER BY Totalusers DESC;""",
+    "fig7": """
+   WITH app_engagement AS (
+            SELECT State AS "State", ROUND(AVG(Registered_users), 2) AS AvgRegUsers, ROUND(AVG(Number_of_app_opens), 2) AS AvgAppOpens
+            FROM map_user
+            GROUP BY State),
+            engagement_rate AS (
+            SELECT State, ROUND(AvgAppOpens / AvgRegUsers, 2) AS EngagementRate 
+            FROM app_engagement)
+            (SELECT * FROM engagement_rate
+            ORDER BY EngagementRate DESC
+            LIMIT 3)
+            UNION ALL
+            (SELECT * FROM engagement_rate ORDER BY EngagementRate ASC LIMIT 3)
+            ORDER BY EngagementRate DESC;""",
+    "fig8": """
+    WITH quarterly_engagement AS (
+             SELECT Year, Quarter, ROUND(SUM(Number_of_app_opens)/SUM(Registered_users), 4) AS EngagementRate
+             FROM map_user
+             GROUP BY Year, Quarter),
+             ranked AS (
+             SELECT Year, Quarter, EngagementRate,
+             RANK() OVER (PARTITION BY Year ORDER BY EngagementRate DESC) AS rank_highest,
+             RANK() OVER (PARTITION BY Year ORDER BY EngagementRate ASC) AS rank_lowest
+             FROM quarterly_engagement)
+             SELECT Year, Quarter, EngagementRate as 'Engagement Rate' FROM ranked
+             WHERE rank_highest = 1 OR rank_lowest = 1
+             ORDER BY Year, Quarter, EngagementRate ASC;""",
+    "fig9": """
+    WITH yearly_insurance AS (
+             SELECT Year, SUM(Insurance_count) AS TotalInsurance, SUM(Insurance_amount) AS TotalValue
+             FROM agg_ins
+             WHERE Year BETWEEN 2020 AND 2024
+             GROUP BY Year),
+             growth AS (
+             SELECT Year, TotalInsurance, TotalValue, LAG(TotalInsurance) OVER (ORDER BY Year) AS PrevTransactions,
+             LAG(TotalValue) OVER (ORDER BY Year) AS PrevValue
+             FROM yearly_insurance)
+             SELECT Year, TotalInsurance as "No of Insurance Transactions", TotalValue "Total Insurance Amount",
+             ROUND((TotalInsurance - PrevTransactions) * 100.0 / PrevTransactions, 2) AS "Insurance Transaction Growth (%)",
+             ROUND((TotalValue - PrevValue) * 100.0 / PrevValue, 2) AS "Insurance Amount Growth (%)"
+             FROM growth
+             WHERE PrevTransactions IS NOT NULL AND PrevValue IS NOT NULL
+             ORDER BY Year;""",
+    "fig10": """
+    WITH yearly_totals AS (
+              SELECT State, Year, SUM(Insurance_amount) AS total_value FROM agg_ins
+              GROUP BY state, year)
+              SELECT State, (MAX(total_value) - MIN(total_value)) AS InsuranceTransactionValue
+              FROM yearly_totals
+              GROUP BY state
+              ORDER BY InsuranceTransactionValue DESC
+              LIMIT 5;""",
+    "fig11": """
+    WITH total_activity AS (
+              SELECT state, SUM(Transaction_count) AS total_txn_count, SUM(Transaction_amount) AS total_txn_value
+              FROM agg_trans
+              GROUP BY state),
+              insurance_activity AS (
+              SELECT State, SUM(Insurance_count) AS total_insurance_count, SUM(Insurance_amount) AS total_insurance_value
+              FROM agg_ins
+              GROUP BY State),
+              combined AS (
+              SELECT t.State, t.total_txn_count, t.total_txn_value, i.total_insurance_count, i.total_insurance_value,
+              ROUND((i.total_insurance_count * 100.0 / NULLIF(t.total_txn_count, 0)), 5) AS insurance_penetration_rate,
+              ROUND((i.total_insurance_value * 100.0 / NULLIF(t.total_txn_value, 0)), 5) AS insurance_value_share
+              FROM total_activity t
+              LEFT JOIN insurance_activity i ON t.state = i.state)
+              SELECT State, total_txn_count as 'Total Transactions', total_txn_value as 'Total Transaction Amount', 
+              total_insurance_count as 'Total Insurances', total_insurance_value as 'Total Insurance Amount', 
+              insurance_penetration_rate as "Insurance Penetration Rate", 
+              insurance_value_share as "Insurance Value Share"
+              FROM combined
+              WHERE insurance_penetration_rate IS NOT NULL
+              ORDER BY insurance_penetration_rate ASC
+              limit 5;""",
+    "fig12": """
+    WITH yearly_user_growth AS (
+              SELECT state, year, SUM(Registered_users) AS yearly_registered
+              FROM map_user
+              GROUP BY state, year),
+              user_growth_rate AS (
+              SELECT state, year, yearly_registered, LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year) AS prev_registered,
+              ROUND((yearly_registered - LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year)) * 100.0 / LAG(yearly_registered) OVER (PARTITION BY state ORDER BY year), 2) AS reg_growth_pct
+              FROM yearly_user_growth),
+              yearly_txn_growth AS (
+              SELECT state, year, SUM(transaction_count) AS yearly_txns
+              FROM agg_trans GROUP BY state, year),
+              txn_growth_rate AS (
+              SELECT state, year, yearly_txns, LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year) AS prev_txns,
+              ROUND((yearly_txns - LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year)) * 100.0 / LAG(yearly_txns) OVER (PARTITION BY state ORDER BY year), 2) AS txn_growth_pct
+              FROM yearly_txn_growth),
+              combined AS (
+              SELECT u.state, u.year, u.reg_growth_pct, t.txn_growth_pct FROM user_growth_rate u
+              JOIN txn_growth_rate t 
+              ON u.state = t.state AND u.year = t.year
+              WHERE u.prev_registered IS NOT NULL AND t.prev_txns IS NOT NULL)
+              SELECT state, ROUND(AVG(reg_growth_pct), 2) AS avg_user_growth_pct, 
+              ROUND(AVG(txn_growth_pct), 2) AS avg_txn_growth_pct
+              FROM combined GROUP BY state HAVING AVG(reg_growth_pct) > 0 AND AVG(txn_growth_pct) > 0
+              ORDER BY avg_txn_growth_pct DESC LIMIT 10;""",
+    "state_pie_charts": """
+    WITH district_metrics AS (
+              SELECT State, District_name, SUM(Registered_users) AS total_registered_users,
+              SUM(Number_of_app_opens) AS total_app_opens
+              FROM map_user
+              GROUP BY State, District_name),
+              state_totals AS (
+              SELECT State, SUM(total_registered_users) AS state_total_registered,
+              SUM(total_app_opens) AS state_total_app_opens
+              FROM district_metrics
+              GROUP BY State),
+              joined_data AS (
+              SELECT dm.State, dm.District_name, dm.total_registered_users, dm.total_app_opens,
+              ROUND((dm.total_app_opens / st.state_total_app_opens) * 100, 2) AS app_open_share_percent
+              FROM district_metrics dm 
+              JOIN state_totals st ON dm.State = st.State),
+              state_ranking AS (
+              SELECT State, SUM(total_registered_users) AS state_registered_users
+              FROM district_metrics
+              GROUP BY State),
+              top3_states AS (
+              SELECT State FROM state_ranking ORDER BY state_registered_users DESC LIMIT 3),
+              ranked_districts AS (
+              SELECT jd.*, ROW_NUMBER() OVER (PARTITION BY State ORDER BY total_registered_users DESC) AS district_rank
+              FROM joined_data jd
+              WHERE jd.State IN (SELECT State FROM top3_states))
+              SELECT State, District_name AS 'District Name', total_app_opens AS 'Total App Opens',
+              app_open_share_percent AS 'App Open Share'
+              FROM ranked_districts
+              WHERE district_rank <= 5
+              ORDER BY State, district_rank;""",
+    "fig14": """
+    WITH state_insurance AS (
+              SELECT state, SUM(insurance_amount) AS total_insurance_amount FROM top_ins 
+              WHERE year = 2024
+              GROUP BY state)
+              SELECT state, ROUND(total_insurance_amount, 2) AS total_insurance_amount
+              FROM state_insurance 
+              ORDER BY total_insurance_amount DESC 
+              LIMIT 3;""",
+    "fig15": """
+    SELECT year, quarter, total_insurance_trans_volume FROM (
+              SELECT year, quarter, SUM(insurance_amount) AS total_insurance_trans_volume,
+              RANK() OVER (PARTITION BY year ORDER BY SUM(insurance_amount) DESC) AS rnk
+              FROM top_ins GROUP BY year, quarter) ranked
+              WHERE rnk = 1;""",
+    "fig16": """
+    SELECT district_name AS district_name, SUM(insurance_amount) AS total_insurance_value
+              FROM map_ins WHERE year = 2024
+              GROUP BY district_name
+              ORDER BY total_insurance_value DESC
+              LIMIT 5;""",
+    "fig17": """
+    WITH yearly_pin_data AS (
+              SELECT pincode, year, SUM(insurance_count) AS yearly_transaction_count
+              FROM top_ins GROUP BY pincode, year),
+              growth_calc AS (
+              SELECT p1.pincode, (p2.yearly_transaction_count - p1.yearly_transaction_count) AS growth_in_count,
+              p2.year
+              FROM yearly_pin_data p1
+              JOIN yearly_pin_data p2
+              ON p1.pincode = p2.pincode
+              AND p2.year = p1.year + 1)
+              SELECT pincode, growth_in_count AS growth_from_prev_year
+              FROM growth_calc
+              WHERE year = 2024
+              ORDER BY growth_from_prev_year DESC
+              LIMIT 5;"""}
@@ -0,0 +1,83 @@
+# The business cases derived from the shared scans must give the same numbers as the per-figure SQL
+# they replaced (reference_queries.py), for every figure. Row order and the case of column names are
+# not part of the comparison: several reference queries have no ORDER BY, and MySQL-era aliases
+# like "state"/"year" were renamed by the builders anyway.
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from business_data import BUSINESS_FIGURES, build_figure, figure_data
+from reference_queries import REFERENCE_QUERIES
+
+
+def normalize(df):
+    # lower-case column names, plain dtypes and a canonical row order
+    df = df.rename(columns=str.lower)
+    df = df.apply(lambda column: column.astype(float) if pd.api.types.is_numeric_dtype(column) else column.astype(str))
+    return df.sort_values(list(df.columns), kind="stable").reset_index(drop=True)
+
+
+def assert_same_rows(actual, expected):
+    actual, expected = normalize(actual), normalize(expected)
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+    for column in expected.columns:
+        if pd.api.types.is_float_dtype(expected[column]):
+            np.testing.assert_allclose(actual[column].to_numpy(), expected[column].to_numpy(), rtol=1e-9, equal_nan=True, err_msg=column)
+        else:
+            assert actual[column].tolist() == expected[column].tolist(), column
+
+
+@pytest.fixture(scope="module")
+def reference(engine):
+    return {name: pd.read_sql(text(sql), engine) for name, sql in REFERENCE_QUERIES.items()}
+
+
+def test_every_figure_has_a_reference_query():
+    assert set(REFERENCE_QUERIES) == set(BUSINESS_FIGURES)
+
+
+@pytest.mark.parametrize("name", list(BUSINESS_FIGURES))
+def test_figure_data_matches_reference_query(name, scans, reference):
+    assert_same_rows(figure_data(name, scans), reference[name])
+
+
+def trace_points(fig):
+    # every trace as its sorted (x, y, ...) points, so figures built from differently ordered rows compare equal
+    traces = {}
+    for trace in fig.data:
+        data = trace.to_plotly_json()
+        arrays = [np.asarray(data[key]).tolist() for key in ("x", "y", "labels", "values", "text") if data.get(key) is not None]
+        points = sorted(zip(*arrays), key=repr)
+        key = (data["type"], data.get("name"), data.get("xaxis"), data.get("yaxis"))
+        traces.setdefault(key, []).extend(points)
+    return {key: sorted(points, key=repr) for key, points in traces.items()}
+
+
+def assert_same_figure(actual, expected):
+    assert actual.layout.title.text == expected.layout.title.text
+    actual, expected = trace_points(actual), trace_points(expected)
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert len(actual[key]) == len(expected[key]), key
+        for a, e in zip(actual[key], expected[key]):
+            assert len(a) == len(e)
+            for x, y in zip(a, e):
+                if isinstance(y, (int, float)) and not isinstance(y, bool):
+                    assert x == pytest.approx(y, rel=1e-9, nan_ok=True), key
+                else:
+                    assert x == y, key
+
+
+@pytest.mark.parametrize("name", list(BUSINESS_FIGURES))
+def test_figure_from_shared_scans_matches_reference_query(name, scans, reference):
+    # the same builder, fed once from the shared scans and once from the per-figure query, draws the same figure
+    built = BUSINESS_FIGURES[name].builder(reference[name].copy())
+    expected = built if isinstance(built, dict) else {None: built}
+    actual = build_figure(name, scans)
+    actual = actual if isinstance(actual, dict) else {None: actual}
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert_same_figure(actual[key], expected[key])
@@ -0,0 +1,53 @@
+# The choropleth matches the State names of our tables to the boundary features by name (geo.py), so
+# every State must land on exactly one feature and every feature must be used.
+
+import os
+
+import pandas as pd
+import pytest
+
+from data_backend import DATA_DIR
+from geo import SIMPLIFY_TOLERANCES, MapGeometry, asset_path, check_state_ids, compact_geojson, feature_id, load_map_geometry, state_ids
+
+
+def geometry(names):
+    square = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+    features = [{"type": "Feature", "properties": {"ST_NM": name}, "geometry": square} for name in names]
+    geojson, boundary_ids = compact_geojson({"type": "FeatureCollection", "features": features})
+    return MapGeometry(geojson, state_ids(boundary_ids))
+
+
+def test_feature_id_matches_spelling_variants():
+    geo = geometry(["Andaman & Nicobar", "Dadra and Nagar Haveli and Daman and Diu", "Jammu and Kashmir", "Goa"])
+    assert feature_id(geo, "Andaman & Nicobar Islands") == geo.state_ids["andamanandnicobar"]
+    assert feature_id(geo, "Dadra & Nagar Haveli & Daman & Diu") == geo.state_ids["dadraandnagarhavelianddamananddiu"]
+    assert feature_id(geo, "jammu-&-kashmir") == geo.state_ids["jammuandkashmir"]
+    assert feature_id(geo, "Kerala") is None
+
+
+def test_feature_id_ambiguous_prefix():
+    assert feature_id(geometry(["Dadra and Nagar Haveli", "Daman and Diu"]), "Da") is None
+
+
+def test_check_state_ids_reports_every_problem():
+    geo = geometry(["Goa", "Gujarat", "Kerala"])
+    with pytest.raises(ValueError) as error:
+        check_state_ids(geo, ["Goa", "goa", "Bihar"])
+    message = str(error.value)
+    assert "no boundary for 'Bihar'" in message
+    assert "['Goa', 'goa'] share one boundary" in message
+    assert "2 boundaries match no State" in message
+
+
+def test_check_state_ids_accepts_one_to_one():
+    check_state_ids(geometry(["Goa", "Kerala"]), ["goa", "Kerala"])
+
+
+@pytest.mark.parametrize("level", list(SIMPLIFY_TOLERANCES))
+def test_every_state_has_its_own_boundary(level):
+    # the built assets (python geo.py) against the States of our tables: all 36 on their own feature
+    if not os.path.exists(asset_path(level)):
+        pytest.skip(f"{asset_path(level)} not built")
+    states = pd.read_csv(os.path.join(DATA_DIR, "map_trans.csv"), usecols=["State"])["State"].unique()
+    assert len(states) == 36
+    check_state_ids(load_map_geometry(level), states)
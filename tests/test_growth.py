@@ -0,0 +1,89 @@
+# Unit tests for the growth engine (growth.py): the definition of growth every business case uses,
+# including the periods that have no growth (first period, previous value 0, missing period).
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from growth import add_growth, aggregate, rank_within, round_half_up
+
+
+def test_yearly_growth_per_key():
+    df = pd.DataFrame({"State": ["b", "a", "a", "b"], "Year": [2019, 2019, 2018, 2018], "count": [30, 15, 10, 20]})
+    grown = add_growth(df, ["count"], keys=["State"])
+    assert grown[["State", "Year"]].values.tolist() == [["a", 2018], ["a", 2019], ["b", 2018], ["b", 2019]]
+    np.testing.assert_allclose(grown["count_prev"], [np.nan, 10, np.nan, 20])
+    np.testing.assert_allclose(grown["count_growth"], [np.nan, 5, np.nan, 10])
+    np.testing.assert_allclose(grown["count_growth_pct"], [np.nan, 50, np.nan, 50])
+
+
+def test_first_period_has_no_growth():
+    grown = add_growth(pd.DataFrame({"Year": [2018], "count": [10]}), ["count"])
+    assert np.isnan(grown.loc[0, "count_prev"])
+    assert np.isnan(grown.loc[0, "count_growth_pct"])
+
+
+def test_zero_previous_value_has_no_growth_pct():
+    grown = add_growth(pd.DataFrame({"Year": [2018, 2019, 2020], "count": [0, 10, 0]}), ["count"])
+    np.testing.assert_allclose(grown["count_growth"], [np.nan, 10, -10])
+    np.testing.assert_allclose(grown["count_growth_pct"], [np.nan, np.nan, -100]) # never infinite
+
+
+def test_missing_previous_value_has_no_growth():
+    grown = add_growth(pd.DataFrame({"Year": [2018, 2019, 2020], "count": [10.0, np.nan, 30.0]}), ["count"])
+    np.testing.assert_allclose(grown["count_growth_pct"], [np.nan, np.nan, np.nan])
+
+
+def test_missing_quarter_breaks_the_chain():
+    # Q2 2019 is missing, so Q3 is not compared with Q1; Q1 2020 follows Q4 2019
+    df = pd.DataFrame({"Year": [2019, 2019, 2019, 2020], "Quarter": [1, 3, 4, 1], "count": [10, 20, 25, 50]})
+    grown = add_growth(df, ["count"], period="quarter")
+    np.testing.assert_allclose(grown["count_prev"], [np.nan, np.nan, 20, 25])
+    np.testing.assert_allclose(grown["count_growth_pct"], [np.nan, np.nan, 25, 100])
+
+
+def test_missing_year_breaks_the_chain():
+    grown = add_growth(pd.DataFrame({"Year": [2018, 2020], "count": [10, 20]}), ["count"])
+    assert grown["count_growth_pct"].isna().all()
+
+
+def test_missing_key_is_never_compared():
+    df = pd.DataFrame({"State": [None, None], "Year": [2018, 2019], "count": [10, 20]})
+    assert add_growth(df, ["count"], keys=["State"])["count_prev"].isna().all()
+
+
+def test_unknown_period():
+    with pytest.raises(ValueError):
+        add_growth(pd.DataFrame({"Year": [2018], "count": [1]}), ["count"], period="month")
+
+
+def test_aggregate_sums_quarters():
+    df = pd.DataFrame({"State": ["a", "a", "a"], "Year": [2018, 2018, 2019], "Quarter": [1, 2, 1], "count": [1, 2, 4]})
+    yearly = aggregate(df, ["count"], keys=["State"])
+    assert yearly.values.tolist() == [["a", 2018, 3], ["a", 2019, 4]]
+
+
+def test_round_half_up_like_sql():
+    np.testing.assert_allclose(round_half_up(pd.Series([156.125, -0.125, 1.004])), [156.13, -0.13, 1.0])
+
+
+def test_rank_within_groups():
+    df = pd.DataFrame({"Year": [2018, 2018, 2018, 2019, 2019], "value": [1.0, 3.0, 2.0, 5.0, 4.0]})
+    assert rank_within(df, ["Year"], "value").tolist() == [3, 1, 2, 1, 2]
+    assert rank_within(df, ["Year"], "value", ascending=True).tolist() == [1, 3, 2, 2, 1]
+
+
+def test_rank_within_missing_values_last():
+    df = pd.DataFrame({"Year": [2018, 2018, 2018], "value": [np.nan, 1.0, 2.0]})
+    assert rank_within(df, ["Year"], "value").tolist() == [3, 2, 1]
+    assert rank_within(df, ["Year"], "value", ascending=True).tolist() == [3, 1, 2]
+
+
+def test_rank_within_ties_keep_row_order():
+    df = pd.DataFrame({"Year": [2018, 2018, 2018], "value": [2.0, 2.0, 1.0]})
+    assert rank_within(df, ["Year"], "value").tolist() == [1, 2, 3]
+
+
+def test_rank_within_keeps_the_index():
+    df = pd.DataFrame({"Year": [2018, 2018], "value": [1.0, 2.0]}, index=[7, 3])
+    assert rank_within(df, ["Year"], "value").to_dict() == {7: 2, 3: 1}